@@ -45,12 +45,14 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "modeler.compression.ResponseCompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "modeler.profiling.ProfilingMiddleware",
 ]
 
 ROOT_URLCONF = "dvw_backend.urls"
@@ -89,6 +91,99 @@ DATABASES = {
     }
 }
 
+# SQLite performance profile (see modeler/sqlite.py). WAL journaling lets readers
+# continue while a save commits, and IMMEDIATE transactions take the write lock up
+# front, so concurrent saves wait for the busy timeout instead of failing.
+SQLITE_PERFORMANCE_MODE = os.getenv("SQLITE_PERFORMANCE_MODE", "true").lower() == "true"
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    # Negative sizes are in KiB
+    "cache_size": -int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536")),
+    "temp_store": "MEMORY",
+}
+SQLITE_OPTIONS = {
+    "init_command": "; ".join(
+        f"PRAGMA {name}={value}" for name, value in SQLITE_PRAGMAS.items()
+    ),
+    "timeout": float(os.getenv("SQLITE_BUSY_TIMEOUT", "10")),
+    "transaction_mode": "IMMEDIATE",
+}
+if (
+    SQLITE_PERFORMANCE_MODE
+    and DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3"
+):
+    DATABASES["default"]["OPTIONS"] = dict(SQLITE_OPTIONS)
+
+# Connection reuse, selected with DB_POOL_MODE:
+#   none       - a new connection per request (Django default)
+#   persistent - keep connections open for DB_CONN_MAX_AGE seconds, with health checks
+#   pool       - psycopg 3 connection pool (PostgreSQL only, needs psycopg[pool])
+DB_POOL_MODE = os.getenv("DB_POOL_MODE", "none")
+
+if DB_POOL_MODE == "persistent":
+    DATABASES["default"]["CONN_MAX_AGE"] = int(os.getenv("DB_CONN_MAX_AGE", "60"))
+    DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
+elif DB_POOL_MODE == "pool":
+    from importlib.util import find_spec
+
+    from django.core.exceptions import ImproperlyConfigured
+
+    if not os.getenv("DB_HOST"):
+        raise ImproperlyConfigured(
+            "DB_POOL_MODE=pool requires PostgreSQL (set DB_HOST)"
+        )
+    # requirements.txt installs psycopg2, which Django cannot pool connections with
+    if find_spec("psycopg") is None or find_spec("psycopg_pool") is None:
+        raise ImproperlyConfigured(
+            "DB_POOL_MODE=pool requires psycopg 3 with its pool "
+            '(pip install "psycopg[pool]")'
+        )
+    DATABASES["default"]["OPTIONS"] = {
+        "pool": {
+            "min_size": int(os.getenv("DB_POOL_MIN_SIZE", "2")),
+            "max_size": int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+            "timeout": float(os.getenv("DB_POOL_TIMEOUT", "10")),
+        }
+    }
+
+
+# Read replica (see modeler/routing.py). DB_REPLICA_HOST points reads at a PostgreSQL
+# replica of the default database; with SQLite, DB_REPLICA_NAME names a second database
+# file standing in for a replica, e.g. to run the routing tests locally. Reads only go
+# to the replica once REPLICA_READS_ENABLED is set.
+if os.getenv("DB_REPLICA_HOST") or os.getenv("DB_REPLICA_NAME"):
+    DATABASES["replica"] = dict(DATABASES["default"])
+    if os.getenv("DB_HOST"):
+        DATABASES["replica"].update(
+            HOST=os.getenv("DB_REPLICA_HOST", DATABASES["default"]["HOST"]),
+            PORT=os.getenv("DB_REPLICA_PORT", DATABASES["default"]["PORT"]),
+            NAME=os.getenv("DB_REPLICA_NAME", DATABASES["default"]["NAME"]),
+            TEST={"MIRROR": "default"},
+        )
+    else:
+        DATABASES["replica"]["NAME"] = BASE_DIR / os.getenv("DB_REPLICA_NAME")
+DATABASE_ROUTERS = ["modeler.routing.ReplicaRouter"]
+REPLICA_READS_ENABLED = os.getenv("REPLICA_READS_ENABLED", "false").lower() == "true"
+REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", "300"))
+
+
+# Caches
+# "responses" holds rendered and compressed model bodies, keyed by revision
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "responses": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "responses",
+        "TIMEOUT": int(os.getenv("RESPONSE_CACHE_TIMEOUT", "3600")),
+        "OPTIONS": {"MAX_ENTRIES": int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "64"))},
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -136,3 +231,57 @@ CORS_ALLOWED_ORIGINS = ["http://localhost:5173"]
 
 # REST Framework settings
 REST_FRAMEWORK = {"DEFAULT_PERMISSION_CLASSES": ["rest_framework.permissions.AllowAny"]}
+
+# Write-behind coalescing of rapid model saves (see modeler/coalescing.py)
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "false").lower() == "true"
+WRITE_BEHIND_WINDOW_MS = int(os.getenv("WRITE_BEHIND_WINDOW_MS", "50"))
+WRITE_BEHIND_FLUSH_TIMEOUT = float(os.getenv("WRITE_BEHIND_FLUSH_TIMEOUT", "30"))
+
+# Admission control of model saves (see modeler/admission.py)
+ADMISSION_CONTROL_ENABLED = (
+    os.getenv("ADMISSION_CONTROL_ENABLED", "true").lower() == "true"
+)
+ADMISSION_INITIAL_LIMIT = int(os.getenv("ADMISSION_INITIAL_LIMIT", "8"))
+ADMISSION_MIN_LIMIT = int(os.getenv("ADMISSION_MIN_LIMIT", "2"))
+ADMISSION_MAX_LIMIT = int(os.getenv("ADMISSION_MAX_LIMIT", "64"))
+ADMISSION_LATENCY_TOLERANCE = float(os.getenv("ADMISSION_LATENCY_TOLERANCE", "2.0"))
+ADMISSION_MODEL_LIMIT = int(os.getenv("ADMISSION_MODEL_LIMIT", "2"))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "64"))
+ADMISSION_MODEL_QUEUE_SIZE = int(os.getenv("ADMISSION_MODEL_QUEUE_SIZE", "4"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "5"))
+
+# Model version history (see modeler/versioning.py)
+VERSION_SNAPSHOT_INTERVAL = int(os.getenv("VERSION_SNAPSHOT_INTERVAL", "50"))
+VERSION_CACHE_SIZE = int(os.getenv("VERSION_CACHE_SIZE", "32"))
+
+# Response compression (see modeler/compression.py)
+RESPONSE_CACHE_ALIAS = "responses"
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
+# Reverse engineering of database schemas (see modeler/importing.py)
+SCHEMA_IMPORT_WORKERS = int(os.getenv("SCHEMA_IMPORT_WORKERS", "4"))
+
+# Background jobs (see modeler/jobs.py)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+JOB_MAX_WAIT = float(os.getenv("JOB_MAX_WAIT", "30"))
+JOB_STALE_AFTER = int(os.getenv("JOB_STALE_AFTER", "600"))
+JOB_REQUEUE_INTERVAL = int(os.getenv("JOB_REQUEUE_INTERVAL", "60"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_FILES_DIR = os.getenv("JOB_FILES_DIR", str(BASE_DIR / "job_files"))
+
+# Profiling of single requests (see modeler/profiling.py)
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILING_DIR = os.getenv("PROFILING_DIR", str(BASE_DIR / "profiles"))
+PROFILING_INTERVAL = float(os.getenv("PROFILING_INTERVAL", "0.001"))
+
+# Edges left without their nodes by a save: "off", "refuse" or "prune"
+# (see modeler/integrity.py)
+EDGE_INTEGRITY_MODE = os.getenv("EDGE_INTEGRITY_MODE", "off").lower()
+
+# Model list thumbnails (see modeler/thumbnails.py)
+THUMBNAIL_MAX_NODES = int(os.getenv("THUMBNAIL_MAX_NODES", "1000"))
+THUMBNAIL_MAX_EDGES = int(os.getenv("THUMBNAIL_MAX_EDGES", "1500"))
+THUMBNAIL_SYNC_MAX_NODES = int(os.getenv("THUMBNAIL_SYNC_MAX_NODES", "5000"))
@@ -18,10 +18,21 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from modeler.api import DataModelViewSet, SettingsViewSet
+from modeler.api import (
+    DataModelViewSet,
+    HubRegistryViewSet,
+    JobViewSet,
+    MetricsViewSet,
+    SearchViewSet,
+    SettingsViewSet,
+)
 
 router = DefaultRouter()
 router.register(r"models", DataModelViewSet)
+router.register(r"metrics", MetricsViewSet, basename="metrics")
+router.register(r"search", SearchViewSet, basename="search")
+router.register(r"hubs", HubRegistryViewSet, basename="hubs")
+router.register(r"jobs", JobViewSet)
 
 # Custom URL patterns for settings to handle PATCH at collection level
 settings_list = SettingsViewSet.as_view({
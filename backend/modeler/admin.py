@@ -1,89 +1,219 @@
 from django.contrib import admin
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.forms.models import BaseInlineFormSet
 from django.utils.html import format_html
 from django.urls import reverse
-from django.utils.safestring import mark_safe
 import json
+import uuid
 from .models import DataModel, Node, Edge, Settings
+from .search import matching_entries
 
-class NodeInline(admin.TabularInline):
-    model = Node
+# Models may have hundreds of thousands of nodes and edges: lists never count
+# whole tables, model pages show the graph one page at a time and searches
+# go through the search index rather than the node data.
+INLINE_PAGE_SIZE = 50
+
+# Graphs are only written through save_model_graph, which also bumps the
+# revision and updates the caches, search index, hub keys, statistics and
+# versions; the admin shows nodes and edges but cannot change them.
+
+
+class PagedInlineFormSet(BaseInlineFormSet):
+    """
+    Inline formset editing one page of the related rows; the page is set by
+    PagedInline
+    """
+    page = 1
+    query = None
+
+    def get_queryset(self):
+        if not hasattr(self, '_page'):
+            queryset = super().get_queryset()
+            self.total = queryset.count()
+            self.pages = max(1, -(-self.total // INLINE_PAGE_SIZE))
+            self.page = min(self.page, self.pages)
+            start = (self.page - 1) * INLINE_PAGE_SIZE
+            self._page = queryset[start:start + INLINE_PAGE_SIZE]
+        return self._page
+
+    def _page_query(self, page):
+        query = self.query.copy()
+        query[self.prefix + '_page'] = page
+        return '?' + query.urlencode()
+
+    @property
+    def first_shown(self):
+        return min(self.total, (self.page - 1) * INLINE_PAGE_SIZE + 1)
+
+    @property
+    def last_shown(self):
+        return min(self.total, self.page * INLINE_PAGE_SIZE)
+
+    @property
+    def previous_query(self):
+        return self._page_query(self.page - 1) if self.page > 1 else None
+
+    @property
+    def next_query(self):
+        return self._page_query(self.page + 1) if self.page < self.pages else None
+
+
+class PagedInline(admin.TabularInline):
+    """Tabular inline showing INLINE_PAGE_SIZE rows, paged with ?<prefix>_page=N"""
+    formset = PagedInlineFormSet
+    template = 'admin/modeler/paged_tabular.html'
     extra = 0
-    readonly_fields = ('id', 'type', 'x', 'y')
-    fields = ('id', 'type', 'x', 'y', 'data')
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
 
-class EdgeInline(admin.TabularInline):
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        page = request.GET.get(f"{formset.get_default_prefix()}_page", '')
+        formset.page = int(page) if page.isdigit() and int(page) > 0 else 1
+        formset.query = request.GET
+        if obj is not None:
+            model_name = self.model._meta.model_name
+            changelist = reverse(f'admin:modeler_{model_name}_changelist')
+            formset.changelist_url = f"{changelist}?model__id__exact={obj.pk}"
+        return formset
+
+
+class NodeInline(PagedInline):
+    model = Node
+    readonly_fields = fields = ('id', 'type', 'x', 'y', 'data')
+
+
+class EdgeInline(PagedInline):
     model = Edge
-    extra = 0
-    readonly_fields = ('id', 'source', 'target')
-    fields = ('id', 'source', 'target', 'data')
+    readonly_fields = fields = ('id', 'source', 'target', 'data')
+
+
+def _count(related):
+    """
+    Number of `related` rows per model, as one correlated subquery on the
+    model index
+    """
+    counts = (
+        related.objects.filter(model=OuterRef('pk'))
+        .order_by()
+        .values('model')
+        .annotate(count=Count('pk'))
+    )
+    return Coalesce(Subquery(counts.values('count')), 0)
+
 
 @admin.register(DataModel)
 class DataModelAdmin(admin.ModelAdmin):
     list_display = ('name', 'id', 'created_at', 'node_count', 'edge_count')
     list_filter = ('created_at',)
-    search_fields = ('name', 'id')
+    search_fields = ('name', '=id')
     readonly_fields = ('id', 'created_at')
     inlines = [NodeInline, EdgeInline]
-    
+
+    def get_queryset(self, request):
+        return (
+            super()
+            .get_queryset(request)
+            .annotate(node_total=_count(Node), edge_total=_count(Edge))
+        )
+
     def node_count(self, obj):
-        return obj.nodes.count()
+        return obj.node_total
     node_count.short_description = 'Nodes'
-    
+    node_count.admin_order_field = 'node_total'
+
     def edge_count(self, obj):
-        return obj.edges.count()
+        return obj.edge_total
     edge_count.short_description = 'Edges'
+    edge_count.admin_order_field = 'edge_total'
+
 
 @admin.register(Node)
 class NodeAdmin(admin.ModelAdmin):
     list_display = ('id', 'model_link', 'type', 'x', 'y', 'data_preview')
-    list_filter = ('type', 'model', 'model__created_at')
-    search_fields = ('id', 'model__name', 'data')
-    readonly_fields = ('id',)
+    list_filter = ('type',)
+    search_fields = ('=id',)
+    search_help_text = 'A node id, or words of node labels, column names and data types'
+    readonly_fields = ('id', 'model', 'type', 'x', 'y', 'data')
     list_select_related = ('model',)
-    
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        try:
+            return queryset.filter(pk=uuid.UUID(search_term)), False
+        except ValueError:
+            # Words are looked up in the search index (see modeler/search.py)
+            entries = matching_entries(search_term)
+            return queryset.filter(pk__in=entries.values('node_id')), False
+
     def model_link(self, obj):
         url = reverse('admin:modeler_datamodel_change', args=[obj.model.id])
         return format_html('<a href="{}">{}</a>', url, obj.model.name)
     model_link.short_description = 'Model'
     model_link.admin_order_field = 'model__name'
-    
+
     def data_preview(self, obj):
         if obj.data:
             preview = json.dumps(obj.data, indent=2)[:100]
             if len(preview) >= 100:
                 preview += "..."
-            return format_html('<pre style="font-size: 11px; margin: 0;">{}</pre>', preview)
+            return format_html(
+                '<pre style="font-size: 11px; margin: 0;">{}</pre>', preview
+            )
         return "No data"
     data_preview.short_description = 'Data Preview'
 
+
 @admin.register(Edge)
 class EdgeAdmin(admin.ModelAdmin):
     list_display = ('id', 'model_link', 'source', 'target', 'data_preview')
-    list_filter = ('model', 'model__created_at')
-    search_fields = ('id', 'model__name', 'source', 'target', 'data')
-    readonly_fields = ('id',)
+    search_fields = ('=id', '=source', '=target')
+    search_help_text = 'An edge id, or the id of its source or target node'
+    readonly_fields = ('id', 'model', 'source', 'target', 'data')
     list_select_related = ('model',)
-    
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
     def model_link(self, obj):
         url = reverse('admin:modeler_datamodel_change', args=[obj.model.id])
         return format_html('<a href="{}">{}</a>', url, obj.model.name)
     model_link.short_description = 'Model'
     model_link.admin_order_field = 'model__name'
-    
+
     def data_preview(self, obj):
         if obj.data:
             preview = json.dumps(obj.data, indent=2)[:100]
             if len(preview) >= 100:
                 preview += "..."
-            return format_html('<pre style="font-size: 11px; margin: 0;">{}</pre>', preview)
+            return format_html(
+                '<pre style="font-size: 11px; margin: 0;">{}</pre>', preview
+            )
         return "No data"
     data_preview.short_description = 'Data Preview'
 
+
 @admin.register(Settings)
 class SettingsAdmin(admin.ModelAdmin):
     list_display = ('__str__', 'theme', 'auto_save', 'updated_at')
     readonly_fields = ('id', 'created_at', 'updated_at')
-    
+
     fieldsets = (
         ('General', {
             'fields': ('id', 'created_at', 'updated_at')
@@ -96,24 +226,30 @@ class SettingsAdmin(admin.ModelAdmin):
             'fields': ('auto_save', 'auto_save_interval', 'snap_to_grid', 'grid_size'),
             'classes': ('collapse',)
         }),
-        ('Data Vault Preferences', {
-            'fields': ('default_hub_prefix', 'default_link_prefix', 'default_satellite_prefix'),
+        ('Edge Settings', {
+            'fields': (
+                'edge_type',
+                'floating_edges',
+                'edge_animation',
+                'show_connection_points',
+            ),
             'classes': ('collapse',)
         }),
-        ('Export Preferences', {
-            'fields': ('export_format',),
+        ('Data Vault Preferences', {
+            'fields': ('global_columns',),
             'classes': ('collapse',)
         }),
     )
-    
+
     def has_add_permission(self, request):
         # Only allow one settings instance
         return not Settings.objects.exists()
-    
+
     def has_delete_permission(self, request, obj=None):
         # Don't allow deletion of settings
         return False
 
+
 # Customize the admin site header and title
 admin.site.site_header = 'Data Vault Modeler Admin'
 admin.site.site_title = 'DVW Admin'
@@ -0,0 +1,224 @@
+"""
+Admission control for model saves.
+
+Saves run only while a global and a per-model concurrency slot are free.
+Saves that find no free slot wait in a bounded queue; once the queue is
+full, or a save has waited ADMISSION_QUEUE_TIMEOUT seconds, it is rejected
+with Overloaded, which the API turns into 429 with Retry-After.
+
+The global limit adapts to the database: every save measures the mean
+latency of its queries. While that stays within ADMISSION_LATENCY_TOLERANCE
+times the lowest recently seen latency the limit grows; when the database
+slows down under load it shrinks, down to ADMISSION_MIN_LIMIT. Limits and
+queues are per worker process, like the write-behind buffer.
+"""
+import math
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+from . import metrics
+
+
+class Overloaded(Exception):
+    """Raised when a save is not admitted; `retry_after` is in whole seconds"""
+
+    def __init__(self, retry_after):
+        super().__init__("Too many concurrent saves.")
+        self.retry_after = retry_after
+
+
+class AdaptiveLimit:
+    """
+    Concurrency limit following the gradient between the lowest and the
+    current query latency, with headroom of sqrt(limit) for queueing.
+    """
+
+    def __init__(self, initial, minimum, maximum, tolerance=2.0, smoothing=0.2):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.baseline = None
+        self.latency = None
+
+    def update(self, latency):
+        """Record a latency sample in seconds and return the new limit"""
+        if self.baseline is None:
+            self.baseline = self.latency = latency
+        else:
+            # The baseline follows new minimums at once and higher latencies slowly
+            self.baseline = min(
+                latency, self.baseline + 0.01 * (latency - self.baseline)
+            )
+            self.latency += 0.2 * (latency - self.latency)
+
+        gradient = (
+            max(0.5, min(1.0, self.tolerance * self.baseline / self.latency))
+            if self.latency > 0
+            else 1.0
+        )
+        target = self.limit * gradient + math.sqrt(self.limit)
+        limit = (1 - self.smoothing) * self.limit + self.smoothing * target
+        self.limit = max(self.minimum, min(self.maximum, limit))
+        return self.current
+
+    @property
+    def current(self):
+        return int(self.limit)
+
+
+class AdmissionController:
+    def __init__(self, limit, model_limit, queue_size, model_queue_size, timeout):
+        self.limit = limit
+        self.model_limit = model_limit
+        self.queue_size = queue_size
+        self.model_queue_size = model_queue_size
+        self.timeout = timeout
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._queued = 0
+        self._model_in_flight = defaultdict(int)
+        self._model_queued = defaultdict(int)
+        self._save_seconds = None
+
+    def _has_slot(self, model_id):
+        return self._in_flight < self.limit.current and (
+            model_id is None or self._model_in_flight[model_id] < self.model_limit
+        )
+
+    def _retry_after(self):
+        # Time for the saves ahead to drain at the current limit
+        ahead = self._queued + self._in_flight + 1
+        seconds = (self._save_seconds or 1.0) * ahead / max(self.limit.current, 1)
+        return max(1, min(60, math.ceil(seconds)))
+
+    def _reject(self):
+        metrics.incr("admission.rejected")
+        raise Overloaded(self._retry_after())
+
+    def _publish(self):
+        metrics.set_gauge("admission.limit", self.limit.current)
+        metrics.set_gauge("admission.in_flight", self._in_flight)
+        metrics.set_gauge("admission.queued", self._queued)
+
+    def _acquire(self, model_id):
+        with self._condition:
+            if not self._has_slot(model_id):
+                if self._queued >= self.queue_size or (
+                    model_id is not None
+                    and self._model_queued[model_id] >= self.model_queue_size
+                ):
+                    self._reject()
+                self._queued += 1
+                self._model_queued[model_id] += 1
+                self._publish()
+                started = time.perf_counter()
+                try:
+                    admitted = self._condition.wait_for(
+                        lambda: self._has_slot(model_id), self.timeout
+                    )
+                finally:
+                    self._queued -= 1
+                    self._model_queued[model_id] -= 1
+                    if not self._model_queued[model_id]:
+                        del self._model_queued[model_id]
+                metrics.observe(
+                    "admission.queue_wait", (time.perf_counter() - started) * 1000
+                )
+                if not admitted:
+                    self._publish()
+                    self._reject()
+            self._in_flight += 1
+            if model_id is not None:
+                self._model_in_flight[model_id] += 1
+            metrics.incr("admission.admitted")
+            self._publish()
+
+    def _release(self, model_id, seconds, query_seconds):
+        with self._condition:
+            self._in_flight -= 1
+            if model_id is not None:
+                self._model_in_flight[model_id] -= 1
+                if not self._model_in_flight[model_id]:
+                    del self._model_in_flight[model_id]
+            self._save_seconds = (
+                seconds
+                if self._save_seconds is None
+                else 0.8 * self._save_seconds + 0.2 * seconds
+            )
+            if query_seconds is not None:
+                self.limit.update(query_seconds)
+            self._publish()
+            self._condition.notify_all()
+
+    @contextmanager
+    def admit(self, model_id=None):
+        """
+        Hold a save slot for `model_id` (or only a global one if None) while
+        the block runs. Raises Overloaded if none frees up in time.
+        """
+        self._acquire(model_id)
+        timings = {"queries": 0, "seconds": 0.0}
+
+        def timed(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                timings["queries"] += 1
+                timings["seconds"] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(timed):
+                yield
+        finally:
+            query_seconds = (
+                timings["seconds"] / timings["queries"] if timings["queries"] else None
+            )
+            if query_seconds is not None:
+                metrics.observe("admission.query_latency", query_seconds * 1000)
+            self._release(model_id, time.perf_counter() - started, query_seconds)
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller():
+    """Return the process-wide controller, or None when admission control is disabled"""
+    global _controller
+    if not getattr(settings, "ADMISSION_CONTROL_ENABLED", True):
+        return None
+    with _controller_lock:
+        if _controller is None:
+            _controller = AdmissionController(
+                AdaptiveLimit(
+                    getattr(settings, "ADMISSION_INITIAL_LIMIT", 8),
+                    getattr(settings, "ADMISSION_MIN_LIMIT", 2),
+                    getattr(settings, "ADMISSION_MAX_LIMIT", 64),
+                    tolerance=getattr(settings, "ADMISSION_LATENCY_TOLERANCE", 2.0),
+                ),
+                model_limit=getattr(settings, "ADMISSION_MODEL_LIMIT", 2),
+                queue_size=getattr(settings, "ADMISSION_QUEUE_SIZE", 64),
+                model_queue_size=getattr(settings, "ADMISSION_MODEL_QUEUE_SIZE", 4),
+                timeout=getattr(settings, "ADMISSION_QUEUE_TIMEOUT", 5.0),
+            )
+        return _controller
+
+
+@contextmanager
+def admitted(model_id=None):
+    """admit() on the process-wide controller, or nothing if disabled"""
+    controller = get_admission_controller()
+    if controller is None:
+        yield
+        return
+    with controller.admit(model_id):
+        yield
@@ -2,227 +2,921 @@ from rest_framework import viewsets, serializers
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.decorators import action
-from .models import DataModel, Node, Edge, Settings
+from rest_framework.exceptions import Throttled
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.settings import api_settings
+from django.conf import settings
+from django.db import transaction
+from django.db.models.functions import Length
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from .models import (
+    DataModel,
+    Node,
+    Edge,
+    HubKey,
+    Job,
+    ModelStats,
+    ModelVersion,
+    SearchEntry,
+    Settings,
+)
+from .pooling import database_stats
+from .routing import read_alias, reading_from, remember_write
+from .registry import CONFLICT, describe_groups, lookup, shared_keys
+from .search import search
+from .admission import Overloaded, admitted
+from .coalescing import get_write_buffer
+from .columns import expand_nodes
+from .compression import cached_response, negotiate
+from .copying import duplicate_model, transfer_subgraph
+from .importing import SQLiteSchema, import_schema
+from .integrity import DanglingEdges
+from .layout import ALGORITHMS, LAYERED, layout_model
+from .saving import save_model_graph, save_positions
+from .stats import recompute_stats
+from .validation import SchemaError, check_edges, check_nodes
+from .versioning import rebuild_version
+from . import diffing, jobs, metrics, thumbnails, wire
+import json
 import logging
+import os
+import sqlite3
+import tempfile
 import uuid
 
 logger = logging.getLogger(__name__)
 
+
 class NodeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Node
         fields = "__all__"
 
+
 class EdgeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Edge
         fields = "__all__"
 
 # Serializers for create/update operations (without model field)
+
+
 class NodeCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Node
         fields = ["id", "type", "x", "y", "data"]
 
+
 class EdgeCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Edge
         fields = ["id", "source", "target", "data"]
 
+
 class SettingsSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         """Ensure global_columns is always populated"""
         data = super().to_representation(instance)
-        
+
         # If global_columns is empty, populate with defaults
         if not data.get('global_columns'):
             data['global_columns'] = Settings.get_default_global_columns()
-            
+
         return data
-    
+
     class Meta:
         model = Settings
         fields = [
-            'id', 'theme', 'auto_save', 'auto_save_interval', 'snap_to_grid', 
+            'id', 'theme', 'auto_save', 'auto_save_interval', 'snap_to_grid',
             'grid_size', 'edge_type', 'floating_edges', 'edge_animation', 'show_connection_points',
             'global_columns', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
 
+
 class DataModelSerializer(serializers.ModelSerializer):
     nodes = NodeSerializer(many=True, read_only=True)
     edges = EdgeSerializer(many=True, read_only=True)
-    
+
+    def to_representation(self, instance):
+        """Expand column references of all nodes with one dictionary lookup"""
+        data = super().to_representation(instance)
+        expand_nodes(data['nodes'])
+        return data
+
     class Meta:
         model = DataModel
         fields = "__all__"
 
+
+class ModelStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ModelStats
+        fields = [
+            "node_counts", "column_count", "edge_count", "satellites_per_hub",
+            "link_arity", "orphan_hubs", "updated_at",
+        ]
+
+
+class DataModelListSerializer(DataModelSerializer):
+    # Null for models that were not saved since statistics exist
+    # (see `manage.py recompute_stats`)
+    stats = ModelStatsSerializer(read_only=True)
+
+
+class ModelStatsSummarySerializer(serializers.ModelSerializer):
+    """Model fields and statistics without the node and edge graph"""
+    stats = ModelStatsSerializer(read_only=True)
+
+    class Meta:
+        model = DataModel
+        fields = ["id", "name", "revision", "stats"]
+
+
+class DataModelSummarySerializer(serializers.ModelSerializer):
+    """Model fields without the node and edge graph"""
+
+    class Meta:
+        model = DataModel
+        fields = ["id", "name", "created_at", "revision"]
+
+
+class SubgraphTransferSerializer(serializers.Serializer):
+    target = serializers.PrimaryKeyRelatedField(queryset=DataModel.objects.all())
+    node_ids = serializers.ListField(child=serializers.UUIDField(), allow_empty=False)
+    include_satellites = serializers.BooleanField(default=False)
+    mode = serializers.ChoiceField(choices=['copy', 'move'], default='copy')
+    offset = serializers.DictField(child=serializers.FloatField(), required=False)
+
+    def validate_offset(self, offset):
+        if set(offset) != {'x', 'y'}:
+            raise serializers.ValidationError("Offset needs exactly 'x' and 'y'")
+        return offset
+
+
+class BatchFetchSerializer(serializers.Serializer):
+    MODEL_FIELDS = ['id', 'name', 'created_at', 'revision', 'nodes', 'edges']
+    NODE_FIELDS = ['id', 'type', 'x', 'y', 'data']
+    EDGE_FIELDS = ['id', 'source', 'target', 'data']
+
+    ids = serializers.ListField(
+        child=serializers.UUIDField(), allow_empty=False, max_length=100
+    )
+    fields = serializers.ListField(
+        child=serializers.ChoiceField(choices=MODEL_FIELDS), default=MODEL_FIELDS
+    )
+    node_fields = serializers.ListField(
+        child=serializers.ChoiceField(choices=NODE_FIELDS), default=NODE_FIELDS
+    )
+    edge_fields = serializers.ListField(
+        child=serializers.ChoiceField(choices=EDGE_FIELDS), default=EDGE_FIELDS
+    )
+
+
+class PositionsSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.UUIDField())
+    x = serializers.ListField(child=serializers.FloatField())
+    y = serializers.ListField(child=serializers.FloatField())
+
+    def validate(self, attrs):
+        if not len(attrs['ids']) == len(attrs['x']) == len(attrs['y']):
+            raise serializers.ValidationError(
+                "'ids', 'x' and 'y' must have the same length"
+            )
+        return attrs
+
+
+class LayoutSerializer(serializers.Serializer):
+    algorithm = serializers.ChoiceField(choices=ALGORITHMS, default=LAYERED)
+    iterations = serializers.IntegerField(min_value=1, max_value=1000, default=100)
+    save = serializers.BooleanField(default=True)
+
+
+class DuplicateJobSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=120, required=False, allow_blank=True)
+
+
+class JobSubmitSerializer(serializers.Serializer):
+    # Parameters of each kind that can be submitted for a model
+    PARAMS = {
+        jobs.LAYOUT: LayoutSerializer,
+        jobs.DUPLICATE: DuplicateJobSerializer,
+        jobs.EXPORT: None,
+        jobs.THUMBNAIL: None,
+        jobs.VALIDATE: None,
+    }
+
+    kind = serializers.ChoiceField(choices=list(PARAMS))
+    params = serializers.DictField(default=dict)
+
+    def validate(self, attrs):
+        params_serializer = self.PARAMS[attrs['kind']]
+        if params_serializer is None:
+            return dict(attrs, params={})
+        params = params_serializer(data=attrs['params'])
+        if not params.is_valid():
+            raise serializers.ValidationError({'params': params.errors})
+        return dict(attrs, params=params.validated_data)
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """Job state without its result, which is fetched separately"""
+
+    class Meta:
+        model = Job
+        fields = [
+            "id", "kind", "model", "params", "status", "progress", "message", "error",
+            "worker", "created_at", "started_at", "heartbeat_at", "finished_at",
+        ]
+
+
 class DataModelCreateUpdateSerializer(serializers.ModelSerializer):
     # Use raw data instead of nested serializers to avoid validation conflicts
     nodes = serializers.ListField(required=False)
     edges = serializers.ListField(required=False)
-    
+
     class Meta:
         model = DataModel
-        fields = ["id", "name", "created_at", "nodes", "edges"]
-        read_only_fields = ["id", "created_at"]
-    
+        fields = ["id", "name", "created_at", "revision", "nodes", "edges"]
+        read_only_fields = ["id", "created_at", "revision"]
+
+    def validate_nodes(self, nodes_data):
+        try:
+            check_nodes(nodes_data)
+        except SchemaError as e:
+            raise serializers.ValidationError(e.describe('nodes'))
+        return nodes_data
+
+    def validate_edges(self, edges_data):
+        try:
+            check_edges(edges_data)
+        except SchemaError as e:
+            raise serializers.ValidationError(e.describe('edges'))
+        return edges_data
+
     def create(self, validated_data):
+        with admitted():
+            return self._create(validated_data)
+
+    def _create(self, validated_data):
         nodes_data = validated_data.pop('nodes', [])
         edges_data = validated_data.pop('edges', [])
-        
+
         # Create the model first
         data_model = DataModel.objects.create(**validated_data)
-        
+
         # Create a mapping of old node IDs to new node IDs
         node_id_mapping = {}
-        
+        new_nodes = []
+
         # Create nodes with new UUIDs
         for node_data in nodes_data:
             old_id = node_data.get('id')
             new_id = str(uuid.uuid4())
             node_id_mapping[old_id] = new_id
-            
-            # Create node with new ID
-            Node.objects.create(
-                id=new_id,
-                model=data_model,
-                type=node_data.get('type'),
-                x=node_data.get('x', 0),
-                y=node_data.get('y', 0),
-                data=node_data.get('data', {})
-            )
-        
+            new_nodes.append({
+                'id': new_id,
+                'type': node_data.get('type'),
+                'x': node_data.get('x', 0),
+                'y': node_data.get('y', 0),
+                'data': node_data.get('data', {}),
+            })
+
         # Create edges with updated source/target references
+        new_edges = []
         for edge_data in edges_data:
             old_source = edge_data.get('source')
             old_target = edge_data.get('target')
-            
-            # Map old IDs to new IDs
-            new_source = node_id_mapping.get(old_source, old_source)
-            new_target = node_id_mapping.get(old_target, old_target)
-            
-            Edge.objects.create(
-                id=str(uuid.uuid4()),
-                model=data_model,
-                source=new_source,
-                target=new_target,
-                data=edge_data.get('data', {})
-            )
-        
-        return data_model
-    
+            new_edges.append({
+                'id': str(uuid.uuid4()),
+                'source': node_id_mapping.get(old_source, old_source),
+                'target': node_id_mapping.get(old_target, old_target),
+                'data': edge_data.get('data', {}),
+            })
+
+        return save_model_graph(data_model, new_nodes, new_edges)
+
     def update(self, instance, validated_data):
+        logger.info(
+            f"Updating model {instance.id} with nodes: {'nodes' in validated_data}, "
+            f"edges: {'edges' in validated_data}"
+        )
+
+        # Coalesce with other saves of this model when write-behind is enabled
+        write_buffer = get_write_buffer()
+        if write_buffer is not None:
+            return write_buffer.submit(instance, validated_data)
+
         nodes_data = validated_data.pop('nodes', None)
         edges_data = validated_data.pop('edges', None)
-        
-        logger.info(f"Updating model {instance.id} with nodes: {nodes_data is not None}, edges: {edges_data is not None}")
-        
-        # Update model fields
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
-        
-        # Update nodes if provided
-        if nodes_data is not None:
-            # Validate nodes data
-            for node_data in nodes_data:
-                if not isinstance(node_data, dict) or 'id' not in node_data:
-                    raise serializers.ValidationError("Invalid node data format")
-            
-            # Get existing node IDs
-            existing_node_ids = set(instance.nodes.values_list('id', flat=True))
-            incoming_node_ids = set(node_data['id'] for node_data in nodes_data)
-            
-            # Delete nodes that are no longer present
-            nodes_to_delete = existing_node_ids - incoming_node_ids
-            instance.nodes.filter(id__in=nodes_to_delete).delete()
-            
-            # Update or create nodes
-            for node_data in nodes_data:
-                try:
-                    Node.objects.update_or_create(
-                        id=node_data['id'],
-                        defaults={
-                            'model': instance,
-                            'type': node_data['type'],
-                            'x': node_data['x'],
-                            'y': node_data['y'],
-                            'data': node_data['data'],
-                        }
-                    )
-                except Exception as e:
-                    logger.error(f"Error updating/creating node: {e}, data: {node_data}")
-                    raise
-        
-        # Update edges if provided
-        if edges_data is not None:
-            # Validate edges data
-            for edge_data in edges_data:
-                if not isinstance(edge_data, dict) or 'id' not in edge_data:
-                    raise serializers.ValidationError("Invalid edge data format")
-            
-            # Get existing edge IDs
-            existing_edge_ids = set(instance.edges.values_list('id', flat=True))
-            incoming_edge_ids = set(edge_data['id'] for edge_data in edges_data)
-            
-            # Delete edges that are no longer present
-            edges_to_delete = existing_edge_ids - incoming_edge_ids
-            instance.edges.filter(id__in=edges_to_delete).delete()
-            
-            # Update or create edges
-            for edge_data in edges_data:
-                try:
-                    Edge.objects.update_or_create(
-                        id=edge_data['id'],
-                        defaults={
-                            'model': instance,
-                            'source': edge_data['source'],
-                            'target': edge_data['target'],
-                            'data': edge_data['data'],
-                        }
-                    )
-                except Exception as e:
-                    logger.error(f"Error updating/creating edge: {e}, data: {edge_data}")
-                    raise
-        
-        return instance
+        with admitted(instance.pk):
+            return save_model_graph(instance, nodes_data, edges_data, **validated_data)
 
     def to_representation(self, instance):
         # Use the read serializer for response
         return DataModelSerializer(instance).data
 
+
+class ModelVersionSerializer(serializers.ModelSerializer):
+    size = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = ModelVersion
+        fields = ["revision", "is_snapshot", "codec", "size", "created_at"]
+
+
+class SearchResultSerializer(serializers.ModelSerializer):
+    model_name = serializers.CharField(source='model.name', read_only=True)
+    rank = serializers.SerializerMethodField()
+
+    def get_rank(self, obj):
+        return getattr(obj, 'rank', None)
+
+    class Meta:
+        model = SearchEntry
+        fields = [
+            "model", "model_name", "node_id", "node_type", "label", "columns", "rank"
+        ]
+
+
+class HubKeySerializer(serializers.ModelSerializer):
+    model_name = serializers.CharField(source='model.name', read_only=True)
+
+    class Meta:
+        model = HubKey
+        fields = ["model", "model_name", "node_id", "label", "key_columns"]
+
+
+class SharedKeySerializer(serializers.Serializer):
+    key = serializers.ListField(child=serializers.CharField())
+    status = serializers.CharField()
+    hubs = serializers.IntegerField()
+    models = serializers.IntegerField()
+    definitions = serializers.IntegerField()
+    entries = HubKeySerializer(many=True)
+
+
+class SearchPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
 class DataModelViewSet(viewsets.ModelViewSet):
     queryset = DataModel.objects.all()
-    
+    # Models can also be exchanged as columnar MessagePack (see modeler/wire.py)
+    renderer_classes = wire.renderer_classes(api_settings.DEFAULT_RENDERER_CLASSES)
+    parser_classes = wire.parser_classes(api_settings.DEFAULT_PARSER_CLASSES)
+
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
             return DataModelCreateUpdateSerializer
+        if self.action == 'list':
+            return DataModelListSerializer
         return DataModelSerializer
-    
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'all_stats'):
+            queryset = queryset.select_related('stats')
+        return queryset
+
+    def cached_render(self, request, cache_key, get_data):
+        """
+        Render `get_data()` with the negotiated renderer, compressed and cached
+        under `cache_key`. The browsable API and clients that do not accept
+        a compressed encoding get a regular response.
+        """
+        renderer = request.accepted_renderer
+        encoding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if renderer.format == 'api' or encoding is None:
+            return Response(get_data())
+
+        # Global columns are expanded from the settings, so they are part of the key
+        settings_stamp = Settings.get_instance().updated_at.timestamp()
+        media_type = request.accepted_media_type
+        content_type = (
+            f"{media_type}; charset={renderer.charset}"
+            if renderer.charset
+            else media_type
+        )
+
+        def render():
+            return renderer.render(get_data(), media_type, self.get_renderer_context())
+
+        key = f"{cache_key}:{settings_stamp}:{renderer.format}"
+        return cached_response(key, encoding, content_type, render)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        # Clients read their own writes even when reads go to a lagging replica
+        data = getattr(response, 'data', None)
+        if (
+            request.method not in ('GET', 'HEAD', 'OPTIONS')
+            and 200 <= response.status_code < 300
+            and isinstance(data, dict)
+            and 'revision' in data
+        ):
+            model_id = data.get('id') or kwargs.get('pk')
+            remember_write(response, model_id, data['revision'])
+        return super().finalize_response(request, response, *args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        with reading_from(read_alias(request)):
+            return super().list(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        # The revision comes from the primary, the graph from a replica that has it
+        instance = self.get_object()
+
+        def get_data():
+            with reading_from(read_alias(request, instance)):
+                return self.get_serializer(instance).data
+
+        return self.cached_render(
+            request, f"model:{instance.pk}:{instance.revision}", get_data
+        )
+
+    def dangling_edges_error(self, error):
+        return Response(
+            {
+                'edges': [str(error)],
+                'dangling_edges': [str(edge_id) for edge_id in error.edge_ids],
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    def create(self, request, *args, **kwargs):
+        try:
+            return super().create(request, *args, **kwargs)
+        except Overloaded as e:
+            raise Throttled(wait=e.retry_after, detail=str(e))
+        except DanglingEdges as e:
+            return self.dangling_edges_error(e)
+
     def update(self, request, *args, **kwargs):
         try:
             logger.info(f"Update request data: {request.data}")
             return super().update(request, *args, **kwargs)
+        except Overloaded as e:
+            # Saves over the admission limits are retried by the client
+            # (see modeler/admission.py)
+            raise Throttled(wait=e.retry_after, detail=str(e))
+        except DanglingEdges as e:
+            # Refused by EDGE_INTEGRITY_MODE (see modeler/integrity.py)
+            return self.dangling_edges_error(e)
         except Exception as e:
             logger.error(f"Error in update: {e}")
             return Response(
-                {"error": str(e), "details": "Check server logs for more information"}, 
+                {"error": str(e), "details": "Check server logs for more information"},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """
+        POST /api/models/batch/ - Fetch several models with a fixed number of
+        queries
+        """
+        serializer = BatchFetchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        options = serializer.validated_data
+        ids = list(dict.fromkeys(options['ids']))
+        fields = options['fields']
+
+        with reading_from(read_alias(request)):
+            return Response(self._fetch(ids, fields, options))
+
+    def _fetch(self, ids, fields, options):
+        model_fields = [name for name in fields if name not in ('nodes', 'edges')]
+        rows = DataModel.objects.filter(pk__in=ids).values('id', *model_fields)
+        results = {values['id']: values for values in rows}
+        for name, queryset, related_fields in [
+            ('nodes', Node.objects, options['node_fields']),
+            ('edges', Edge.objects, options['edge_fields']),
+        ]:
+            if name not in fields:
+                continue
+            for values in results.values():
+                values[name] = []
+            # One query for all models instead of one per model
+            rows = queryset.filter(model_id__in=list(results))
+            for row in rows.values('model_id', *related_fields):
+                results[row.pop('model_id')][name].append(row)
+
+        if 'nodes' in fields and 'data' in options['node_fields']:
+            expand_nodes(
+                [node for values in results.values() for node in values['nodes']]
+            )
+        if 'id' not in model_fields:
+            for values in results.values():
+                values.pop('id')
+
+        return {
+            'results': [results[model_id] for model_id in ids if model_id in results],
+            'missing': [model_id for model_id in ids if model_id not in results],
+        }
+
+    @action(detail=False, methods=['post'], url_path='import-schema')
+    def import_schema(self, request):
+        """
+        POST /api/models/import-schema/ - Create a model from an uploaded SQLite
+        database, as a job with ?async=true
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response(
+                {"error": "A SQLite database 'file' is required"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        name = request.data.get('name') or os.path.splitext(upload.name)[0]
+        if request.query_params.get('async', '').lower() in ('1', 'true'):
+            # The worker imports from a copy of the upload and deletes it afterwards
+            directory = settings.JOB_FILES_DIR
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"{uuid.uuid4()}.sqlite3")
+            with open(path, 'wb') as database:
+                for chunk in upload.chunks():
+                    database.write(chunk)
+            job = jobs.submit(jobs.IMPORT_SCHEMA, params={'path': path, 'name': name})
+            return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+        # SQLite needs a real file to open
+        with tempfile.NamedTemporaryFile(suffix='.sqlite3') as database:
+            for chunk in upload.chunks():
+                database.write(chunk)
+            database.flush()
+            try:
+                data_model, summary = import_schema(SQLiteSchema(database.name), name)
+            except sqlite3.DatabaseError as e:
+                return Response(
+                    {"error": f"Not a readable SQLite database: {e}"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+        return Response(
+            dict(DataModelSummarySerializer(data_model).data, summary=summary),
+            status=status.HTTP_201_CREATED,
+        )
+
+    @action(detail=True, methods=['post'])
+    def duplicate(self, request, pk=None):
+        """POST /api/models/{id}/duplicate/ - Copy the model inside the database"""
+        source = self.get_object()
+        copy = duplicate_model(source, name=request.data.get('name') or None)
+        return Response(
+            DataModelSummarySerializer(copy).data, status=status.HTTP_201_CREATED
+        )
+
+    @action(detail=True, methods=['post'])
+    def subgraph(self, request, pk=None):
+        """POST /api/models/{id}/subgraph/ - Copy or move nodes into another model"""
+        source = self.get_object()
+        serializer = SubgraphTransferSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        options = serializer.validated_data
+        offset = options.get('offset')
+
+        try:
+            result = transfer_subgraph(
+                source,
+                options['target'],
+                options['node_ids'],
+                include_satellites=options['include_satellites'],
+                move=options['mode'] == 'move',
+                offset=(offset['x'], offset['y']) if offset else None,
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
+
+    @action(detail=True, methods=['post'])
+    def positions(self, request, pk=None):
+        """POST /api/models/{id}/positions/ - Move nodes without rewriting their data"""
+        data_model = self.get_object()
+        serializer = PositionsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        options = serializer.validated_data
+
+        positions = dict(zip(options['ids'], zip(options['x'], options['y'])))
+        moved = save_positions(data_model, positions)
+        return Response({'revision': data_model.revision, 'moved': moved})
+
+    @action(detail=True, methods=['post'])
+    def layout(self, request, pk=None):
+        """POST /api/models/{id}/layout/ - Arrange the nodes automatically"""
+        data_model = self.get_object()
+        serializer = LayoutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        options = serializer.validated_data
+
+        try:
+            positions = layout_model(
+                data_model,
+                options['algorithm'],
+                options['iterations'],
+                save=options['save'],
+            )
+        except RuntimeError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'revision': data_model.revision,
+            'positions': {
+                str(node_id): {'x': x, 'y': y} for node_id, (x, y) in positions.items()
+            },
+        })
+
+    @action(detail=True, methods=['get', 'post'], url_path='jobs')
+    def model_jobs(self, request, pk=None):
+        """
+        GET/POST /api/models/{id}/jobs/ - List the model's jobs or run an
+        operation in the background
+        """
+        data_model = self.get_object()
+        if request.method == 'GET':
+            recent = data_model.jobs.order_by('-created_at')[:50]
+            return Response(JobSerializer(recent, many=True).data)
+
+        serializer = JobSubmitSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        job = jobs.submit(
+            serializer.validated_data['kind'],
+            data_model,
+            serializer.validated_data['params'],
+        )
+        return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=['get'], url_path='stats')
+    def all_stats(self, request):
+        """GET /api/models/stats/ - Statistics of all models, without their graphs"""
+        with reading_from(read_alias(request)):
+            models = self.get_queryset().order_by('name')
+            return Response(ModelStatsSummarySerializer(models, many=True).data)
+
+    @action(detail=True, methods=['get'])
+    def stats(self, request, pk=None):
+        """
+        GET /api/models/{id}/stats/ - Node, column and edge counts and hub,
+        satellite and link structure
+        """
+        data_model = self.get_object()
+        model_stats = ModelStats.objects.filter(model=data_model).first()
+        if model_stats is None:
+            # Models saved before statistics existed get them on first use
+            with transaction.atomic():
+                model_stats = recompute_stats(data_model)
+        return Response(ModelStatsSerializer(model_stats).data)
+
+    @action(detail=True, methods=['get'])
+    def thumbnail(self, request, pk=None):
+        """
+        GET /api/models/{id}/thumbnail/ - SVG preview of the model's nodes
+        and edges
+        """
+        data_model = self.get_object()
+        thumbnail = thumbnails.cached(data_model)
+        if thumbnail is None or thumbnail[0] < data_model.revision:
+            if thumbnails.renders_inline(data_model):
+                with reading_from(read_alias(request, data_model)):
+                    thumbnail = thumbnails.refresh(data_model)
+                metrics.incr('thumbnails.rendered')
+            else:
+                # Large models are rendered in the background, the outdated
+                # thumbnail is served until then
+                job = (
+                    data_model.jobs.filter(
+                        kind=jobs.THUMBNAIL, status__in=[Job.QUEUED, Job.RUNNING]
+                    ).first()
+                    or jobs.submit(jobs.THUMBNAIL, data_model)
+                )
+                if thumbnail is None:
+                    return Response(
+                        JobSerializer(job).data, status=status.HTTP_202_ACCEPTED
+                    )
+
+        revision, svg = thumbnail
+        etag = f'"{data_model.pk}-{revision}"'
+        if etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(svg, content_type='image/svg+xml')
+        response['ETag'] = etag
+        # Clients revalidate with the ETag, which changes with the revision
+        response['Cache-Control'] = 'no-cache'
+        response['X-Thumbnail-Revision'] = revision
+        return response
+
+    @action(detail=True, methods=['get'])
+    def versions(self, request, pk=None):
+        """GET /api/models/{id}/versions/ - List the model's history"""
+        data_model = self.get_object()
+        # Only the payload length is needed, not its content
+        versions = (
+            data_model.versions.defer('payload')
+            .annotate(size=Length('payload'))
+            .order_by('-revision')
+        )
+        return Response(ModelVersionSerializer(versions, many=True).data)
+
+    @action(detail=True, methods=['get'], url_path=r'versions/(?P<revision>\d+)')
+    def version(self, request, pk=None, revision=None):
+        """GET /api/models/{id}/versions/{revision}/ - Get the model as of a revision"""
+        data_model = self.get_object()
+        try:
+            state = rebuild_version(data_model.pk, int(revision))
+        except ModelVersion.DoesNotExist as e:
+            return Response({"error": str(e)}, status=status.HTTP_404_NOT_FOUND)
+
+        # Rebuilt versions are cached, expand copies of the nodes
+        nodes = expand_nodes([dict(node) for node in state['nodes']])
+        return Response(dict(state, nodes=nodes))
+
+    def diff_response(self, request, old, new):
+        """Diff document, or one JSON record per line with ?stream=true"""
+        if request.query_params.get('stream', '').lower() in ('1', 'true'):
+            lines = (
+                json.dumps(record, default=str) + '\n'
+                for record in diffing.diff_changes(old, new)
+            )
+            return StreamingHttpResponse(lines, content_type='application/x-ndjson')
+        return Response(diffing.diff(old, new))
+
+    @action(
+        detail=True, methods=['get'], url_path=r'diff/(?P<other>[0-9a-fA-F-]{32,36})'
+    )
+    def diff(self, request, pk=None, other=None):
+        """GET /api/models/{a}/diff/{b}/ - Structural diff from model a to model b"""
+        data_model = self.get_object()
+        other_model = get_object_or_404(DataModel, pk=other)
+        return self.diff_response(
+            request,
+            diffing.Graph.from_model(data_model),
+            diffing.Graph.from_model(other_model),
+        )
+
+    @action(
+        detail=True,
+        methods=['get'],
+        url_path=r'versions/(?P<revision>\d+)/diff/(?P<other>\d+)',
+    )
+    def version_diff(self, request, pk=None, revision=None, other=None):
+        """
+        GET /api/models/{id}/versions/{a}/diff/{b}/ - Structural diff between
+        two revisions
+        """
+        data_model = self.get_object()
+        try:
+            old = diffing.Graph.from_version(data_model.pk, int(revision))
+            new = diffing.Graph.from_version(data_model.pk, int(other))
+        except ModelVersion.DoesNotExist as e:
+            return Response({"error": str(e)}, status=status.HTTP_404_NOT_FOUND)
+        return self.diff_response(request, old, new)
+
+    @action(detail=True, methods=['post'])
+    def rollback(self, request, pk=None):
+        """POST /api/models/{id}/rollback/ - Restore a revision as a new revision"""
+        data_model = self.get_object()
+        try:
+            revision = int(request.data.get('revision'))
+            state = rebuild_version(data_model.pk, revision)
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "A numeric 'revision' is required"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        except ModelVersion.DoesNotExist as e:
+            return Response({"error": str(e)}, status=status.HTTP_404_NOT_FOUND)
+
+        save_model_graph(data_model, state['nodes'], state['edges'], name=state['name'])
+        return Response(DataModelSerializer(data_model).data)
+
+
+class SearchViewSet(viewsets.ViewSet):
+    """Full-text search over the nodes of all models"""
+
+    def list(self, request):
+        """GET /api/search/?q= - Ranked, paginated node matches"""
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response(
+                {"error": "The 'q' parameter is required"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        paginator = SearchPagination()
+        with reading_from(read_alias(request)):
+            page = paginator.paginate_queryset(search(query), request, view=self)
+            return paginator.get_paginated_response(
+                SearchResultSerializer(page, many=True).data
+            )
+
+
+class HubRegistryViewSet(viewsets.ViewSet):
+    """Business keys of the hubs of all models"""
+
+    def list(self, request):
+        """
+        GET /api/hubs/?key= - Hubs whose business key has exactly the given
+        columns
+        """
+        key = request.query_params.get('key', '')
+        names = [name for name in key.split(',') if name.strip()]
+        if not names:
+            return Response(
+                {"error": "The 'key' parameter is required"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        paginator = SearchPagination()
+        page = paginator.paginate_queryset(lookup(names), request, view=self)
+        return paginator.get_paginated_response(HubKeySerializer(page, many=True).data)
+
+    @action(detail=False, methods=['get'])
+    def duplicates(self, request):
+        """GET /api/hubs/duplicates/ - Business keys shared by several hubs"""
+        groups = shared_keys()
+        if request.query_params.get('status') == CONFLICT:
+            groups = groups.filter(definitions__gt=1)
+
+        paginator = SearchPagination()
+        page = paginator.paginate_queryset(groups, request, view=self)
+        return paginator.get_paginated_response(
+            SharedKeySerializer(describe_groups(page), many=True).data
+        )
+
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    """State and results of background jobs (see modeler/jobs.py)"""
+    queryset = Job.objects.order_by('-created_at')
+    serializer_class = JobSerializer
+    pagination_class = SearchPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        job_status = self.request.query_params.get('status')
+        return queryset.filter(status=job_status) if job_status else queryset
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        GET /api/jobs/{id}/?wait= - Job state, waiting up to `wait` seconds for
+        it to finish
+        """
+        job = self.get_object()
+        try:
+            wait = float(request.query_params.get('wait', 0))
+            timeout = min(wait, settings.JOB_MAX_WAIT)
+        except ValueError:
+            return Response(
+                {"error": "'wait' must be a number of seconds"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if timeout > 0:
+            jobs.wait(job, timeout)
+        return Response(self.get_serializer(job).data)
+
+    @action(detail=True, methods=['get'])
+    def result(self, request, pk=None):
+        """GET /api/jobs/{id}/result/ - Result of a succeeded job"""
+        job = self.get_object()
+        if job.status == Job.FAILED:
+            return Response({"error": job.error}, status=status.HTTP_409_CONFLICT)
+        if job.status != Job.SUCCEEDED:
+            return Response(
+                {"error": f"Job is {job.status}"}, status=status.HTTP_409_CONFLICT
+            )
+        return Response(job.result)
+
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        """POST /api/jobs/{id}/cancel/ - Cancel a job that has not started"""
+        job = self.get_object()
+        if not jobs.cancel(job):
+            return Response(
+                {"error": f"Job is {job.status}"}, status=status.HTTP_409_CONFLICT
+            )
+        return Response(self.get_serializer(job).data)
+
+
+class MetricsViewSet(viewsets.ViewSet):
+    """Read-only view of the in-process metrics registry"""
+
+    def list(self, request):
+        """GET /api/metrics/ - Get counters, gauges, timings and database stats"""
+        return Response(dict(metrics.snapshot(), databases=database_stats()))
+
+
 class SettingsViewSet(viewsets.ViewSet):
     """
     Custom ViewSet for singleton Settings object.
     Handles all operations at the collection level since there's only one settings instance.
     """
-    
+
     def list(self, request):
         """GET /api/settings/ - Get the settings"""
         settings = Settings.get_instance()
         serializer = SettingsSerializer(settings)
         return Response(serializer.data)
-    
+
     def create(self, request):
         """POST /api/settings/ - Update settings (same as patch for singleton)"""
         settings = Settings.get_instance()
@@ -230,7 +924,7 @@ class SettingsViewSet(viewsets.ViewSet):
         serializer.is_valid(raise_exception=True)
         serializer.save()
         return Response(serializer.data, status=status.HTTP_200_OK)
-    
+
     def update(self, request, pk=None):
         """PUT /api/settings/{id}/ - Update settings"""
         settings = Settings.get_instance()
@@ -238,7 +932,7 @@ class SettingsViewSet(viewsets.ViewSet):
         serializer.is_valid(raise_exception=True)
         serializer.save()
         return Response(serializer.data)
-    
+
     def partial_update(self, request, pk=None):
         """PATCH /api/settings/{id}/ - Partially update settings"""
         settings = Settings.get_instance()
@@ -246,7 +940,7 @@ class SettingsViewSet(viewsets.ViewSet):
         serializer.is_valid(raise_exception=True)
         serializer.save()
         return Response(serializer.data)
-    
+
     @action(detail=False, methods=['patch'])
     def patch_settings(self, request):
         """PATCH /api/settings/ - Handle PATCH at collection level"""
@@ -255,7 +949,7 @@ class SettingsViewSet(viewsets.ViewSet):
         serializer.is_valid(raise_exception=True)
         serializer.save()
         return Response(serializer.data)
-    
+
     @action(detail=False, methods=['post'])
     def reset(self, request):
         """POST /api/settings/reset/ - Reset settings to defaults"""
@@ -271,6 +965,6 @@ class SettingsViewSet(viewsets.ViewSet):
         settings.default_satellite_prefix = 'SAT_'
         settings.export_format = 'json'
         settings.save()
-        
+
         serializer = SettingsSerializer(settings)
-        return Response(serializer.data) 
\ No newline at end of file
+        return Response(serializer.data)
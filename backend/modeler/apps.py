@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class ModelerConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "modeler"
+
+    def ready(self):
+        from .pooling import on_connection_created
+
+        connection_created.connect(
+            on_connection_created, dispatch_uid="modeler.connection_created"
+        )
@@ -0,0 +1,96 @@
+"""
+Helpers shared by the bench_* management commands.
+"""
+import random
+import time
+import uuid
+
+
+def synthetic_graph(node_count, columns_per_node=6, seed=0):
+    """
+    Build a Data Vault shaped graph in the format the client sends.
+
+    Every fourth node is a hub, every fourth a link between two hubs and the
+    rest are satellites attached to a hub. Returns (nodes, edges).
+    """
+    rng = random.Random(seed)
+    nodes = []
+    edges = []
+    hubs = []
+
+    def make_id():
+        return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+    for index in range(node_count):
+        if index % 4 == 0 or not hubs:
+            node_type = "HUB"
+        elif index % 4 == 1 and len(hubs) > 1:
+            node_type = "LNK"
+        else:
+            node_type = "SAT"
+        node_id = make_id()
+        # Column names come from a shared vocabulary, like attributes reused
+        # across sources
+        columns = []
+        for column in range(columns_per_node):
+            attribute = rng.randrange(400)
+            columns.append(
+                {
+                    "id": f"col_{attribute}",
+                    "name": f"attr_{attribute}",
+                    "dataType": ["VARCHAR(100)", "INTEGER", "TIMESTAMP", "BINARY(20)"][
+                        attribute % 4
+                    ],
+                    "markers": ["BK"] if column == 0 else [],
+                }
+            )
+        nodes.append(
+            {
+                "id": node_id,
+                "type": node_type,
+                "x": float(rng.randint(0, 20000)),
+                "y": float(rng.randint(0, 20000)),
+                "data": {
+                    "label": f"{node_type} {index}",
+                    "type": node_type,
+                    "columns": columns,
+                },
+            }
+        )
+
+        if node_type == "HUB":
+            hubs.append(node_id)
+            continue
+        targets = rng.sample(hubs, 2) if node_type == "LNK" else [rng.choice(hubs)]
+        for hub_id in targets:
+            edges.append(
+                {"id": make_id(), "source": hub_id, "target": node_id, "data": {}}
+            )
+
+    return nodes, edges
+
+
+def timed(fn, repeat=5):
+    """Run `fn` `repeat` times and return (best milliseconds, last result)"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def write_table(stdout, headers, rows):
+    """Write rows as a plain aligned text table"""
+    rows = [[str(cell) for cell in row] for row in rows]
+    widths = [
+        max(len(str(header)), *(len(row[i]) for row in rows))
+        for i, header in enumerate(headers)
+    ]
+    stdout.write(
+        "  ".join(str(header).ljust(width) for header, width in zip(headers, widths))
+    )
+    for row in rows:
+        stdout.write("  ".join(cell.ljust(width) for cell, width in zip(row, widths)))
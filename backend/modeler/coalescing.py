@@ -0,0 +1,165 @@
+"""
+Write-behind coalescing of rapid model saves.
+
+When enabled (WRITE_BEHIND_ENABLED), the first save of a model opens a short
+window (WRITE_BEHIND_WINDOW_MS). Saves of the same model that arrive within
+the window are merged last-writer-wins per node and edge, flushed as one
+bulk write, and every merged request is acknowledged with the resulting
+revision.
+
+Merged requests wait at most WRITE_BEHIND_FLUSH_TIMEOUT seconds for the
+flush. If the request flushing the batch stalls or dies, they are answered
+like saves over the admission limits (429 with Retry-After) and the client
+sends them again; saving them directly could overwrite newer saves merged
+into the stalled batch.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+from . import metrics
+from .admission import Overloaded, admitted
+from .saving import save_model_graph
+
+logger = logging.getLogger(__name__)
+
+
+def _merge_items(merged, items):
+    # Each save carries the full collection: entries missing from a later
+    # save were deleted by that writer, present ones overwrite earlier values
+    incoming = {str(item["id"]): item for item in items}
+    if merged is None:
+        return incoming
+    return {
+        item_id: incoming[item_id]
+        for item_id in list(merged) + list(incoming)
+        if item_id in incoming
+    }
+
+
+def merge_payloads(payloads):
+    """
+    Merge save payloads in arrival order, last writer wins per node and edge.
+
+    Each payload is a dict with optional `nodes`, `edges` and model fields.
+    Returns a single payload with the same shape.
+    """
+    fields = {}
+    nodes = None
+    edges = None
+    for payload in payloads:
+        payload = dict(payload)
+        payload_nodes = payload.pop("nodes", None)
+        payload_edges = payload.pop("edges", None)
+        fields.update(payload)
+        if payload_nodes is not None:
+            nodes = _merge_items(nodes, payload_nodes)
+        if payload_edges is not None:
+            edges = _merge_items(edges, payload_edges)
+
+    merged = dict(fields)
+    if nodes is not None:
+        merged["nodes"] = list(nodes.values())
+    if edges is not None:
+        merged["edges"] = list(edges.values())
+    return merged
+
+
+class _Batch:
+    def __init__(self):
+        self.payloads = []
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class WriteBehindBuffer:
+    """Per-model buffer that coalesces saves arriving within `window` seconds"""
+
+    def __init__(self, window, flush_timeout=30.0):
+        self.window = window
+        self.flush_timeout = flush_timeout
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def _depth(self):
+        return sum(len(batch.payloads) for batch in self._pending.values())
+
+    def submit(self, instance, payload):
+        """Queue a save payload for `instance` and block until it is flushed"""
+        with self._lock:
+            batch = self._pending.get(instance.pk)
+            is_leader = batch is None
+            if is_leader:
+                batch = self._pending[instance.pk] = _Batch()
+            batch.payloads.append(payload)
+            metrics.set_gauge("write_buffer.depth", self._depth())
+
+        if not is_leader:
+            if not batch.done.wait(self.window + self.flush_timeout):
+                with self._lock:
+                    # A dead leader never closes its batch; later saves start a new one
+                    if self._pending.get(instance.pk) is batch:
+                        del self._pending[instance.pk]
+                        metrics.set_gauge("write_buffer.depth", self._depth())
+                metrics.incr("write_buffer.flush_timeouts")
+                logger.warning(
+                    f"Coalesced save of model {instance.pk} was not flushed in time"
+                )
+                raise Overloaded(retry_after=max(1, round(self.window)))
+            if batch.error is not None:
+                raise batch.error
+            return batch.result
+
+        time.sleep(self.window)
+        with self._lock:
+            # Saves arriving from now on open a new batch
+            del self._pending[instance.pk]
+            metrics.set_gauge("write_buffer.depth", self._depth())
+
+        return self._flush(instance, batch)
+
+    def _flush(self, instance, batch):
+        merged = merge_payloads(batch.payloads)
+        nodes_data = merged.pop("nodes", None)
+        edges_data = merged.pop("edges", None)
+        started = time.perf_counter()
+        try:
+            with admitted(instance.pk):
+                batch.result = save_model_graph(
+                    instance, nodes_data, edges_data, **merged
+                )
+            return batch.result
+        except Exception as e:
+            batch.error = e
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            metrics.observe("write_buffer.flush_latency", elapsed_ms)
+            metrics.incr("write_buffer.flushes")
+            metrics.incr("write_buffer.merged_requests", len(batch.payloads))
+            logger.info(
+                f"Flushed {len(batch.payloads)} coalesced save(s) of model "
+                f"{instance.pk} in {elapsed_ms:.1f}ms"
+            )
+            batch.done.set()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_write_buffer():
+    """Return the process-wide buffer, or None when coalescing is disabled"""
+    global _buffer
+    if not getattr(settings, "WRITE_BEHIND_ENABLED", False):
+        return None
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = WriteBehindBuffer(
+                getattr(settings, "WRITE_BEHIND_WINDOW_MS", 50) / 1000,
+                getattr(settings, "WRITE_BEHIND_FLUSH_TIMEOUT", 30.0),
+            )
+        return _buffer
@@ -0,0 +1,173 @@
+"""
+Deduplicated column dictionary.
+
+Column definitions in Node.data['columns'] are stored once in the
+content-addressed ColumnDefinition table. A stored node keeps an ordered
+list of references in data['columnRefs'] instead: the hash of a column
+definition, or "global:<id>" for a column from Settings.global_columns,
+which is expanded from the current settings at serialization time.
+"""
+import hashlib
+import json
+
+from .models import ColumnDefinition, Settings
+
+COLUMNS_KEY = "columns"
+REFS_KEY = "columnRefs"
+GLOBAL_PREFIX = "global:"
+BATCH_SIZE = 500
+
+
+def column_hash(definition):
+    """Stable content hash of a column definition"""
+    canonical = json.dumps(definition, sort_keys=True, separators=(",", ":"))
+    return hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+
+
+def compact_node_data(data, global_ids):
+    """
+    Replace inline columns by references.
+
+    Returns the compacted data and a dict of hash -> definition for the
+    columns that need to be in the dictionary. Data without inline columns
+    is returned unchanged, so compacting is idempotent.
+    """
+    if not isinstance(data, dict) or not isinstance(data.get(COLUMNS_KEY), list):
+        return data, {}
+
+    compact = {key: value for key, value in data.items() if key != COLUMNS_KEY}
+    refs = []
+    definitions = {}
+    for column in data[COLUMNS_KEY]:
+        if isinstance(column, dict) and column.get("id") in global_ids:
+            refs.append(GLOBAL_PREFIX + column["id"])
+            continue
+        digest = column_hash(column)
+        definitions[digest] = column
+        refs.append(digest)
+    compact[REFS_KEY] = refs
+    return compact, definitions
+
+
+def expand_node_data(data, definitions, global_columns):
+    """
+    Inverse of compact_node_data().
+
+    `definitions` maps hashes to column definitions and `global_columns`
+    maps global column ids to their current definition in the settings.
+    Disabled or removed global columns are left out.
+    """
+    if not isinstance(data, dict) or REFS_KEY not in data:
+        return data
+
+    expanded = {key: value for key, value in data.items() if key != REFS_KEY}
+    columns = []
+    for ref in data[REFS_KEY]:
+        if ref.startswith(GLOBAL_PREFIX):
+            column = global_columns.get(ref[len(GLOBAL_PREFIX) :])
+            if column is not None and column.get("isEnabled", True):
+                columns.append(dict(column, isGlobal=True))
+        elif ref in definitions:
+            columns.append(definitions[ref])
+    expanded[COLUMNS_KEY] = columns
+    return expanded
+
+
+def marker_name(marker):
+    """Markers are stored as plain names or as objects with a `type`"""
+    return marker.get("type", "") if isinstance(marker, dict) else str(marker)
+
+
+def _global_columns():
+    return {
+        column["id"]: column
+        for column in Settings.get_instance().global_columns
+        if "id" in column
+    }
+
+
+def compact_nodes(nodes_data):
+    """
+    Compact the columns of incoming node dicts and store new definitions.
+
+    Returns new node dicts (the input is not modified) and the definitions
+    of all columns they reference.
+    """
+    if not any(
+        isinstance(node.get("data"), dict) and COLUMNS_KEY in node["data"]
+        for node in nodes_data
+    ):
+        return nodes_data, {}
+
+    global_ids = set(_global_columns())
+    compacted = []
+    definitions = {}
+    for node_data in nodes_data:
+        data, node_definitions = compact_node_data(
+            node_data.get("data", {}), global_ids
+        )
+        definitions.update(node_definitions)
+        compacted.append(dict(node_data, data=data))
+
+    # Most columns are already in the dictionary, only insert the new ones
+    missing = dict(definitions)
+    hashes = list(definitions)
+    for start in range(0, len(hashes), BATCH_SIZE):
+        existing = ColumnDefinition.objects.filter(
+            hash__in=hashes[start : start + BATCH_SIZE]
+        )
+        for digest in existing.values_list("hash", flat=True):
+            del missing[digest]
+    ColumnDefinition.objects.bulk_create(
+        [
+            ColumnDefinition(hash=digest, definition=definition)
+            for digest, definition in missing.items()
+        ],
+        ignore_conflicts=True,
+        batch_size=BATCH_SIZE,
+    )
+    return compacted, definitions
+
+
+def load_definitions(datas):
+    """Fetch the dictionary entries referenced by a set of node data dicts"""
+    hashes = {
+        ref
+        for data in datas
+        if isinstance(data, dict)
+        for ref in data.get(REFS_KEY, ())
+        if not ref.startswith(GLOBAL_PREFIX)
+    }
+    hashes = list(hashes)
+    definitions = {}
+    for start in range(0, len(hashes), BATCH_SIZE):
+        rows = ColumnDefinition.objects.filter(
+            hash__in=hashes[start : start + BATCH_SIZE]
+        )
+        definitions.update(rows.values_list("hash", "definition"))
+    return definitions
+
+
+def has_unknown_refs(data, definitions):
+    """Whether `data` references dictionary columns missing from `definitions`"""
+    refs = data.get(REFS_KEY, ()) if isinstance(data, dict) else ()
+    return any(
+        ref not in definitions and not ref.startswith(GLOBAL_PREFIX) for ref in refs
+    )
+
+
+def expand_nodes(nodes):
+    """Expand the column references of serialized node dicts in place"""
+    compacted = [
+        node
+        for node in nodes
+        if isinstance(node.get("data"), dict) and REFS_KEY in node["data"]
+    ]
+    if not compacted:
+        return nodes
+
+    definitions = load_definitions(node["data"] for node in compacted)
+    global_columns = _global_columns()
+    for node in compacted:
+        node["data"] = expand_node_data(node["data"], definitions, global_columns)
+    return nodes
@@ -0,0 +1,137 @@
+"""
+Response compression with Brotli/gzip negotiation.
+
+ResponseCompressionMiddleware compresses API responses per request. Only
+JSON and MessagePack bodies are compressed: HTML pages such as the admin
+carry CSRF tokens next to content an attacker may control, which would
+make them open to BREACH-style attacks once compressed. Large model
+bodies are instead rendered and compressed once per model revision by
+cached_response() and served from the "responses" cache.
+"""
+import gzip
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from . import metrics
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+BROTLI = "br"
+GZIP = "gzip"
+
+# API bodies, which hold no CSRF tokens or other secrets (see modeler/wire.py)
+COMPRESSIBLE_TYPES = {"application/json", "application/x-msgpack"}
+
+
+def available_encodings():
+    """Supported encodings in order of preference"""
+    return [BROTLI, GZIP] if brotli is not None else [GZIP]
+
+
+def negotiate(accept_encoding):
+    """Pick the preferred encoding accepted by the client, or None"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    for encoding in available_encodings():
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body, encoding):
+    if encoding == BROTLI:
+        return brotli.compress(body, quality=getattr(settings, "BROTLI_QUALITY", 5))
+    return gzip.compress(
+        body, compresslevel=getattr(settings, "GZIP_LEVEL", 6), mtime=0
+    )
+
+
+def _compress_timed(body, encoding):
+    started = time.perf_counter()
+    compressed = compress(body, encoding)
+    metrics.observe(f"compression.{encoding}", (time.perf_counter() - started) * 1000)
+    return compressed
+
+
+def cached_response(cache_key, encoding, content_type, render):
+    """
+    Serve a body compressed with `encoding` from the response cache.
+
+    `cache_key` must change whenever the body would change (for example by
+    including the model revision); `render` produces the uncompressed body
+    on a cache miss, which is then compressed once and cached.
+    """
+    cache = caches[getattr(settings, "RESPONSE_CACHE_ALIAS", "default")]
+    variant_key = f"{cache_key}:{encoding}"
+
+    body = cache.get(variant_key)
+    if body is None:
+        metrics.incr("response_cache.misses")
+        body = _compress_timed(render(), encoding)
+        cache.set(variant_key, body)
+    else:
+        metrics.incr("response_cache.hits")
+
+    response = HttpResponse(body, content_type=content_type)
+    response["Content-Encoding"] = encoding
+    patch_vary_headers(response, ("Accept-Encoding",))
+    return response
+
+
+class ResponseCompressionMiddleware:
+    """
+    Compress API responses larger than COMPRESSION_MIN_SIZE bytes with the
+    best encoding the client accepts. Responses of other content types,
+    streamed or already encoded are passed through.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.streaming or response.has_header("Content-Encoding"):
+            return response
+        content_type = (
+            response.get("Content-Type", "").partition(";")[0].strip().lower()
+        )
+        if content_type not in COMPRESSIBLE_TYPES:
+            return response
+        if len(response.content) < getattr(settings, "COMPRESSION_MIN_SIZE", 1024):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = negotiate(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if encoding is None:
+            return response
+
+        compressed = _compress_timed(response.content, encoding)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response["Content-Length"] = str(len(compressed))
+        response["Content-Encoding"] = encoding
+        if response.has_header("ETag"):
+            # The representation changed, a strong validator no longer applies
+            response["ETag"] = (
+                response["ETag"]
+                if response["ETag"].startswith("W/")
+                else f"W/{response['ETag']}"
+            )
+        return response
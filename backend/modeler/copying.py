@@ -0,0 +1,403 @@
+"""
+Set-based copies of model graphs.
+
+Rows are copied with INSERT ... SELECT. New node and edge ids are derived
+inside the database as md5(salt || old id), so edge endpoints can be
+remapped with the same expression and no id mapping has to leave the
+database.
+
+Subgraph transfers record their changes like saves do: the transferred
+rows are read back once, and the history delta and statistics of each
+model are updated from them, so the cost follows the subgraph rather than
+the models.
+"""
+import hashlib
+import json
+import math
+import uuid
+
+from django.db import connection, transaction
+from django.db.models import F, Max, Min, Q
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from .models import DataModel, Edge, HubKey, ModelStats, Node, SearchEntry, Settings
+from .saving import RowChanges, save_model_graph
+from .stats import recompute_stats, update_stats
+from .versioning import record_version
+
+# Horizontal gap between existing nodes and a copied or moved subgraph
+PLACEMENT_GAP = 200
+
+
+def _remap(column):
+    """SQL expression deriving a new UUID for `column` from a salt parameter"""
+    if connection.vendor == "postgresql":
+        return f"md5(%s || {column}::text)::uuid"
+    # Django stores UUIDs as 32 hex digits on SQLite and registers MD5() there
+    return f"MD5(%s || {column})"
+
+
+def remap_id(salt, old_id):
+    """Python equivalent of the _remap() expression"""
+    old = (
+        str(old_id) if connection.vendor == "postgresql" else uuid.UUID(str(old_id)).hex
+    )
+    return uuid.UUID(hashlib.md5(f"{salt}{old}".encode()).hexdigest())
+
+
+def supports_set_based_copy():
+    return connection.vendor in ("postgresql", "sqlite")
+
+
+def _db_uuid(value):
+    return DataModel._meta.pk.get_db_prep_value(value, connection)
+
+
+def _in_selection(column):
+    """SQL condition matching `column` against a selection parameter"""
+    if connection.vendor == "postgresql":
+        return f"{column} = ANY(%s::uuid[])"
+    return f"{column} IN (SELECT value FROM json_each(%s))"
+
+
+def _selected_ids(selection):
+    """Subquery of the ids in a selection parameter, for filtering querysets"""
+    if connection.vendor == "postgresql":
+        return RawSQL("SELECT unnest(%s::uuid[])", [selection])
+    return RawSQL("SELECT value FROM json_each(%s)", [selection])
+
+
+def _selection_param(node_ids):
+    """Pass a whole id set as a single parameter, so queries don't grow with it"""
+    if connection.vendor == "postgresql":
+        return [str(node_id) for node_id in node_ids]
+    return json.dumps([uuid.UUID(str(node_id)).hex for node_id in node_ids])
+
+
+def _copy_nodes(cursor, salt, source_id, target_id, where="", params=(), offset=(0, 0)):
+    table = Node._meta.db_table
+    cursor.execute(
+        f"INSERT INTO {table} (id, model_id, type, x, y, data) "
+        f"SELECT {_remap('id')}, %s, type, x + %s, y + %s, data FROM {table} "
+        f"WHERE model_id = %s {where}",
+        [
+            salt,
+            _db_uuid(target_id),
+            offset[0],
+            offset[1],
+            _db_uuid(source_id),
+            *params,
+        ],
+    )
+    return cursor.rowcount
+
+
+def _copy_edges(cursor, salt, source_id, target_id, where="", params=()):
+    table = Edge._meta.db_table
+    cursor.execute(
+        f"INSERT INTO {table} (id, model_id, source, target, data) "
+        f"SELECT {_remap('id')}, %s, {_remap('source')}, {_remap('target')}, data "
+        f"FROM {table} WHERE model_id = %s {where}",
+        [salt, _db_uuid(target_id), salt, salt, _db_uuid(source_id), *params],
+    )
+    return cursor.rowcount
+
+
+def _copy_search_entries(cursor, salt, source_id, target_id, where="", params=()):
+    table = SearchEntry._meta.db_table
+    cursor.execute(
+        f"INSERT INTO {table} "
+        f"(model_id, node_id, node_type, label, columns, document) "
+        f"SELECT %s, {_remap('node_id')}, node_type, label, columns, document "
+        f"FROM {table} WHERE model_id = %s {where}",
+        [_db_uuid(target_id), salt, _db_uuid(source_id), *params],
+    )
+
+
+def _copy_hub_keys(cursor, salt, source_id, target_id, where="", params=()):
+    table = HubKey._meta.db_table
+    cursor.execute(
+        f"INSERT INTO {table} "
+        f"(model_id, node_id, label, key_hash, definition_hash, key_columns) "
+        f"SELECT %s, {_remap('node_id')}, label, key_hash, definition_hash, "
+        f"key_columns FROM {table} WHERE model_id = %s {where}",
+        [_db_uuid(target_id), salt, _db_uuid(source_id), *params],
+    )
+
+
+def _copy_stats(cursor, source_id, target_id):
+    # A full copy has the statistics of its source
+    table = ModelStats._meta.db_table
+    updated_at = ModelStats._meta.get_field("updated_at").get_db_prep_value(
+        timezone.now(), connection
+    )
+    cursor.execute(
+        f"INSERT INTO {table} (model_id, node_counts, column_count, edge_count, "
+        f"satellites_per_hub, link_arity, orphan_hubs, updated_at) "
+        f"SELECT %s, node_counts, column_count, edge_count, satellites_per_hub, "
+        f"link_arity, orphan_hubs, %s FROM {table} WHERE model_id = %s",
+        [_db_uuid(target_id), updated_at, _db_uuid(source_id)],
+    )
+    return cursor.rowcount
+
+
+def duplicate_model(source, name=None):
+    """
+    Copy `source` with all its nodes and edges into a new model.
+
+    Runs a fixed number of queries regardless of the model size on
+    PostgreSQL and SQLite; other databases fall back to a bulk copy
+    through Python. The copy starts without version history; its first
+    save records a full snapshot.
+    """
+    name = name or f"{source.name} (Copy)"
+    with transaction.atomic():
+        if not supports_set_based_copy():
+            copy = DataModel.objects.create(name=name)
+            salt = str(copy.pk)
+            nodes = [
+                dict(node, id=remap_id(salt, node["id"]))
+                for node in source.nodes.values("id", "type", "x", "y", "data")
+            ]
+            edges = [
+                dict(
+                    edge,
+                    id=remap_id(salt, edge["id"]),
+                    source=remap_id(salt, edge["source"]),
+                    target=remap_id(salt, edge["target"]),
+                )
+                for edge in source.edges.values("id", "source", "target", "data")
+            ]
+            return save_model_graph(copy, nodes, edges)
+
+        copy = DataModel.objects.create(name=name, revision=1)
+        salt = str(copy.pk)
+        with connection.cursor() as cursor:
+            _copy_nodes(cursor, salt, source.pk, copy.pk)
+            _copy_edges(cursor, salt, source.pk, copy.pk)
+            _copy_search_entries(cursor, salt, source.pk, copy.pk)
+            _copy_hub_keys(cursor, salt, source.pk, copy.pk)
+            copied_stats = _copy_stats(cursor, source.pk, copy.pk)
+        if not copied_stats:
+            recompute_stats(copy)
+    return copy
+
+
+def _connected_satellites(cursor, source, selection):
+    node_table = Node._meta.db_table
+    edge_table = Edge._meta.db_table
+    cursor.execute(
+        f"SELECT DISTINCT n.id FROM {node_table} n, {edge_table} e "
+        f"WHERE n.model_id = %s AND n.type = %s AND e.model_id = %s "
+        f"AND ((e.target = n.id AND {_in_selection('e.source')}) "
+        f"OR (e.source = n.id AND {_in_selection('e.target')}))",
+        [_db_uuid(source.pk), Node.SAT, _db_uuid(source.pk), selection, selection],
+    )
+    return [uuid.UUID(str(row[0])) for row in cursor.fetchall()]
+
+
+def _placement_offset(cursor, source, target, selection):
+    """
+    Offset that places the selection to the right of the target's nodes,
+    snapped to the grid
+    """
+    cursor.execute(
+        f"SELECT MIN(x), MIN(y) FROM {Node._meta.db_table} "
+        f"WHERE model_id = %s AND {_in_selection('id')}",
+        [_db_uuid(source.pk), selection],
+    )
+    selection_x, selection_y = cursor.fetchone()
+    bounds = target.nodes.aggregate(max_x=Max("x"), min_y=Min("y"))
+    if selection_x is None or bounds["max_x"] is None:
+        return 0.0, 0.0
+
+    grid = Settings.get_instance().grid_size or 1
+    dx = bounds["max_x"] + PLACEMENT_GAP - selection_x
+    dy = bounds["min_y"] - selection_y
+    return math.ceil(dx / grid) * grid, round(dy / grid) * grid
+
+
+def _previous(nodes):
+    return {node.id: {"type": node.type, "data": node.data} for node in nodes}
+
+
+def _record_changes(data_model, node_changes, edge_changes):
+    """
+    Bump the revision of `data_model` and record the rows a transfer changed
+    in its history and statistics
+    """
+    # The models are locked by the transfer
+    DataModel.objects.filter(pk=data_model.pk).update(revision=F("revision") + 1)
+    data_model.refresh_from_db(fields=["revision"])
+    record_version(data_model, {}, node_changes, edge_changes)
+    update_stats(data_model, node_changes, edge_changes)
+
+
+def transfer_subgraph(
+    source, target, node_ids, include_satellites=False, move=False, offset=None
+):
+    """
+    Copy or move the nodes `node_ids` of `source` into `target`.
+
+    With `include_satellites`, satellites attached to a selected node are
+    added to the selection. Edges between selected nodes go along; on a
+    move, edges between a moved and a remaining node are deleted. Node
+    positions are shifted by `offset` (dx, dy), by default to the right of
+    the target's nodes. Runs in one transaction with a fixed number of
+    queries. Returns a summary with the copied or moved counts and, for a
+    copy, the mapping of old to new node ids.
+    """
+    if not supports_set_based_copy():
+        raise ValueError("Subgraph transfers require PostgreSQL or SQLite")
+    if source.pk == target.pk:
+        raise ValueError("Source and target must be different models")
+
+    node_table = Node._meta.db_table
+    edge_table = Edge._meta.db_table
+    entry_table = SearchEntry._meta.db_table
+    hub_key_table = HubKey._meta.db_table
+    node_ids = {uuid.UUID(str(node_id)) for node_id in node_ids}
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        list(
+            DataModel.objects.select_for_update().filter(pk__in=[source.pk, target.pk])
+        )
+
+        if include_satellites:
+            node_ids.update(
+                _connected_satellites(cursor, source, _selection_param(node_ids))
+            )
+        selection = _selection_param(node_ids)
+        if offset is None:
+            offset = _placement_offset(cursor, source, target, selection)
+
+        both_selected = f"{_in_selection('source')} AND {_in_selection('target')}"
+        if move:
+            touching = list(
+                Edge.objects.filter(model=source)
+                .filter(
+                    Q(source__in=_selected_ids(selection))
+                    | Q(target__in=_selected_ids(selection))
+                )
+                .only("id", "source", "target", "data")
+            )
+            cursor.execute(
+                f"UPDATE {node_table} SET model_id = %s, x = x + %s, y = y + %s "
+                f"WHERE model_id = %s AND {_in_selection('id')}",
+                [
+                    _db_uuid(target.pk),
+                    offset[0],
+                    offset[1],
+                    _db_uuid(source.pk),
+                    selection,
+                ],
+            )
+            node_count = cursor.rowcount
+            cursor.execute(
+                f"DELETE FROM {edge_table} WHERE model_id = %s "
+                f"AND ({_in_selection('source')} OR {_in_selection('target')}) "
+                f"AND NOT ({both_selected})",
+                [_db_uuid(source.pk), selection, selection, selection, selection],
+            )
+            cursor.execute(
+                f"UPDATE {edge_table} SET model_id = %s "
+                f"WHERE model_id = %s AND {both_selected}",
+                [_db_uuid(target.pk), _db_uuid(source.pk), selection, selection],
+            )
+            edge_count = cursor.rowcount
+            for table in (entry_table, hub_key_table):
+                cursor.execute(
+                    f"UPDATE {table} SET model_id = %s "
+                    f"WHERE model_id = %s AND {_in_selection('node_id')}",
+                    [_db_uuid(target.pk), _db_uuid(source.pk), selection],
+                )
+            moved_nodes = list(
+                Node.objects.filter(model=target, pk__in=_selected_ids(selection))
+            )
+            moved_edges = [
+                edge
+                for edge in touching
+                if edge.source in node_ids and edge.target in node_ids
+            ]
+            for edge in moved_edges:
+                edge.model = target
+            _record_changes(
+                source,
+                RowChanges(
+                    deleted_ids=[node.id for node in moved_nodes],
+                    previous=_previous(moved_nodes),
+                ),
+                RowChanges(deleted_ids=[edge.id for edge in touching]),
+            )
+            _record_changes(
+                target, RowChanges(created=moved_nodes), RowChanges(created=moved_edges)
+            )
+            id_map = None
+        else:
+            salt = str(uuid.uuid4())
+            node_count = _copy_nodes(
+                cursor,
+                salt,
+                source.pk,
+                target.pk,
+                f"AND {_in_selection('id')}",
+                [selection],
+                offset,
+            )
+            edge_count = _copy_edges(
+                cursor,
+                salt,
+                source.pk,
+                target.pk,
+                f"AND {both_selected}",
+                [selection, selection],
+            )
+            _copy_search_entries(
+                cursor,
+                salt,
+                source.pk,
+                target.pk,
+                f"AND {_in_selection('node_id')}",
+                [selection],
+            )
+            _copy_hub_keys(
+                cursor,
+                salt,
+                source.pk,
+                target.pk,
+                f"AND {_in_selection('node_id')}",
+                [selection],
+            )
+            id_map = {
+                str(node_id): str(remap_id(salt, node_id)) for node_id in node_ids
+            }
+            copied_nodes = Node.objects.filter(
+                model=target, pk__in=_selected_ids(_selection_param(id_map.values()))
+            )
+            copied_edges = [
+                Edge(
+                    id=remap_id(salt, edge.id),
+                    model=target,
+                    source=remap_id(salt, edge.source),
+                    target=remap_id(salt, edge.target),
+                    data=edge.data,
+                )
+                for edge in Edge.objects.filter(
+                    model=source,
+                    source__in=_selected_ids(selection),
+                    target__in=_selected_ids(selection),
+                ).only("id", "source", "target", "data")
+            ]
+            _record_changes(
+                target,
+                RowChanges(created=list(copied_nodes)),
+                RowChanges(created=copied_edges),
+            )
+
+    return {
+        "nodes": node_count,
+        "edges": edge_count,
+        "offset": {"x": offset[0], "y": offset[1]},
+        "node_ids": id_map,
+    }
@@ -0,0 +1,291 @@
+"""
+Structural diff between two model graphs.
+
+Nodes and edges are matched by id first. Rows left over on both sides are
+then matched by a hash of their content, so copies with new ids, such as
+duplicated models, are recognized as the same node or edge. Everything is
+done with dict lookups, in time linear in the size of both graphs.
+
+diff_changes() yields one record per difference so large diffs can be
+streamed; diff() collects them into a single document.
+"""
+import hashlib
+import json
+from collections import defaultdict, deque
+
+from .columns import (
+    COLUMNS_KEY,
+    GLOBAL_PREFIX,
+    REFS_KEY,
+    compact_node_data,
+    load_definitions,
+)
+from .versioning import EDGE_FIELDS, NODE_FIELDS, rebuild_version
+
+NODE = "node"
+EDGE = "edge"
+ADDED = "added"
+REMOVED = "removed"
+MOVED = "moved"
+CHANGED = "changed"
+CHANGES = [ADDED, REMOVED, MOVED, CHANGED]
+
+
+def _content_hash(*parts):
+    canonical = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+
+
+class Graph:
+    """
+    The nodes and edges of one side of a diff, keyed by id.
+
+    Node data is normalized to column references, so graphs read from the
+    database and from the history compare equal. Definitions of inline
+    columns are kept for describing column changes.
+    """
+
+    def __init__(self, nodes, edges):
+        self.definitions = {}
+        self.nodes = {}
+        for node in nodes:
+            data, definitions = compact_node_data(node.get("data") or {}, ())
+            self.definitions.update(definitions)
+            node = dict(node, id=str(node["id"]), data=data)
+            node["hash"] = _content_hash(node["type"], data)
+            self.nodes[node["id"]] = node
+        self.edges = {
+            str(edge["id"]): dict(
+                edge,
+                id=str(edge["id"]),
+                source=str(edge["source"]),
+                target=str(edge["target"]),
+            )
+            for edge in edges
+        }
+
+    @classmethod
+    def from_model(cls, data_model):
+        return cls(
+            data_model.nodes.values(*NODE_FIELDS).iterator(chunk_size=2000),
+            data_model.edges.values(*EDGE_FIELDS).iterator(chunk_size=2000),
+        )
+
+    @classmethod
+    def from_version(cls, model_id, revision):
+        """Raises ModelVersion.DoesNotExist for revisions missing from the history"""
+        state = rebuild_version(model_id, revision)
+        return cls(state["nodes"], state["edges"])
+
+
+def _match(old_rows, new_rows, content_key):
+    """
+    Pair rows by id, then the remaining ones by content_key(row).
+
+    Returns (pairs, removed, added) where pairs are (old, new) tuples.
+    """
+    pairs = []
+    removed = []
+    for row_id, row in old_rows.items():
+        if row_id in new_rows:
+            pairs.append((row, new_rows[row_id]))
+        else:
+            removed.append(row)
+    added = [row for row_id, row in new_rows.items() if row_id not in old_rows]
+
+    candidates = defaultdict(deque)
+    for row in added:
+        candidates[content_key(row)].append(row)
+    unmatched = []
+    for row in removed:
+        bucket = candidates.get(content_key(row))
+        if bucket:
+            pairs.append((row, bucket.popleft()))
+        else:
+            unmatched.append(row)
+    matched = {id(row) for _, row in pairs}
+    return pairs, unmatched, [row for row in added if id(row) not in matched]
+
+
+def _label(node):
+    data = node.get("data")
+    return data.get("label", "") if isinstance(data, dict) else ""
+
+
+def _node_record(change, node, **extra):
+    return dict(
+        {
+            "kind": NODE,
+            "change": change,
+            "id": node["id"],
+            "type": node["type"],
+            "label": _label(node),
+        },
+        **extra,
+    )
+
+
+def _column_key(ref, definition):
+    if ref.startswith(GLOBAL_PREFIX):
+        return ref
+    if isinstance(definition, dict):
+        return definition.get("id") or definition.get("name") or ref
+    return ref
+
+
+def _column_name(ref, definition):
+    if isinstance(definition, dict) and definition.get("name"):
+        return definition["name"]
+    return ref[len(GLOBAL_PREFIX) :] if ref.startswith(GLOBAL_PREFIX) else ref
+
+
+def _column_changes(old_refs, new_refs, definitions):
+    """
+    Columns are identified by their definition id; a changed definition has
+    a new hash
+    """
+    old_columns = {_column_key(ref, definitions.get(ref)): ref for ref in old_refs}
+    new_columns = {_column_key(ref, definitions.get(ref)): ref for ref in new_refs}
+    changes = {ADDED: [], REMOVED: [], CHANGED: []}
+    for key, ref in new_columns.items():
+        if key not in old_columns:
+            changes[ADDED].append(_column_name(ref, definitions.get(ref)))
+        elif old_columns[key] != ref:
+            changes[CHANGED].append(_column_name(ref, definitions.get(ref)))
+    for key, ref in old_columns.items():
+        if key not in new_columns:
+            changes[REMOVED].append(_column_name(ref, definitions.get(ref)))
+    return changes
+
+
+def _data_changes(old_data, new_data):
+    old_data = old_data if isinstance(old_data, dict) else {}
+    new_data = new_data if isinstance(new_data, dict) else {}
+    keys = (set(old_data) | set(new_data)) - {REFS_KEY, COLUMNS_KEY}
+    return sorted(key for key in keys if old_data.get(key) != new_data.get(key))
+
+
+def diff_changes(old, new):
+    """
+    Yield one record per difference from Graph `old` to Graph `new`.
+
+    Node records have a `change` of added, removed, moved or changed; a
+    node that was moved and changed yields both. Edge records are added,
+    removed or changed. Rows matched by content instead of id carry the
+    `old_id` they were matched with.
+    """
+    pairs, removed, added = _match(old.nodes, new.nodes, lambda node: node["hash"])
+    node_ids = {}
+    changed = []
+    for old_node, new_node in pairs:
+        node_ids[old_node["id"]] = new_node["id"]
+        extra = {"old_id": old_node["id"]} if old_node["id"] != new_node["id"] else {}
+        if (old_node["x"], old_node["y"]) != (new_node["x"], new_node["y"]):
+            yield _node_record(
+                MOVED,
+                new_node,
+                **{
+                    "from": {"x": old_node["x"], "y": old_node["y"]},
+                    "to": {"x": new_node["x"], "y": new_node["y"]},
+                },
+                **extra,
+            )
+        if old_node["hash"] != new_node["hash"]:
+            changed.append((old_node, new_node))
+
+    for node in removed:
+        yield _node_record(REMOVED, node)
+    for node in added:
+        yield _node_record(ADDED, node)
+
+    if changed:
+        definitions = dict(old.definitions, **new.definitions)
+        definitions.update(
+            load_definitions(node["data"] for pair in changed for node in pair)
+        )
+        for old_node, new_node in changed:
+            old_refs = (
+                old_node["data"].get(REFS_KEY, [])
+                if isinstance(old_node["data"], dict)
+                else []
+            )
+            new_refs = (
+                new_node["data"].get(REFS_KEY, [])
+                if isinstance(new_node["data"], dict)
+                else []
+            )
+            fields = _data_changes(old_node["data"], new_node["data"])
+            if old_node["type"] != new_node["type"]:
+                fields.insert(0, "type")
+            yield _node_record(
+                CHANGED,
+                new_node,
+                fields=fields,
+                columns=_column_changes(old_refs, new_refs, definitions),
+            )
+
+    def edge_key(edge, mapping=None):
+        source, target = edge["source"], edge["target"]
+        if mapping is not None:
+            source, target = mapping.get(source, source), mapping.get(target, target)
+        return _content_hash(source, target, edge.get("data"))
+
+    # Old edges are compared with their endpoints mapped onto the new node ids
+    old_edges = {
+        edge_id: dict(
+            edge,
+            source=node_ids.get(edge["source"], edge["source"]),
+            target=node_ids.get(edge["target"], edge["target"]),
+        )
+        for edge_id, edge in old.edges.items()
+    }
+    pairs, removed, added = _match(old_edges, new.edges, edge_key)
+    for old_edge, new_edge in pairs:
+        fields = [
+            name
+            for name in ("source", "target", "data")
+            if old_edge.get(name) != new_edge.get(name)
+        ]
+        if fields:
+            yield {
+                "kind": EDGE,
+                "change": CHANGED,
+                "id": new_edge["id"],
+                "source": new_edge["source"],
+                "target": new_edge["target"],
+                "fields": fields,
+            }
+    for change, edges in ((REMOVED, removed), (ADDED, added)):
+        for edge in edges:
+            yield {
+                "kind": EDGE,
+                "change": change,
+                "id": edge["id"],
+                "source": edge["source"],
+                "target": edge["target"],
+            }
+
+
+def diff(old, new):
+    """
+    Collect diff_changes() into one document with the records grouped by
+    kind and change, plus a summary of their counts.
+    """
+    document = {
+        "nodes": {change: [] for change in CHANGES},
+        "edges": {change: [] for change in (ADDED, REMOVED, CHANGED)},
+    }
+    for record in diff_changes(old, new):
+        group = "nodes" if record["kind"] == NODE else "edges"
+        document[group][record["change"]].append(
+            {
+                key: value
+                for key, value in record.items()
+                if key not in ("kind", "change")
+            }
+        )
+    document["summary"] = {
+        group: {change: len(records) for change, records in changes.items()}
+        for group, changes in document.items()
+    }
+    return document
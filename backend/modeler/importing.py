@@ -0,0 +1,435 @@
+"""
+Reverse engineering of Data Vault models from relational schemas.
+
+Tables are introspected from a SQLite file or a PostgreSQL database in a
+thread pool, each worker with its own connection, and streamed into the
+model builder in table name order. The builder proposes:
+
+- a hub per table with a primary or unique key, the key columns being its
+  business key
+- a link per foreign key, and for association tables whose key consists of
+  foreign keys, one link between all referenced hubs
+- a satellite per table holding its descriptive columns
+
+Node ids are derived from the table names, so links can point to hubs of
+tables that have not been read yet. Nodes are written in batches while the
+schema is read, keeping memory flat for schemas with thousands of tables.
+"""
+import logging
+import sqlite3
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import transaction
+
+from .columns import compact_nodes
+from .layout import NODE_SPACING, TIER_SPACING
+from .models import DataModel, Edge, Node
+from .registry import register_hubs
+from .saving import BATCH_SIZE, RowChanges, _edge_from_data, _node_from_data
+from .search import index_nodes
+from .stats import recompute_stats
+from .versioning import record_version
+
+try:
+    import psycopg2
+except ImportError:  # pragma: no cover - optional dependency
+    psycopg2 = None
+
+logger = logging.getLogger(__name__)
+
+HASH_KEY_TYPE = "BINARY(20)"
+# Tables per row when placing the nodes of each table next to each other
+TABLES_PER_ROW = 10
+
+
+@dataclass
+class ForeignKey:
+    columns: list
+    table: str
+
+
+@dataclass
+class Table:
+    name: str
+    # (name, data type) pairs in table order
+    columns: list
+    primary_key: list = field(default_factory=list)
+    unique_keys: list = field(default_factory=list)
+    foreign_keys: list = field(default_factory=list)
+
+    @property
+    def business_key(self):
+        return self.primary_key or next(iter(self.unique_keys), [])
+
+
+class SQLiteSchema:
+    """Tables of a SQLite database file, opened read-only"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def connect(self):
+        return sqlite3.connect(
+            f"file:{self.path}?mode=ro", uri=True, check_same_thread=False
+        )
+
+    def table_names(self, connection):
+        cursor = connection.execute(
+            "SELECT name FROM sqlite_master "
+            "WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+        )
+        for (name,) in cursor:
+            yield name
+
+    def describe(self, connection, name):
+        quoted = '"' + name.replace('"', '""') + '"'
+        info = connection.execute(f"PRAGMA table_info({quoted})").fetchall()
+        columns = [(row[1], row[2] or "TEXT") for row in info]
+        primary_key = [row[1] for row in sorted(info, key=lambda row: row[5]) if row[5]]
+
+        unique_keys = []
+        for index in connection.execute(f"PRAGMA index_list({quoted})").fetchall():
+            # Columns: seq, name, unique, origin, partial
+            if index[2] and index[3] != "pk" and not index[4]:
+                index_name = '"' + index[1].replace('"', '""') + '"'
+                unique_keys.append(
+                    [
+                        row[2]
+                        for row in connection.execute(
+                            f"PRAGMA index_info({index_name})"
+                        )
+                    ]
+                )
+
+        foreign_keys = {}
+        for row in connection.execute(f"PRAGMA foreign_key_list({quoted})").fetchall():
+            # Columns: id, seq, table, from, to, ...
+            foreign_keys.setdefault(
+                row[0], ForeignKey(columns=[], table=row[2])
+            ).columns.append(row[3])
+
+        return Table(
+            name, columns, primary_key, unique_keys, list(foreign_keys.values())
+        )
+
+
+class PostgresSchema:
+    """Tables of one schema of a PostgreSQL database"""
+
+    def __init__(self, dsn, schema="public"):
+        if psycopg2 is None:
+            raise RuntimeError("Importing from PostgreSQL requires psycopg2")
+        self.dsn = dsn
+        self.schema = schema
+
+    def connect(self):
+        connection = psycopg2.connect(self.dsn)
+        connection.set_session(readonly=True)
+        return connection
+
+    def table_names(self, connection):
+        # A named cursor fetches the names from the server in chunks
+        with connection.cursor(name="dv_import_tables") as cursor:
+            cursor.itersize = 1000
+            cursor.execute(
+                "SELECT c.relname FROM pg_class c "
+                "JOIN pg_namespace n ON n.oid = c.relnamespace "
+                "WHERE n.nspname = %s AND c.relkind IN ('r', 'p') ORDER BY c.relname",
+                [self.schema],
+            )
+            for (name,) in cursor:
+                yield name
+
+    def describe(self, connection, name):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT c.oid FROM pg_class c "
+                "JOIN pg_namespace n ON n.oid = c.relnamespace "
+                "WHERE n.nspname = %s AND c.relname = %s",
+                [self.schema, name],
+            )
+            oid = cursor.fetchone()[0]
+
+            cursor.execute(
+                "SELECT attname, format_type(atttypid, atttypmod) FROM pg_attribute "
+                "WHERE attrelid = %s AND attnum > 0 AND NOT attisdropped "
+                "ORDER BY attnum",
+                [oid],
+            )
+            columns = cursor.fetchall()
+
+            cursor.execute(
+                "SELECT i.indisprimary, array_agg(a.attname::text ORDER BY k.ord) "
+                "FROM pg_index i "
+                "CROSS JOIN LATERAL unnest(i.indkey) WITH ORDINALITY AS k(attnum, ord) "
+                "JOIN pg_attribute a "
+                "ON a.attrelid = i.indrelid AND a.attnum = k.attnum "
+                "WHERE i.indrelid = %s AND i.indisunique AND i.indpred IS NULL "
+                "GROUP BY i.indexrelid, i.indisprimary ORDER BY i.indexrelid",
+                [oid],
+            )
+            primary_key = []
+            unique_keys = []
+            for is_primary, key in cursor.fetchall():
+                if is_primary:
+                    primary_key = list(key)
+                else:
+                    unique_keys.append(list(key))
+
+            cursor.execute(
+                "SELECT r.relname, array_agg(a.attname::text ORDER BY k.ord) "
+                "FROM pg_constraint c "
+                "JOIN pg_class r ON r.oid = c.confrelid "
+                "CROSS JOIN LATERAL unnest(c.conkey) WITH ORDINALITY AS k(attnum, ord) "
+                "JOIN pg_attribute a "
+                "ON a.attrelid = c.conrelid AND a.attnum = k.attnum "
+                "WHERE c.conrelid = %s AND c.contype = 'f' "
+                "GROUP BY c.oid, r.relname ORDER BY c.oid",
+                [oid],
+            )
+            foreign_keys = [
+                ForeignKey(columns=list(key), table=table)
+                for table, key in cursor.fetchall()
+            ]
+
+        return Table(name, columns, primary_key, unique_keys, foreign_keys)
+
+
+def introspect(source, workers=None):
+    """
+    Yield a Table for every table of `source`, in table name order.
+
+    Tables are described by a pool of `workers` threads. Only a bounded
+    number of tables is in flight at a time, so results are streamed while
+    the table names are still being read.
+    """
+    workers = workers or getattr(settings, "SCHEMA_IMPORT_WORKERS", 4)
+    local = threading.local()
+    connections = []
+    lock = threading.Lock()
+
+    def describe(name):
+        connection = getattr(local, "connection", None)
+        if connection is None:
+            connection = local.connection = source.connect()
+            with lock:
+                connections.append(connection)
+        return source.describe(connection, name)
+
+    names_connection = source.connect()
+    pending = deque()
+    try:
+        with ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="schema-import"
+        ) as executor:
+            try:
+                for name in source.table_names(names_connection):
+                    pending.append(executor.submit(describe, name))
+                    if len(pending) >= workers * 4:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                for future in pending:
+                    future.cancel()
+    finally:
+        for connection in [names_connection, *connections]:
+            connection.close()
+
+
+def _column(name, data_type, *markers):
+    return {"id": name, "name": name, "dataType": data_type, "markers": list(markers)}
+
+
+def _hash_key(table_name):
+    return f"{table_name.lower()}_hk"
+
+
+class ModelBuilder:
+    """Turns a stream of tables into the nodes and edges of a new model"""
+
+    def __init__(self, data_model):
+        self.model = data_model
+        self.namespace = uuid.UUID(str(data_model.pk))
+        self.nodes = []
+        self.edges = []
+        # Edges to hubs of other tables, created once all tables are known
+        self.hub_edges = []
+        self.hub_tables = set()
+        self.tables = 0
+        self.placed = 0
+        self.skipped = []
+        self.counts = {Node.HUB: 0, Node.LINK: 0, Node.SAT: 0}
+        self.edge_count = 0
+
+    def _id(self, node_type, *names):
+        return str(uuid.uuid5(self.namespace, ":".join([node_type, *names])))
+
+    def _hub_id(self, table_name):
+        return self._id(Node.HUB, table_name)
+
+    def _add_node(self, node_id, node_type, label, columns, position):
+        self.nodes.append(
+            {
+                "id": node_id,
+                "type": node_type,
+                "x": float(position[0]),
+                "y": float(position[1]),
+                "data": {"label": label, "type": node_type, "columns": columns},
+            }
+        )
+        self.counts[node_type] += 1
+        if len(self.nodes) >= BATCH_SIZE:
+            self._flush_nodes()
+
+    def _add_edge(self, source, target, edges=None):
+        edge_id = self._id("EDGE", source, target)
+        (self.edges if edges is None else edges).append(
+            {"id": edge_id, "source": source, "target": target}
+        )
+
+    def _add_link(self, link_id, label, hub_tables, position):
+        columns = [_column(f"{label.lower()}_hk", HASH_KEY_TYPE, "PK", "HK")]
+        for index, table in enumerate(hub_tables):
+            # Self references need distinct hash key names
+            name = (
+                _hash_key(table)
+                if table not in hub_tables[:index]
+                else f"{_hash_key(table)}_{index}"
+            )
+            columns.append(_column(name, HASH_KEY_TYPE, "FK", "HK"))
+        self._add_node(link_id, Node.LINK, label, columns, position)
+        for table in dict.fromkeys(hub_tables):
+            self.hub_edges.append((table, link_id))
+
+    def add(self, table):
+        """Add the nodes proposed for `table`"""
+        self.tables += 1
+        foreign_key_columns = {
+            column
+            for foreign_key in table.foreign_keys
+            for column in foreign_key.columns
+        }
+        key = table.business_key
+        is_association = (
+            len(table.foreign_keys) >= 2
+            and set(key or foreign_key_columns) <= foreign_key_columns
+        )
+        if not key and not is_association:
+            self.skipped.append(table.name)
+            return
+
+        base_x = (self.placed % TABLES_PER_ROW) * NODE_SPACING * 3
+        base_y = (self.placed // TABLES_PER_ROW) * TIER_SPACING * 3
+        self.placed += 1
+        name = table.name.upper()
+        descriptive = [
+            (column, data_type)
+            for column, data_type in table.columns
+            if column not in foreign_key_columns and column not in key
+        ]
+
+        if is_association:
+            parent_id = self._id(Node.LINK, table.name)
+            parent_key = f"lnk_{name.lower()}_hk"
+            self._add_link(
+                parent_id,
+                f"LNK_{name}",
+                [foreign_key.table for foreign_key in table.foreign_keys],
+                (base_x, base_y),
+            )
+        else:
+            parent_id = self._hub_id(table.name)
+            parent_key = _hash_key(table.name)
+            self.hub_tables.add(table.name)
+            types = dict(table.columns)
+            columns = [_column(parent_key, HASH_KEY_TYPE, "PK", "HK")]
+            columns += [
+                _column(column, types.get(column, "TEXT"), "BK") for column in key
+            ]
+            self._add_node(
+                parent_id, Node.HUB, f"HUB_{name}", columns, (base_x, base_y)
+            )
+            for position, foreign_key in enumerate(table.foreign_keys, start=1):
+                label = f"LNK_{name}_{foreign_key.table.upper()}"
+                link_id = self._id(Node.LINK, table.name, *foreign_key.columns)
+                self._add_link(
+                    link_id,
+                    label,
+                    [table.name, foreign_key.table],
+                    (base_x + NODE_SPACING * position, base_y + TIER_SPACING),
+                )
+
+        if descriptive:
+            columns = [
+                _column(parent_key, HASH_KEY_TYPE, "PK", "FK", "HK"),
+                _column("hashdiff", HASH_KEY_TYPE, "HD"),
+            ]
+            columns += [_column(column, data_type) for column, data_type in descriptive]
+            satellite_id = self._id(Node.SAT, table.name)
+            self._add_node(
+                satellite_id,
+                Node.SAT,
+                f"SAT_{name}",
+                columns,
+                (base_x, base_y + TIER_SPACING * 2),
+            )
+            self._add_edge(parent_id, satellite_id)
+
+    def _flush_nodes(self):
+        nodes_data, definitions = compact_nodes(self.nodes)
+        nodes = [_node_from_data(self.model, node_data) for node_data in nodes_data]
+        Node.objects.bulk_create(nodes, batch_size=BATCH_SIZE)
+        index_nodes(self.model, RowChanges(created=nodes), definitions)
+        register_hubs(self.model, RowChanges(created=nodes), definitions)
+        self.nodes = []
+
+    def finish(self):
+        """Write the remaining nodes and all edges"""
+        self._flush_nodes()
+        for table, link_id in self.hub_edges:
+            # Foreign keys to tables without a hub, e.g. in another schema, are dropped
+            if table in self.hub_tables:
+                self._add_edge(self._hub_id(table), link_id)
+        edges = [_edge_from_data(self.model, edge_data) for edge_data in self.edges]
+        Edge.objects.bulk_create(edges, batch_size=BATCH_SIZE)
+        self.edge_count = len(edges)
+        self.edges = []
+
+    def summary(self):
+        return {
+            "tables": self.tables,
+            "nodes": dict(self.counts),
+            "edges": self.edge_count,
+            "skipped": self.skipped,
+        }
+
+
+def import_schema(source, name, workers=None):
+    """
+    Create a model from the tables of `source`.
+
+    Returns (model, summary) where the summary holds the number of read
+    tables, created nodes per type and edges, and the names of tables that
+    were skipped for lacking both a key and foreign keys.
+    """
+    with transaction.atomic():
+        data_model = DataModel.objects.create(name=name, revision=1)
+        builder = ModelBuilder(data_model)
+        for table in introspect(source, workers):
+            builder.add(table)
+        builder.finish()
+        record_version(data_model, {}, None, None, force_snapshot=True)
+        recompute_stats(data_model)
+
+    summary = builder.summary()
+    logger.info(
+        f"Imported model {data_model.id} from {summary['tables']} tables: "
+        f"{summary['nodes']}"
+    )
+    return data_model, summary
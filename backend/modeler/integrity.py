@@ -0,0 +1,68 @@
+"""
+Referential integrity of edges.
+
+Edge.source and Edge.target are plain UUIDs, not foreign keys, so deleting
+nodes can leave edges behind that point at nothing. Dangling edges are
+found with one anti-join (NOT EXISTS) over the node table per endpoint
+rather than by loading graphs into Python.
+
+`manage.py check_edges` reports and removes them across all models. With
+EDGE_INTEGRITY_MODE, saves also check the edges they leave behind:
+
+- "off" (default): edges are stored as sent
+- "refuse": a save leaving dangling edges fails and nothing is written
+- "prune": dangling edges are deleted in the same transaction
+"""
+from django.conf import settings
+from django.db.models import Count, Exists, OuterRef, Q
+
+from .models import Edge, Node
+
+OFF = "off"
+REFUSE = "refuse"
+PRUNE = "prune"
+MODES = [OFF, REFUSE, PRUNE]
+
+
+class DanglingEdges(ValueError):
+    """Raised in refuse mode by saves that would leave edges without their nodes"""
+
+    def __init__(self, edge_ids):
+        super().__init__(
+            f"{len(edge_ids)} edge(s) reference nodes that are not in the model"
+        )
+        self.edge_ids = edge_ids
+
+
+def write_mode():
+    mode = getattr(settings, "EDGE_INTEGRITY_MODE", OFF)
+    if mode not in MODES:
+        raise ValueError(
+            f"EDGE_INTEGRITY_MODE must be one of {', '.join(MODES)}, not '{mode}'"
+        )
+    return mode
+
+
+def _missing(endpoint):
+    return ~Exists(
+        Node.objects.filter(model_id=OuterRef("model_id"), pk=OuterRef(endpoint))
+    )
+
+
+def dangling_edges(data_model=None):
+    """
+    Edges whose source or target is not a node of their model, of one or all
+    models
+    """
+    edges = (
+        Edge.objects.all()
+        if data_model is None
+        else Edge.objects.filter(model=data_model)
+    )
+    return edges.filter(Q(_missing("source")) | Q(_missing("target")))
+
+
+def dangling_counts():
+    """{model id: number of dangling edges} over all models"""
+    counts = dangling_edges().order_by().values("model_id").annotate(count=Count("pk"))
+    return {row["model_id"]: row["count"] for row in counts}
@@ -0,0 +1,376 @@
+"""
+Background jobs for long-running model operations.
+
+Jobs are rows of the Job table, so no message broker is needed: API actions
+submit them, and the thread pool started by `manage.py run_jobs` claims and
+runs them. A job is claimed with a conditional UPDATE from queued to
+running, which only one worker can win, so any number of worker processes
+can share the table.
+
+Handlers are registered per kind with @handler. They receive the job and a
+`report(progress, message)` callable for progress updates, which also
+serves as the heartbeat used to requeue jobs of workers that died, which
+the workers check for every JOB_REQUEUE_INTERVAL seconds. Jobs
+failing with a transient database error, such as a lock timeout, are
+retried with a growing delay, up to JOB_MAX_ATTEMPTS attempts.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import OperationalError, close_old_connections, connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import integrity, metrics, thumbnails
+from .columns import expand_nodes
+from .copying import duplicate_model
+from .importing import SQLiteSchema, import_schema
+from .layout import layout_model
+from .models import DataModel, Job
+from .routing import read_alias, reading_from
+from .validation import EDGE_SCHEMA, NODE_SCHEMA, SchemaError, compile_validator
+
+logger = logging.getLogger(__name__)
+
+LAYOUT = "layout"
+DUPLICATE = "duplicate"
+EXPORT = "export"
+IMPORT_SCHEMA = "import-schema"
+THUMBNAIL = "thumbnail"
+VALIDATE = "validate"
+
+# Problems listed in the result of a validation job, of each kind
+MAX_REPORTED_PROBLEMS = 100
+
+HANDLERS = {}
+
+
+def handler(kind):
+    """Register the decorated function as the handler of jobs of `kind`"""
+
+    def register(function):
+        HANDLERS[kind] = function
+        return function
+
+    return register
+
+
+def submit(kind, data_model=None, params=None):
+    if kind not in HANDLERS:
+        raise ValueError(f"Unknown job kind '{kind}'")
+    job = Job.objects.create(kind=kind, model=data_model, params=params or {})
+    metrics.incr("jobs.submitted")
+    logger.info(f"Queued {kind} job {job.id}")
+    return job
+
+
+def cancel(job):
+    """Cancel a job that has not started yet; returns whether it was cancelled"""
+    cancelled = Job.objects.filter(pk=job.pk, status=Job.QUEUED).update(
+        status=Job.CANCELLED, finished_at=timezone.now()
+    )
+    job.refresh_from_db()
+    return bool(cancelled)
+
+
+def claim(worker):
+    """Mark the oldest queued job as running for `worker` and return it, or None"""
+    while True:
+        now = timezone.now()
+        queued = Job.objects.filter(
+            Q(not_before__isnull=True) | Q(not_before__lte=now), status=Job.QUEUED
+        )
+        job_id = queued.order_by("created_at").values_list("pk", flat=True).first()
+        if job_id is None:
+            return None
+        # Only one worker can move the row out of the queued state
+        claimed = Job.objects.filter(pk=job_id, status=Job.QUEUED).update(
+            status=Job.RUNNING,
+            worker=worker,
+            started_at=now,
+            heartbeat_at=now,
+            attempts=F("attempts") + 1,
+        )
+        if claimed:
+            return Job.objects.get(pk=job_id)
+
+
+def _reporter(job):
+    def report(progress, message=""):
+        Job.objects.filter(pk=job.pk, status=Job.RUNNING).update(
+            progress=max(0.0, min(float(progress), 1.0)),
+            message=message[:255],
+            heartbeat_at=timezone.now(),
+        )
+
+    return report
+
+
+def will_retry(job, error):
+    """Whether run() puts `job` back in the queue after it failed with `error`"""
+    return isinstance(error, OperationalError) and job.attempts < getattr(
+        settings, "JOB_MAX_ATTEMPTS", 3
+    )
+
+
+def run(job):
+    """Run a claimed job and store its result or error"""
+    started = time.perf_counter()
+    model_id = job.model_id
+    try:
+        result = HANDLERS[job.kind](job, _reporter(job))
+    except Exception as e:
+        if will_retry(job, e):
+            logger.warning(
+                f"Requeued {job.kind} job {job.id} after attempt {job.attempts}: {e}"
+            )
+            # Back off with jitter so jobs that collided do not collide again
+            delay = 2**job.attempts * (0.5 + random.random())
+            fields = {
+                "status": Job.QUEUED,
+                "worker": "",
+                "progress": 0.0,
+                "message": "",
+                "started_at": None,
+                "not_before": timezone.now() + timedelta(seconds=delay),
+            }
+        else:
+            logger.exception(f"{job.kind} job {job.id} failed")
+            fields = {"status": Job.FAILED, "error": f"{type(e).__name__}: {e}"}
+    else:
+        fields = {"status": Job.SUCCEEDED, "progress": 1.0, "result": result}
+    if job.model_id != model_id:
+        # Handlers creating a model attach it to the job
+        fields["model_id"] = job.model_id
+    if fields["status"] != Job.QUEUED:
+        fields["finished_at"] = timezone.now()
+    Job.objects.filter(pk=job.pk).update(**fields)
+    metrics.incr(f"jobs.{fields['status']}")
+    metrics.observe(f"jobs.{job.kind}", (time.perf_counter() - started) * 1000)
+    job.refresh_from_db()
+    return job
+
+
+def run_next(worker):
+    """Claim and run one job; returns the job or None if the queue is empty"""
+    job = claim(worker)
+    return run(job) if job is not None else None
+
+
+def requeue_stale(max_age=None):
+    """Requeue running jobs without a heartbeat for `max_age` seconds"""
+    max_age = (
+        max_age if max_age is not None else getattr(settings, "JOB_STALE_AFTER", 600)
+    )
+    stale = Job.objects.filter(
+        status=Job.RUNNING, heartbeat_at__lt=timezone.now() - timedelta(seconds=max_age)
+    )
+    return stale.update(
+        status=Job.QUEUED, worker="", progress=0.0, message="", started_at=None
+    )
+
+
+_last_requeue = 0.0
+_requeue_lock = threading.Lock()
+
+
+def _requeue_stale_periodically():
+    """Run requeue_stale() at most every JOB_REQUEUE_INTERVAL seconds per process"""
+    global _last_requeue
+    with _requeue_lock:
+        now = time.monotonic()
+        if now - _last_requeue < getattr(settings, "JOB_REQUEUE_INTERVAL", 60):
+            return 0
+        _last_requeue = now
+    requeued = requeue_stale()
+    if requeued:
+        logger.warning(f"Requeued {requeued} stale job(s)")
+    return requeued
+
+
+def wait(job, timeout):
+    """Reload `job` until it has finished or `timeout` seconds have passed"""
+    deadline = time.monotonic() + timeout
+    while job.status not in Job.FINISHED:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        time.sleep(min(0.25, remaining))
+        job.refresh_from_db()
+    return job
+
+
+def work(worker, stop, poll_interval=None, until_idle=False):
+    """
+    Run jobs until `stop` is set, waiting `poll_interval` seconds whenever
+    no job is ready, or return once none is queued if `until_idle`.
+    """
+    poll_interval = poll_interval or getattr(settings, "JOB_POLL_INTERVAL", 1.0)
+    try:
+        while not stop.is_set():
+            close_old_connections()
+            _requeue_stale_periodically()
+            if run_next(worker) is None:
+                # Jobs waiting for a retry keep idle workers around
+                if until_idle and not Job.objects.filter(status=Job.QUEUED).exists():
+                    break
+                stop.wait(poll_interval)
+    finally:
+        connection.close()
+
+
+def start_workers(count=None, poll_interval=None, until_idle=False):
+    """Start `count` worker threads; returns the threads and their stop event"""
+    count = count or getattr(settings, "JOB_WORKERS", 2)
+    stop = threading.Event()
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    threads = [
+        threading.Thread(
+            target=work,
+            args=(f"{prefix}:{index}", stop, poll_interval, until_idle),
+            name=f"job-worker-{index}",
+            daemon=True,
+        )
+        for index in range(count)
+    ]
+    for thread in threads:
+        thread.start()
+    return threads, stop
+
+
+def _job_model(job):
+    if job.model is None:
+        raise ValueError("The model of this job was deleted")
+    return job.model
+
+
+@handler(LAYOUT)
+def run_layout(job, report):
+    data_model = _job_model(job)
+    report(0.1, "Computing layout")
+    positions = layout_model(
+        data_model,
+        job.params.get("algorithm", "layered"),
+        job.params.get("iterations", 100),
+        save=job.params.get("save", True),
+    )
+    data_model.refresh_from_db(fields=["revision"])
+    return {
+        "revision": data_model.revision,
+        "positions": {
+            str(node_id): {"x": x, "y": y} for node_id, (x, y) in positions.items()
+        },
+    }
+
+
+@handler(DUPLICATE)
+def run_duplicate(job, report):
+    copy = duplicate_model(_job_model(job), name=job.params.get("name") or None)
+    return {"id": str(copy.id), "name": copy.name, "created_at": copy.created_at}
+
+
+@handler(EXPORT)
+def run_export(job, report):
+    # The serializers live in the API module, which imports this one
+    from .api import DataModelSerializer
+
+    data_model = _job_model(job)
+    report(0.1, "Reading model")
+    with reading_from(read_alias(data_model=data_model)):
+        return DataModelSerializer(data_model).data
+
+
+@handler(IMPORT_SCHEMA)
+def run_import_schema(job, report):
+    path = job.params["path"]
+    try:
+        report(0.1, "Reading schema")
+        data_model, summary = import_schema(SQLiteSchema(path), job.params["name"])
+    except Exception as e:
+        # A retried attempt reads the upload again
+        if not will_retry(job, e) and os.path.exists(path):
+            os.remove(path)
+        raise
+    os.remove(path)
+    job.model = data_model
+    return {"id": str(data_model.id), "name": data_model.name, "summary": summary}
+
+
+@handler(THUMBNAIL)
+def run_thumbnail(job, report):
+    data_model = _job_model(job)
+    with reading_from(read_alias(data_model=data_model)):
+        revision, svg = thumbnails.refresh(data_model)
+    return {"revision": revision, "size": len(svg)}
+
+
+_check_node = compile_validator(NODE_SCHEMA)
+_check_edge = compile_validator(EDGE_SCHEMA)
+
+
+def _plain_rows(values):
+    return [
+        {
+            name: str(value) if name in ("id", "source", "target") else value
+            for name, value in row.items()
+        }
+        for row in values
+    ]
+
+
+def _schema_problems(rows, check, root):
+    problems = []
+    count = 0
+    for index, row in enumerate(rows):
+        try:
+            check(row)
+        except SchemaError as e:
+            count += 1
+            if len(problems) < MAX_REPORTED_PROBLEMS:
+                problems.append(e.describe(f"{root}[{index}]"))
+    return count, problems
+
+
+@handler(VALIDATE)
+def run_validate(job, report):
+    """Check the stored graph against the payload schemas and for dangling edges"""
+    data_model = _job_model(job)
+    with reading_from(read_alias(data_model=data_model)):
+        revision = (
+            DataModel.objects.filter(pk=data_model.pk)
+            .values_list("revision", flat=True)
+            .get()
+        )
+        report(0.1, "Checking nodes")
+        nodes = expand_nodes(
+            _plain_rows(
+                data_model.nodes.order_by("pk").values("id", "type", "x", "y", "data")
+            )
+        )
+        node_errors, node_problems = _schema_problems(nodes, _check_node, "nodes")
+        report(0.5, "Checking edges")
+        edges = _plain_rows(
+            data_model.edges.order_by("pk").values("id", "source", "target", "data")
+        )
+        edge_errors, edge_problems = _schema_problems(edges, _check_edge, "edges")
+        report(0.8, "Checking edge endpoints")
+        dangling = list(
+            integrity.dangling_edges(data_model).values_list("pk", flat=True)
+        )
+    return {
+        "revision": revision,
+        "valid": not (node_errors or edge_errors or dangling),
+        "node_errors": node_errors,
+        "edge_errors": edge_errors,
+        "errors": node_problems + edge_problems,
+        "dangling_edges": len(dangling),
+        "dangling_edge_ids": [
+            str(edge_id) for edge_id in dangling[:MAX_REPORTED_PROBLEMS]
+        ],
+    }
@@ -0,0 +1,251 @@
+"""
+Automatic layout of model graphs.
+
+Two algorithms compute new node positions:
+
+- layered: a Sugiyama-style layout with hubs, links and satellites on their
+  own tiers, ordered by the barycenter heuristic to reduce edge crossings
+- force: a Fruchterman-Reingold layout vectorized with NumPy, where
+  repulsion is only computed between nodes in neighbouring cells of a
+  spatial grid
+
+Both work on plain tuples so they can run outside a request; layout_model()
+applies them to a stored model.
+"""
+import math
+from collections import defaultdict
+
+from .models import Settings
+from .saving import save_positions
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+LAYERED = "layered"
+FORCE = "force"
+ALGORITHMS = [LAYERED, FORCE]
+
+# Tier of each node type in the layered layout, top to bottom
+TIERS = {"HUB": 0, "LNK": 1, "SAT": 2}
+
+NODE_SPACING = 280
+TIER_SPACING = 240
+BARYCENTER_SWEEPS = 4
+
+
+def _neighbours(node_ids, edges):
+    neighbours = defaultdict(list)
+    for source, target in edges:
+        if source in node_ids and target in node_ids and source != target:
+            neighbours[source].append(target)
+            neighbours[target].append(source)
+    return neighbours
+
+
+def _order_by_barycenter(tier_nodes, neighbours, rank):
+    def barycenter(node_id):
+        ranks = [rank[other] for other in neighbours[node_id] if other in rank]
+        return sum(ranks) / len(ranks) if ranks else rank.get(node_id, 0)
+
+    return sorted(
+        tier_nodes, key=lambda node_id: (barycenter(node_id), rank.get(node_id, 0))
+    )
+
+
+def layered_layout(nodes, edges):
+    """
+    Place nodes on tiers by type.
+
+    `nodes` is a list of (id, type, x, y) and `edges` a list of
+    (source, target). Wide tiers are wrapped into several rows so the
+    layout stays roughly square. Returns {id: (x, y)}.
+    """
+    node_ids = {node[0] for node in nodes}
+    neighbours = _neighbours(node_ids, edges)
+
+    tiers = defaultdict(list)
+    for node_id, node_type, x, y in sorted(nodes, key=lambda node: (node[2], node[3])):
+        tiers[TIERS.get(node_type, len(TIERS))].append(node_id)
+    tier_keys = sorted(tiers)
+
+    # Start from the current left-to-right order, then sweep down and up
+    rank = {}
+    for key in tier_keys:
+        rank.update({node_id: index for index, node_id in enumerate(tiers[key])})
+    for sweep in range(BARYCENTER_SWEEPS):
+        keys = tier_keys[1:] if sweep % 2 == 0 else list(reversed(tier_keys[:-1]))
+        for key in keys:
+            tiers[key] = _order_by_barycenter(tiers[key], neighbours, rank)
+            rank.update({node_id: index for index, node_id in enumerate(tiers[key])})
+
+    row_width = max(1, math.ceil(math.sqrt(len(nodes)) * 1.5))
+    widest = min(row_width, max((len(tier) for tier in tiers.values()), default=0))
+    positions = {}
+    y = 0.0
+    for key in tier_keys:
+        tier = tiers[key]
+        for start in range(0, len(tier), row_width):
+            row = tier[start : start + row_width]
+            # Center short rows under the widest one
+            x = (widest - len(row)) * NODE_SPACING / 2
+            for node_id in row:
+                positions[node_id] = (x, y)
+                x += NODE_SPACING
+            y += TIER_SPACING
+    return positions
+
+
+# Half of the 3x3 cell neighbourhood, so every pair of cells is visited once
+_NEIGHBOUR_CELLS = [(0, 0), (0, 1), (1, -1), (1, 0), (1, 1)]
+
+
+def _grid_pairs(cells):
+    """
+    Index pairs (i, j) of points in the same or adjacent grid cells, each
+    pair once
+    """
+    cells = cells - cells.min(axis=0)
+    height = int(cells[:, 1].max()) + 3
+    keys = (cells[:, 0] + 1) * height + (cells[:, 1] + 1)
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+
+    sources = []
+    targets = []
+    for dx, dy in _NEIGHBOUR_CELLS:
+        neighbour_keys = keys + dx * height + dy
+        start = np.searchsorted(sorted_keys, neighbour_keys, side="left")
+        end = np.searchsorted(sorted_keys, neighbour_keys, side="right")
+        counts = end - start
+        total = int(counts.sum())
+        # Expand the [start, end) ranges of every point into flat index arrays
+        offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        i = np.repeat(np.arange(len(keys)), counts)
+        j = order[np.repeat(start, counts) + offsets]
+        if (dx, dy) == (0, 0):
+            i, j = i[i < j], j[i < j]
+        sources.append(i)
+        targets.append(j)
+    return np.concatenate(sources), np.concatenate(targets)
+
+
+def force_layout(nodes, edges, iterations=100, ideal_length=NODE_SPACING, seed=0):
+    """
+    Fruchterman-Reingold layout starting from the current positions.
+
+    Repulsion is limited to nodes within two ideal edge lengths, found via a
+    spatial grid, so each iteration is roughly linear in the model size.
+    Returns {id: (x, y)}.
+    """
+    if np is None:
+        raise RuntimeError("The force layout requires NumPy")
+    if not nodes:
+        return {}
+
+    ids = [node[0] for node in nodes]
+    index = {node_id: position for position, node_id in enumerate(ids)}
+    count = len(ids)
+    # Jitter separates nodes that start on top of each other
+    rng = np.random.default_rng(seed)
+    x = np.array([node[2] for node in nodes], dtype=np.float64) + rng.uniform(
+        -1, 1, count
+    )
+    y = np.array([node[3] for node in nodes], dtype=np.float64) + rng.uniform(
+        -1, 1, count
+    )
+
+    edge_index = np.array(
+        [
+            (index[source], index[target])
+            for source, target in edges
+            if source in index and target in index and source != target
+        ],
+        dtype=np.int64,
+    ).reshape(-1, 2)
+
+    k = float(ideal_length)
+    cutoff = 2 * k
+    temperature = max(np.ptp(x), np.ptp(y), k) / 10
+    cooling = temperature / (iterations + 1)
+    source, target = edge_index[:, 0], edge_index[:, 1]
+
+    for _ in range(iterations):
+        # Repulsion k^2 / d between nearby pairs
+        i, j = _grid_pairs(np.floor(np.column_stack((x, y)) / cutoff).astype(np.int64))
+        dx = x[i] - x[j]
+        dy = y[i] - y[j]
+        distance2 = np.maximum(dx * dx + dy * dy, 0.01)
+        near = distance2 < cutoff * cutoff
+        i, j = i[near], j[near]
+        scale = k * k / distance2[near]
+        fx = dx[near] * scale
+        fy = dy[near] * scale
+        move_x = np.bincount(i, fx, count) - np.bincount(j, fx, count)
+        move_y = np.bincount(i, fy, count) - np.bincount(j, fy, count)
+
+        # Attraction d^2 / k along edges
+        dx = x[source] - x[target]
+        dy = y[source] - y[target]
+        scale = np.hypot(dx, dy) / k
+        fx = dx * scale
+        fy = dy * scale
+        move_x += np.bincount(target, fx, count) - np.bincount(source, fx, count)
+        move_y += np.bincount(target, fy, count) - np.bincount(source, fy, count)
+
+        length = np.maximum(np.hypot(move_x, move_y), 0.01)
+        step = np.minimum(length, temperature) / length
+        x += move_x * step
+        y += move_y * step
+        temperature = max(temperature - cooling, 1.0)
+
+    x -= x.min()
+    y -= y.min()
+    return {
+        node_id: (float(node_x), float(node_y))
+        for node_id, node_x, node_y in zip(ids, x, y)
+    }
+
+
+def snap(positions, grid_size):
+    """Round positions to the canvas grid"""
+    if not grid_size:
+        return positions
+    return {
+        node_id: (round(x / grid_size) * grid_size, round(y / grid_size) * grid_size)
+        for node_id, (x, y) in positions.items()
+    }
+
+
+def compute_layout(nodes, edges, algorithm=LAYERED, iterations=100, grid_size=None):
+    """Run `algorithm` and snap the result to `grid_size` if given"""
+    if algorithm == FORCE:
+        positions = force_layout(nodes, edges, iterations=iterations)
+    elif algorithm == LAYERED:
+        positions = layered_layout(nodes, edges)
+    else:
+        raise ValueError(f"Unknown layout algorithm '{algorithm}'")
+    return snap(positions, grid_size)
+
+
+def layout_model(data_model, algorithm=LAYERED, iterations=100, save=True):
+    """
+    Compute a layout for the nodes of `data_model`, snapped to the canvas
+    grid if enabled, and store it unless `save` is false.
+
+    Returns the positions by node id.
+    """
+    settings = Settings.get_instance()
+    nodes = list(data_model.nodes.values_list("id", "type", "x", "y"))
+    edges = list(data_model.edges.values_list("source", "target"))
+    positions = compute_layout(
+        nodes,
+        edges,
+        algorithm=algorithm,
+        iterations=iterations,
+        grid_size=settings.grid_size if settings.snap_to_grid else None,
+    )
+    if save:
+        save_positions(data_model, positions)
+    return positions
@@ -0,0 +1,99 @@
+import gzip
+import uuid
+
+from django.core.management.base import BaseCommand
+from modeler.benchmarking import synthetic_graph, timed, write_table
+from modeler.compression import BROTLI, GZIP, brotli, cached_response
+from rest_framework.renderers import JSONRenderer
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark response size and CPU time of gzip/Brotli compression "
+        "and the precompressed cache"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--nodes",
+            type=int,
+            default=20000,
+            help="Number of nodes in the synthetic model",
+        )
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        nodes, edges = synthetic_graph(options["nodes"])
+        model_id = str(uuid.uuid4())
+        payload = {
+            "id": model_id,
+            "name": "Benchmark",
+            "revision": 1,
+            "nodes": [dict(node, model=model_id) for node in nodes],
+            "edges": [dict(edge, model=model_id) for edge in edges],
+        }
+        repeat = options["repeat"]
+
+        render_ms, body = timed(lambda: JSONRenderer().render(payload), repeat)
+        self.stdout.write(
+            f"{len(nodes)} nodes, {len(edges)} edges: {len(body) / 1e6:.2f} MB JSON, "
+            f"rendered in {render_ms:.0f}ms\n"
+        )
+
+        variants = [
+            (
+                f"gzip -{level}",
+                lambda level=level: gzip.compress(body, level),
+                gzip.decompress,
+            )
+            for level in (1, 6, 9)
+        ]
+        if brotli is not None:
+            variants += [
+                (
+                    f"br q{quality}",
+                    lambda quality=quality: brotli.compress(body, quality=quality),
+                    brotli.decompress,
+                )
+                for quality in (1, 5, 9)
+            ]
+        else:
+            self.stdout.write("brotli is not installed, skipping Brotli variants\n")
+
+        rows = []
+        for name, compress, decompress in variants:
+            compress_ms, compressed = timed(compress, repeat)
+            decompress_ms, _ = timed(lambda: decompress(compressed), repeat)
+            rows.append(
+                [
+                    name,
+                    f"{len(compressed) / 1e6:.2f} MB",
+                    f"{len(body) / len(compressed):.1f}x",
+                    f"{compress_ms:.0f}ms",
+                    f"{decompress_ms:.0f}ms",
+                ]
+            )
+        write_table(
+            self.stdout, ["encoding", "size", "ratio", "compress", "decompress"], rows
+        )
+
+        encoding = BROTLI if brotli is not None else GZIP
+        key = f"bench:{model_id}"
+
+        def render():
+            return JSONRenderer().render(payload)
+
+        miss_ms, _ = timed(
+            lambda: cached_response(
+                f"{key}:{uuid.uuid4()}", encoding, "application/json", render
+            ),
+            1,
+        )
+        hit_ms, _ = timed(
+            lambda: cached_response(key, encoding, "application/json", render),
+            repeat + 1,
+        )
+        self.stdout.write(
+            f"\nPrecompressed cache ({encoding}): miss {miss_ms:.0f}ms "
+            f"(render + compress), hit {hit_ms:.1f}ms\n"
+        )
@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.test import Client
+from modeler import metrics
+from modeler.benchmarking import write_table
+from modeler.pooling import database_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark small requests (GET /api/settings/) with a new connection "
+        "per request versus persistent connections, using the configured database"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+
+    def _run(self, count):
+        client = Client(HTTP_HOST="localhost")
+        created_key = f"db.connections_created.{connection.alias}"
+        created_before = metrics.snapshot()["counters"].get(created_key, 0)
+        started = time.perf_counter()
+        for _ in range(count):
+            # Emulate a server, which closes obsolete connections around each request
+            close_old_connections()
+            response = client.get("/api/settings/")
+            if response.status_code != 200:
+                raise CommandError(
+                    f"GET /api/settings/ returned {response.status_code}, "
+                    "is the database migrated?"
+                )
+            close_old_connections()
+        elapsed = (time.perf_counter() - started) * 1000
+        created = metrics.snapshot()["counters"].get(created_key, 0) - created_before
+        return elapsed / count, created
+
+    def handle(self, *args, **options):
+        count = options["requests"]
+        configured_max_age = connection.settings_dict.get("CONN_MAX_AGE", 0)
+        rows = []
+        try:
+            for name, max_age in [
+                ("new connection per request", 0),
+                ("persistent (CONN_MAX_AGE=600)", 600),
+            ]:
+                connection.close()
+                connection.settings_dict["CONN_MAX_AGE"] = max_age
+                avg_ms, created = self._run(count)
+                rows.append([name, f"{avg_ms:.2f}ms", created])
+        finally:
+            connection.close()
+            connection.settings_dict["CONN_MAX_AGE"] = configured_max_age
+
+        self.stdout.write(f"{count} x GET /api/settings/ on {connection.vendor}\n")
+        write_table(self.stdout, ["mode", "avg latency", "connections opened"], rows)
+
+        pool = database_stats()[connection.alias]["pool"]
+        if pool is not None:
+            avg_ms, created = self._run(count)
+            self.stdout.write(
+                f"\npsycopg pool: {avg_ms:.2f}ms per request, stats: {pool}"
+            )
@@ -0,0 +1,73 @@
+import random
+
+from django.core.management.base import BaseCommand
+from modeler.benchmarking import synthetic_graph, timed, write_table
+from modeler.models import DataModel
+from modeler.saving import save_model_graph, save_positions
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark moving nodes through a full model save versus the "
+        "positions-only path, using the configured database"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--nodes",
+            type=int,
+            default=20000,
+            help="Number of nodes in the synthetic model",
+        )
+        parser.add_argument(
+            "--moved",
+            type=int,
+            nargs="+",
+            default=[100, 20000],
+            help="Numbers of nodes to move",
+        )
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        nodes, edges = synthetic_graph(options["nodes"])
+        data_model = DataModel.objects.create(name="Positions benchmark")
+        rng = random.Random(0)
+        try:
+            save_model_graph(data_model, nodes, edges)
+            rows = []
+            for count in options["moved"]:
+                count = min(count, len(nodes))
+
+                def full_save():
+                    # The client sends the whole graph with some coordinates changed
+                    for node in rng.sample(nodes, count):
+                        node["x"] = float(rng.randint(0, 20000))
+                    save_model_graph(data_model, nodes, edges)
+
+                def positions_only():
+                    moved = rng.sample(nodes, count)
+                    return save_positions(
+                        data_model,
+                        {
+                            node["id"]: (rng.randint(0, 20000), node["y"])
+                            for node in moved
+                        },
+                    )
+
+                full_ms, _ = timed(full_save, options["repeat"])
+                positions_ms, _ = timed(positions_only, options["repeat"])
+                rows.append(
+                    [
+                        count,
+                        f"{full_ms:.0f}ms",
+                        f"{positions_ms:.0f}ms",
+                        f"{full_ms / positions_ms:.1f}x",
+                    ]
+                )
+        finally:
+            data_model.delete()
+
+        self.stdout.write(f"Moving nodes of a {len(nodes)} node model\n")
+        write_table(
+            self.stdout, ["moved nodes", "full save", "positions only", "speedup"], rows
+        )
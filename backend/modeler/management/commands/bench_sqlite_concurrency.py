@@ -0,0 +1,163 @@
+import multiprocessing
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from modeler.api import DataModelSerializer
+from modeler.benchmarking import synthetic_graph, write_table
+from modeler.models import DataModel
+from modeler.saving import save_model_graph
+
+# Default pragmas and rollback journaling, the journal mode is stored in the
+# database file
+BASELINE = ({}, "DELETE")
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark concurrent model reads and autosaves on the configured SQLite "
+        "database with default pragmas versus the performance profile "
+        "(SQLITE_OPTIONS)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--readers", type=int, default=4)
+        parser.add_argument("--writers", type=int, default=2)
+        parser.add_argument("--seconds", type=float, default=5)
+        parser.add_argument(
+            "--nodes", type=int, default=2000, help="Nodes of the model that is read"
+        )
+        parser.add_argument(
+            "--save-nodes", type=int, default=200, help="Nodes of each autosaved model"
+        )
+
+    def _worker(self, deadline, work, results):
+        # Runs in a forked process, like a worker of a multi-process server
+        latencies = []
+        errors = 0
+        try:
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    work()
+                except OperationalError:
+                    errors += 1
+                    time.sleep(0.01)
+                    continue
+                latencies.append((time.perf_counter() - started) * 1000)
+        finally:
+            connections.close_all()
+            results.put((work.__name__, latencies, errors))
+
+    def _run(self, options, read_model, write_models):
+        def read():
+            DataModelSerializer(DataModel.objects.get(pk=read_model.pk)).data
+
+        def autosave(data_model, nodes, edges):
+            def save():
+                save.round += 1
+                moved = [dict(node, x=node["x"] + save.round) for node in nodes]
+                save_model_graph(DataModel.objects.get(pk=data_model.pk), moved, edges)
+
+            save.round = 0
+            return save
+
+        context = multiprocessing.get_context("fork")
+        results = context.Queue()
+        deadline = time.monotonic() + options["seconds"]
+        work = [read] * options["readers"] + [
+            autosave(*write_model) for write_model in write_models
+        ]
+        # Children must open their own connections
+        connections.close_all()
+        processes = [
+            context.Process(target=self._worker, args=(deadline, task, results))
+            for task in work
+        ]
+        for process in processes:
+            process.start()
+        collected = {"read": ([], 0), "save": ([], 0)}
+        for _ in processes:
+            name, latencies, errors = results.get()
+            total, total_errors = collected[name]
+            collected[name] = (total + latencies, total_errors + errors)
+        for process in processes:
+            process.join()
+
+        seconds = options["seconds"]
+        reads, read_errors = collected["read"]
+        writes, write_errors = collected["save"]
+        return [
+            f"{len(reads) / seconds:.1f}",
+            f"{_percentile(reads, 0.95):.0f}ms",
+            f"{len(writes) / seconds:.1f}",
+            f"{_percentile(writes, 0.95):.0f}ms",
+            read_errors + write_errors,
+        ]
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite" or str(
+            connection.settings_dict["NAME"]
+        ).startswith(":memory:"):
+            raise CommandError("This benchmark needs a SQLite database file")
+
+        configured_options = connection.settings_dict.get("OPTIONS", {})
+        models = []
+        rows = []
+        try:
+            nodes, edges = synthetic_graph(options["nodes"])
+            read_model = DataModel.objects.create(name="bench sqlite read")
+            models.append(read_model)
+            save_model_graph(read_model, nodes, edges)
+            write_models = []
+            for index in range(options["writers"]):
+                nodes, edges = synthetic_graph(options["save_nodes"], seed=index + 1)
+                data_model = DataModel.objects.create(
+                    name=f"bench sqlite write {index}"
+                )
+                models.append(data_model)
+                save_model_graph(data_model, nodes, edges)
+                write_models.append((data_model, nodes, edges))
+
+            profiles = [
+                ("default pragmas", *BASELINE),
+                ("performance", settings.SQLITE_OPTIONS, "WAL"),
+            ]
+            for name, profile, journal_mode in profiles:
+                # Changing the journal mode needs the only connection to the database
+                connection.close()
+                connection.settings_dict["OPTIONS"] = {}
+                with connection.cursor() as cursor:
+                    cursor.execute(f"PRAGMA journal_mode={journal_mode}")
+                connection.close()
+                # Connections opened from now on, in every process, use the profile
+                connection.settings_dict["OPTIONS"] = dict(profile)
+                rows.append([name, *self._run(options, read_model, write_models)])
+        finally:
+            connection.close()
+            connection.settings_dict["OPTIONS"] = configured_options
+            if not configured_options:
+                # The performance profile switches back to WAL by itself
+                with connection.cursor() as cursor:
+                    cursor.execute("PRAGMA journal_mode=DELETE")
+            for data_model in models:
+                data_model.delete()
+
+        self.stdout.write(
+            f"{options['readers']} process(es) reading a {options['nodes']} node "
+            f"model and {options['writers']} autosaving {options['save_nodes']} "
+            f"node models for {options['seconds']:g}s\n"
+        )
+        write_table(
+            self.stdout,
+            ["profile", "reads/s", "read p95", "saves/s", "save p95", "lock errors"],
+            rows,
+        )
@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand
+from modeler import validation
+from modeler.benchmarking import synthetic_graph, timed, write_table
+from modeler.models import DataModel
+from modeler.saving import save_model_graph
+
+try:
+    import jsonschema
+except ImportError:  # pragma: no cover - optional dependency
+    jsonschema = None
+
+
+def _shallow_check(nodes):
+    # The check the serializer did before the schemas existed
+    for node in nodes:
+        if not isinstance(node, dict) or "id" not in node:
+            raise ValueError("Invalid node data format")
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark validating node payloads against the JSON Schemas "
+        "compared to saving them"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--nodes",
+            type=int,
+            default=10000,
+            help="Number of nodes in the synthetic model",
+        )
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        nodes, edges = synthetic_graph(options["nodes"])
+        repeat = options["repeat"]
+        nodes_schema = {"type": "array", "items": validation.NODE_SCHEMA}
+
+        variants = [
+            ("isinstance/'id' only (before)", _shallow_check),
+            ("compiled closures", validation.compile_schema(nodes_schema)),
+        ]
+        if validation.fastjsonschema is not None:
+            variants.append(
+                ("fastjsonschema", validation.compile_validator(nodes_schema))
+            )
+        else:
+            self.stdout.write("fastjsonschema is not installed, skipping it\n")
+        if jsonschema is not None:
+            # For reference: an interpreting validator, built once as well
+            variants.append(
+                (
+                    "jsonschema (interpreted)",
+                    jsonschema.Draft7Validator(nodes_schema).validate,
+                )
+            )
+
+        data_model = DataModel.objects.create(name="bench validation")
+        try:
+            save_ms, _ = timed(lambda: save_model_graph(data_model, nodes, edges), 1)
+        finally:
+            data_model.delete()
+
+        rows = []
+        for name, check in variants:
+            elapsed, _ = timed(lambda: check(nodes), repeat)
+            rows.append([name, f"{elapsed:.1f}ms", f"{elapsed / save_ms * 100:.1f}%"])
+        columns = sum(len(node["data"]["columns"]) for node in nodes)
+        self.stdout.write(
+            f"{len(nodes)} nodes with {columns} columns, "
+            f"saved in {save_ms:.0f}ms; the API uses {validation.ENGINE}\n"
+        )
+        write_table(self.stdout, ["validator", "nodes", "of save"], rows)
@@ -0,0 +1,71 @@
+import gzip
+import json
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from modeler import wire
+from modeler.benchmarking import synthetic_graph, timed, write_table
+from rest_framework.renderers import JSONRenderer
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark size and encode/decode time of a model retrieve as JSON "
+        "versus columnar MessagePack"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--nodes",
+            type=int,
+            default=20000,
+            help="Number of nodes in the synthetic model",
+        )
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        if wire.msgpack is None:
+            raise CommandError("The msgpack package is not installed")
+
+        nodes, edges = synthetic_graph(options["nodes"])
+        model_id = str(uuid.uuid4())
+        payload = {
+            "id": model_id,
+            "name": "Benchmark",
+            "revision": 1,
+            "nodes": [dict(node, model=model_id) for node in nodes],
+            "edges": [dict(edge, model=model_id) for edge in edges],
+        }
+        repeat = options["repeat"]
+
+        formats = [
+            ("JSON", lambda: JSONRenderer().render(payload), json.loads),
+            (
+                "MessagePack (columnar)",
+                lambda: wire.MessagePackRenderer().render(payload),
+                lambda body: wire.from_columnar(wire.msgpack.unpackb(body)),
+            ),
+        ]
+        rows = []
+        json_size = None
+        for name, encode, decode in formats:
+            encode_ms, body = timed(encode, repeat)
+            decode_ms, _ = timed(lambda: decode(body), repeat)
+            json_size = json_size or len(body)
+            rows.append(
+                [
+                    name,
+                    f"{len(body) / 1e6:.2f} MB",
+                    f"{json_size / len(body):.1f}x",
+                    f"{len(gzip.compress(body, 6)) / 1e6:.2f} MB",
+                    f"{encode_ms:.0f}ms",
+                    f"{decode_ms:.0f}ms",
+                ]
+            )
+
+        self.stdout.write(f"{len(nodes)} nodes, {len(edges)} edges\n")
+        write_table(
+            self.stdout,
+            ["format", "size", "smaller", "gzip -6", "encode", "decode"],
+            rows,
+        )
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+from modeler.integrity import dangling_counts
+from modeler.models import DataModel
+from modeler.saving import prune_dangling_edges
+
+
+class Command(BaseCommand):
+    help = "Report edges whose source or target node no longer exists and delete them"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Only report dangling edges"
+        )
+        parser.add_argument("--model", help="Only check the model with this id")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=5000,
+            help="Edges deleted per transaction and revision",
+        )
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be at least 1")
+
+        counts = dangling_counts()
+        models = DataModel.objects.filter(pk__in=list(counts)).order_by("name")
+        if options["model"]:
+            models = models.filter(pk=options["model"])
+
+        total = 0
+        for data_model in models.iterator():
+            if options["dry_run"]:
+                total += counts[data_model.pk]
+                self.stdout.write(
+                    f"{data_model.name} ({data_model.pk}): "
+                    f"{counts[data_model.pk]} dangling edge(s)"
+                )
+                continue
+            deleted = 0
+            while True:
+                pruned = prune_dangling_edges(data_model, options["chunk_size"])
+                deleted += len(pruned)
+                if len(pruned) < options["chunk_size"]:
+                    break
+            total += deleted
+            self.stdout.write(
+                f"{data_model.name} ({data_model.pk}): deleted {deleted} "
+                f"dangling edge(s), now at revision {data_model.revision}"
+            )
+
+        verb = "Found" if options["dry_run"] else "Deleted"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{verb} {total} dangling edge(s) in {models.count()} model(s)"
+            )
+        )
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from modeler.models import DataModel
+from modeler.versioning import compact_history
+
+
+class Command(BaseCommand):
+    help = (
+        "Prune old model history, folding older deltas into a snapshot "
+        "of the oldest kept revision"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--keep",
+            type=int,
+            default=100,
+            help="Number of most recent revisions to keep per model",
+        )
+        parser.add_argument("--model", help="Only compact the model with this id")
+
+    def handle(self, *args, **options):
+        keep = options["keep"]
+        if keep < 1:
+            raise CommandError("--keep must be at least 1")
+
+        models = DataModel.objects.all()
+        if options["model"]:
+            models = models.filter(pk=options["model"])
+
+        total = 0
+        for data_model in models.iterator():
+            with transaction.atomic():
+                deleted = compact_history(data_model, keep)
+            if deleted:
+                self.stdout.write(
+                    f"{data_model.name} ({data_model.pk}): removed {deleted} version(s)"
+                )
+            total += deleted
+
+        self.stdout.write(self.style.SUCCESS(f"Removed {total} version(s)"))
@@ -0,0 +1,52 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from modeler.importing import PostgresSchema, SQLiteSchema, import_schema
+
+
+class Command(BaseCommand):
+    help = (
+        "Create a Data Vault model from the tables of a SQLite file "
+        "or a PostgreSQL database"
+    )
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument("--sqlite", help="Path of a SQLite database file")
+        source.add_argument(
+            "--postgres", help="PostgreSQL DSN, e.g. 'dbname=erp host=localhost'"
+        )
+        parser.add_argument(
+            "--schema", default="public", help="PostgreSQL schema to read"
+        )
+        parser.add_argument("--name", help="Name of the new model")
+        parser.add_argument(
+            "--workers", type=int, help="Threads introspecting tables in parallel"
+        )
+
+    def handle(self, *args, **options):
+        if options["sqlite"]:
+            if not os.path.exists(options["sqlite"]):
+                raise CommandError(f"{options['sqlite']} does not exist")
+            source = SQLiteSchema(options["sqlite"])
+            default_name = os.path.splitext(os.path.basename(options["sqlite"]))[0]
+        else:
+            source = PostgresSchema(options["postgres"], options["schema"])
+            default_name = options["schema"]
+
+        data_model, summary = import_schema(
+            source, options["name"] or default_name, workers=options["workers"]
+        )
+        nodes = ", ".join(
+            f"{count} {node_type}" for node_type, count in summary["nodes"].items()
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created model {data_model.id} from {summary['tables']} table(s): "
+                f"{nodes}, {summary['edges']} edge(s)"
+            )
+        )
+        if summary["skipped"]:
+            self.stdout.write(
+                f"Skipped tables without keys: {', '.join(summary['skipped'])}"
+            )
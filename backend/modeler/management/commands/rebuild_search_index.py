@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from modeler.models import DataModel
+from modeler.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the node search index from the stored models"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--model", help="Only rebuild the entries of the model with this id"
+        )
+
+    def handle(self, *args, **options):
+        models = DataModel.objects.all()
+        if options["model"]:
+            models = models.filter(pk=options["model"])
+
+        total = 0
+        for data_model in models.iterator():
+            with transaction.atomic():
+                total += rebuild_index([data_model])
+
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} node(s)"))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from modeler.models import DataModel
+from modeler.stats import recompute_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the statistics of stored models, e.g. to backfill models "
+        "saved before they existed"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--model", help="Only recompute the statistics of the model with this id"
+        )
+        parser.add_argument(
+            "--missing", action="store_true", help="Only models without statistics"
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=100, help="Models read per query"
+        )
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be at least 1")
+
+        models = DataModel.objects.order_by("pk")
+        if options["model"]:
+            models = models.filter(pk=options["model"])
+        if options["missing"]:
+            models = models.filter(stats__isnull=True)
+
+        total = 0
+        for data_model in models.only("pk", "name").iterator(
+            chunk_size=options["chunk_size"]
+        ):
+            with transaction.atomic():
+                # Saves of the model wait, so they apply their changes to the new counts
+                DataModel.objects.select_for_update().filter(pk=data_model.pk).exists()
+                recompute_stats(data_model)
+            total += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Recomputed the statistics of {total} model(s)")
+        )
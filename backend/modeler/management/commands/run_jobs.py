@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from modeler.jobs import requeue_stale, start_workers
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs on a pool of worker threads"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, help="Number of worker threads (default JOB_WORKERS)"
+        )
+        parser.add_argument(
+            "--poll",
+            type=float,
+            help="Seconds to wait when the queue is empty (default JOB_POLL_INTERVAL)",
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Exit when the queue is empty"
+        )
+
+    def handle(self, *args, **options):
+        requeued = requeue_stale()
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stale job(s)")
+
+        threads, stop = start_workers(
+            options["workers"], options["poll"], until_idle=options["once"]
+        )
+        self.stdout.write(f"Started {len(threads)} job worker(s)")
+        try:
+            for thread in threads:
+                # Joining with a timeout keeps the main thread responsive to Ctrl+C
+                while thread.is_alive():
+                    thread.join(timeout=1.0)
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping after the running jobs")
+            stop.set()
+            for thread in threads:
+                thread.join()
+        self.stdout.write(self.style.SUCCESS("Job workers stopped"))
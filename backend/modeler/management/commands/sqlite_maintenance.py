@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from modeler.sqlite import CHECKPOINT_MODES, checkpoint, is_sqlite, optimize, pragmas
+
+
+class Command(BaseCommand):
+    help = (
+        "Checkpoint the write-ahead log and refresh planner statistics "
+        "of a SQLite database"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+        parser.add_argument(
+            "--mode",
+            choices=CHECKPOINT_MODES,
+            default="TRUNCATE",
+            help="Checkpoint mode",
+        )
+        parser.add_argument(
+            "--no-optimize", action="store_true", help="Only checkpoint"
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Repeat every N seconds until interrupted",
+        )
+
+    def _run(self, alias, options):
+        started = time.perf_counter()
+        result = checkpoint(alias, options["mode"])
+        if not options["no_optimize"]:
+            optimize(alias)
+        elapsed = (time.perf_counter() - started) * 1000
+        if result["log_pages"] < 0:
+            self.stdout.write(f"Not in WAL mode, optimized in {elapsed:.0f}ms")
+            return
+        state = "blocked by readers or writers, " if result["busy"] else ""
+        self.stdout.write(
+            f"Checkpointed {result['checkpointed_pages']} of {result['log_pages']} "
+            f"log page(s), {state}{elapsed:.0f}ms"
+        )
+
+    def handle(self, *args, **options):
+        alias = options["database"]
+        if not is_sqlite(alias):
+            raise CommandError(f"Database '{alias}' is not SQLite")
+
+        self.stdout.write(
+            ", ".join(f"{name}={value}" for name, value in pragmas(alias).items())
+        )
+        try:
+            while True:
+                self._run(alias, options)
+                if not options["interval"]:
+                    break
+                # Do not hold a connection between runs
+                connections[alias].close()
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
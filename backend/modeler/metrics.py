@@ -0,0 +1,58 @@
+"""
+Lightweight in-process metrics registry.
+
+Counters, gauges and timings are kept per worker process and exposed
+through GET /api/metrics/.
+"""
+import threading
+from collections import defaultdict
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_gauges = {}
+_timings = {}
+
+
+def incr(name, value=1):
+    """Increment a counter"""
+    with _lock:
+        _counters[name] += value
+
+
+def set_gauge(name, value):
+    """Set a gauge to its current value"""
+    with _lock:
+        _gauges[name] = value
+
+
+def observe(name, milliseconds):
+    """Record a duration in milliseconds"""
+    with _lock:
+        timing = _timings.setdefault(
+            name, {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "last_ms": 0.0}
+        )
+        timing["count"] += 1
+        timing["total_ms"] += milliseconds
+        timing["max_ms"] = max(timing["max_ms"], milliseconds)
+        timing["last_ms"] = milliseconds
+
+
+def snapshot():
+    """Return a copy of all metrics"""
+    with _lock:
+        timings = {}
+        for name, timing in _timings.items():
+            timings[name] = dict(timing, avg_ms=timing["total_ms"] / timing["count"])
+        return {
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+            "timings": timings,
+        }
+
+
+def reset():
+    """Clear all metrics (used by tests)"""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _timings.clear()
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("modeler", "0008_auto_20250715_1911"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="datamodel",
+            name="revision",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
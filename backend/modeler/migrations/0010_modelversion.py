@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("modeler", "0009_datamodel_revision"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ModelVersion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("revision", models.PositiveIntegerField()),
+                ("is_snapshot", models.BooleanField(default=False)),
+                (
+                    "codec",
+                    models.CharField(
+                        choices=[("zlib", "zlib"), ("zstd", "Zstandard")],
+                        default="zlib",
+                        max_length=4,
+                    ),
+                ),
+                ("payload", models.BinaryField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "model",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="versions",
+                        to="modeler.datamodel",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["model", "revision"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("model", "revision"), name="unique_model_revision"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("modeler", "0010_modelversion"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ColumnDefinition",
+            fields=[
+                (
+                    "hash",
+                    models.CharField(max_length=32, primary_key=True, serialize=False),
+                ),
+                ("definition", models.JSONField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,136 @@
+import hashlib
+import json
+
+from django.db import migrations
+
+BATCH_SIZE = 500
+
+# Frozen copies of the helpers in modeler/columns.py as of this migration,
+# so later changes to the app code cannot change what it does
+
+COLUMNS_KEY = "columns"
+REFS_KEY = "columnRefs"
+GLOBAL_PREFIX = "global:"
+
+
+def column_hash(definition):
+    canonical = json.dumps(definition, sort_keys=True, separators=(",", ":"))
+    return hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+
+
+def compact_node_data(data, global_ids):
+    if not isinstance(data, dict) or not isinstance(data.get(COLUMNS_KEY), list):
+        return data, {}
+
+    compact = {key: value for key, value in data.items() if key != COLUMNS_KEY}
+    refs = []
+    definitions = {}
+    for column in data[COLUMNS_KEY]:
+        if isinstance(column, dict) and column.get("id") in global_ids:
+            refs.append(GLOBAL_PREFIX + column["id"])
+            continue
+        digest = column_hash(column)
+        definitions[digest] = column
+        refs.append(digest)
+    compact[REFS_KEY] = refs
+    return compact, definitions
+
+
+def expand_node_data(data, definitions, global_columns):
+    if not isinstance(data, dict) or REFS_KEY not in data:
+        return data
+
+    expanded = {key: value for key, value in data.items() if key != REFS_KEY}
+    columns = []
+    for ref in data[REFS_KEY]:
+        if ref.startswith(GLOBAL_PREFIX):
+            column = global_columns.get(ref[len(GLOBAL_PREFIX) :])
+            if column is not None and column.get("isEnabled", True):
+                columns.append(dict(column, isGlobal=True))
+        elif ref in definitions:
+            columns.append(definitions[ref])
+    expanded[COLUMNS_KEY] = columns
+    return expanded
+
+
+DEFAULT_GLOBAL_COLUMN_IDS = {"record_source", "load_date"}
+
+
+def _global_columns(Settings):
+    settings = Settings.objects.first()
+    if settings is None or not settings.global_columns:
+        return None
+    return {
+        column["id"]: column for column in settings.global_columns if "id" in column
+    }
+
+
+def compact_columns(apps, schema_editor):
+    """Move inline node columns into the shared column dictionary"""
+    Node = apps.get_model("modeler", "Node")
+    ColumnDefinition = apps.get_model("modeler", "ColumnDefinition")
+    Settings = apps.get_model("modeler", "Settings")
+
+    global_columns = _global_columns(Settings)
+    global_ids = (
+        set(global_columns) if global_columns is not None else DEFAULT_GLOBAL_COLUMN_IDS
+    )
+
+    batch = []
+    definitions = {}
+
+    def flush():
+        ColumnDefinition.objects.bulk_create(
+            [
+                ColumnDefinition(hash=digest, definition=definition)
+                for digest, definition in definitions.items()
+            ],
+            ignore_conflicts=True,
+            batch_size=BATCH_SIZE,
+        )
+        Node.objects.bulk_update(batch, ["data"], batch_size=BATCH_SIZE)
+        batch.clear()
+        definitions.clear()
+
+    for node in Node.objects.filter(data__has_key=COLUMNS_KEY).iterator(
+        chunk_size=BATCH_SIZE
+    ):
+        node.data, node_definitions = compact_node_data(node.data, global_ids)
+        definitions.update(node_definitions)
+        batch.append(node)
+        if len(batch) >= BATCH_SIZE:
+            flush()
+    flush()
+
+
+def expand_columns(apps, schema_editor):
+    """Inline column definitions again (for rollback)"""
+    Node = apps.get_model("modeler", "Node")
+    ColumnDefinition = apps.get_model("modeler", "ColumnDefinition")
+    Settings = apps.get_model("modeler", "Settings")
+
+    global_columns = _global_columns(Settings) or {}
+    definitions = {
+        column.hash: column.definition for column in ColumnDefinition.objects.all()
+    }
+
+    batch = []
+    for node in Node.objects.filter(data__has_key=REFS_KEY).iterator(
+        chunk_size=BATCH_SIZE
+    ):
+        node.data = expand_node_data(node.data, definitions, global_columns)
+        batch.append(node)
+        if len(batch) >= BATCH_SIZE:
+            Node.objects.bulk_update(batch, ["data"], batch_size=BATCH_SIZE)
+            batch.clear()
+    Node.objects.bulk_update(batch, ["data"], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("modeler", "0011_columndefinition"),
+    ]
+
+    operations = [
+        migrations.RunPython(compact_columns, expand_columns),
+    ]
@@ -0,0 +1,176 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+# Frozen copies of entry_fields() in modeler/search.py and the column helpers
+# it uses as of this migration, so later changes to the app code cannot
+# change what it does
+
+
+def _marker_name(marker):
+    return marker.get("type", "") if isinstance(marker, dict) else str(marker)
+
+
+def _columns(data, definitions):
+    # Global column references are left out, like entry_fields() does
+    if "columnRefs" in data:
+        return [definitions[ref] for ref in data["columnRefs"] if ref in definitions]
+    return data.get("columns", [])
+
+
+def entry_fields(node_id, node_type, data, definitions):
+    data = data if isinstance(data, dict) else {}
+    columns = [
+        {
+            "name": column.get("name", ""),
+            "dataType": column.get("dataType", ""),
+            "markers": [_marker_name(marker) for marker in column.get("markers", [])],
+        }
+        for column in _columns(data, definitions)
+        if isinstance(column, dict) and not column.get("isGlobal")
+    ]
+    label = str(data.get("label") or "")
+    words = [label, node_type]
+    for column in columns:
+        words.extend([column["name"], column["dataType"], *column["markers"]])
+    return {
+        "node_id": node_id,
+        "node_type": node_type,
+        "label": label[:255],
+        "columns": columns,
+        "document": " ".join(word for word in words if word).lower(),
+    }
+
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE modeler_searchentry_fts USING fts5(
+        document,
+        content='modeler_searchentry',
+        content_rowid='id',
+        tokenize="unicode61 tokenchars '_'"
+    )
+    """,
+    """
+    CREATE TRIGGER modeler_searchentry_ai AFTER INSERT ON modeler_searchentry BEGIN
+        INSERT INTO modeler_searchentry_fts(rowid, document)
+        VALUES (new.id, new.document);
+    END
+    """,
+    """
+    CREATE TRIGGER modeler_searchentry_ad AFTER DELETE ON modeler_searchentry BEGIN
+        INSERT INTO modeler_searchentry_fts(modeler_searchentry_fts, rowid, document)
+        VALUES ('delete', old.id, old.document);
+    END
+    """,
+    """
+    CREATE TRIGGER modeler_searchentry_au AFTER UPDATE ON modeler_searchentry BEGIN
+        INSERT INTO modeler_searchentry_fts(modeler_searchentry_fts, rowid, document)
+        VALUES ('delete', old.id, old.document);
+        INSERT INTO modeler_searchentry_fts(rowid, document)
+        VALUES (new.id, new.document);
+    END
+    """,
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS modeler_searchentry_au",
+    "DROP TRIGGER IF EXISTS modeler_searchentry_ad",
+    "DROP TRIGGER IF EXISTS modeler_searchentry_ai",
+    "DROP TABLE IF EXISTS modeler_searchentry_fts",
+]
+
+POSTGRESQL_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX modeler_searchentry_document_trgm ON modeler_searchentry "
+    "USING gin (document gin_trgm_ops)",
+]
+
+POSTGRESQL_REVERSE = [
+    "DROP INDEX IF EXISTS modeler_searchentry_document_trgm",
+]
+
+
+def _run(schema_editor, statements):
+    for statement in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def create_text_index(apps, schema_editor):
+    """Create the backend-specific full-text index"""
+    _run(schema_editor, {"sqlite": SQLITE_FORWARD, "postgresql": POSTGRESQL_FORWARD})
+
+
+def drop_text_index(apps, schema_editor):
+    _run(schema_editor, {"sqlite": SQLITE_REVERSE, "postgresql": POSTGRESQL_REVERSE})
+
+
+def build_entries(apps, schema_editor):
+    """Index the nodes of all existing models"""
+    Node = apps.get_model("modeler", "Node")
+    SearchEntry = apps.get_model("modeler", "SearchEntry")
+    ColumnDefinition = apps.get_model("modeler", "ColumnDefinition")
+    definitions = {
+        column.hash: column.definition for column in ColumnDefinition.objects.all()
+    }
+
+    batch = []
+    for node in Node.objects.iterator(chunk_size=BATCH_SIZE):
+        batch.append(
+            SearchEntry(
+                model_id=node.model_id,
+                **entry_fields(node.id, node.type, node.data, definitions)
+            )
+        )
+        if len(batch) >= BATCH_SIZE:
+            SearchEntry.objects.bulk_create(batch)
+            batch.clear()
+    SearchEntry.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("modeler", "0012_compact_node_columns"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("node_id", models.UUIDField(db_index=True)),
+                (
+                    "node_type",
+                    models.CharField(
+                        choices=[("HUB", "Hub"), ("LNK", "Link"), ("SAT", "Satellite")],
+                        max_length=3,
+                    ),
+                ),
+                ("label", models.CharField(blank=True, max_length=255)),
+                ("columns", models.JSONField(default=list)),
+                ("document", models.TextField()),
+                (
+                    "model",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="search_entries",
+                        to="modeler.datamodel",
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunPython(create_text_index, drop_text_index),
+        migrations.RunPython(build_entries, migrations.RunPython.noop),
+    ]
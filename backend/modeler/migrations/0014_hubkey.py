@@ -0,0 +1,119 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:35
+
+import hashlib
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+# Frozen copies of key_fields() in modeler/registry.py and the helpers it
+# uses as of this migration, so later changes to the app code cannot
+# change what it does
+
+
+def _marker_name(marker):
+    return marker.get("type", "") if isinstance(marker, dict) else str(marker)
+
+
+def _columns(data, definitions):
+    # Global column references are left out, like key_fields() does
+    if "columnRefs" in data:
+        return [definitions[ref] for ref in data["columnRefs"] if ref in definitions]
+    return data.get("columns", [])
+
+
+def _normalize_name(name):
+    name = re.sub(r"([a-z0-9])([A-Z])", r"\1_\2", str(name).strip())
+    return re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_")
+
+
+def _digest(parts):
+    return hashlib.blake2b("|".join(parts).encode(), digest_size=16).hexdigest()
+
+
+def key_fields(node_id, data, definitions):
+    data = data if isinstance(data, dict) else {}
+    columns = {}
+    for column in _columns(data, definitions):
+        if not isinstance(column, dict) or column.get("isGlobal"):
+            continue
+        if "BK" in (_marker_name(marker) for marker in column.get("markers", [])):
+            name = _normalize_name(column.get("name", ""))
+            if name:
+                columns[name] = re.sub(
+                    r"\s+", "", str(column.get("dataType", ""))
+                ).upper()
+    if not columns:
+        return None
+
+    key_columns = [
+        {"name": name, "dataType": columns[name]} for name in sorted(columns)
+    ]
+    return {
+        "node_id": node_id,
+        "label": str(data.get("label") or "")[:255],
+        "key_hash": _digest([column["name"] for column in key_columns]),
+        "definition_hash": _digest(
+            [f"{column['name']}:{column['dataType']}" for column in key_columns]
+        ),
+        "key_columns": key_columns,
+    }
+
+
+def build_registry(apps, schema_editor):
+    """Register the hubs of all existing models"""
+    Node = apps.get_model("modeler", "Node")
+    HubKey = apps.get_model("modeler", "HubKey")
+    ColumnDefinition = apps.get_model("modeler", "ColumnDefinition")
+    definitions = {
+        column.hash: column.definition for column in ColumnDefinition.objects.all()
+    }
+    batch = []
+    for node in Node.objects.filter(type="HUB").iterator(chunk_size=BATCH_SIZE):
+        fields = key_fields(node.id, node.data, definitions)
+        if fields is not None:
+            batch.append(HubKey(model_id=node.model_id, **fields))
+        if len(batch) >= BATCH_SIZE:
+            HubKey.objects.bulk_create(batch)
+            batch.clear()
+    HubKey.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("modeler", "0013_searchentry"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HubKey",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("node_id", models.UUIDField(db_index=True)),
+                ("label", models.CharField(blank=True, max_length=255)),
+                ("key_hash", models.CharField(db_index=True, max_length=32)),
+                ("definition_hash", models.CharField(max_length=32)),
+                ("key_columns", models.JSONField(default=list)),
+                (
+                    "model",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="hub_keys",
+                        to="modeler.datamodel",
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunPython(build_registry, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("modeler", "0015_job"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ModelStats",
+            fields=[
+                (
+                    "model",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to="modeler.datamodel",
+                    ),
+                ),
+                ("node_counts", models.JSONField(default=dict)),
+                ("column_count", models.PositiveIntegerField(default=0)),
+                ("edge_count", models.PositiveIntegerField(default=0)),
+                ("satellites_per_hub", models.JSONField(default=dict)),
+                ("link_arity", models.JSONField(default=dict)),
+                ("orphan_hubs", models.PositiveIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
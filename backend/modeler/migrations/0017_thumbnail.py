@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("modeler", "0016_modelstats"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Thumbnail",
+            fields=[
+                (
+                    "model",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="thumbnail",
+                        serialize=False,
+                        to="modeler.datamodel",
+                    ),
+                ),
+                ("revision", models.PositiveIntegerField()),
+                ("svg", models.TextField()),
+                ("rendered_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
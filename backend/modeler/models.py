@@ -1,17 +1,22 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 import uuid
 
+
 class DataModel(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=120)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Incremented on every save of the model graph
+    revision = models.PositiveIntegerField(default=0)
+
 
 class Node(models.Model):
     HUB = "HUB"
     LINK = "LNK"
     SAT = "SAT"
     TYPES = [(HUB, "Hub"), (LINK, "Link"), (SAT, "Satellite")]
-    
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=True)
     model = models.ForeignKey(DataModel, on_delete=models.CASCADE, related_name="nodes")
     type = models.CharField(max_length=3, choices=TYPES)
@@ -19,6 +24,7 @@ class Node(models.Model):
     y = models.FloatField()
     data = models.JSONField(default=dict)
 
+
 class Edge(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=True)
     model = models.ForeignKey(DataModel, on_delete=models.CASCADE, related_name="edges")
@@ -26,24 +32,179 @@ class Edge(models.Model):
     target = models.UUIDField()
     data = models.JSONField(default=dict)
 
+
+class ColumnDefinition(models.Model):
+    """
+    Content-addressed column definition shared across nodes and models.
+    Node.data references these by hash (see modeler/columns.py).
+    """
+    hash = models.CharField(max_length=32, primary_key=True)
+    definition = models.JSONField()
+
+
+class SearchEntry(models.Model):
+    """
+    Search index row for one node. `document` holds the lowercased label,
+    type, column names, data types and markers; it is indexed with FTS5 on
+    SQLite and a trigram GIN index on PostgreSQL (see modeler/search.py).
+    """
+    model = models.ForeignKey(
+        DataModel, on_delete=models.CASCADE, related_name="search_entries"
+    )
+    node_id = models.UUIDField(db_index=True)
+    node_type = models.CharField(max_length=3, choices=Node.TYPES)
+    label = models.CharField(max_length=255, blank=True)
+    columns = models.JSONField(default=list)
+    document = models.TextField()
+
+
+class HubKey(models.Model):
+    """
+    Business key registry row for one hub. `key_hash` identifies the
+    normalized business key column names and `definition_hash` the names
+    together with their data types (see modeler/registry.py).
+    """
+    model = models.ForeignKey(
+        DataModel, on_delete=models.CASCADE, related_name="hub_keys"
+    )
+    node_id = models.UUIDField(db_index=True)
+    label = models.CharField(max_length=255, blank=True)
+    key_hash = models.CharField(max_length=32, db_index=True)
+    definition_hash = models.CharField(max_length=32)
+    key_columns = models.JSONField(default=list)
+
+
+class ModelVersion(models.Model):
+    """
+    One entry in a model's history. Snapshots hold the full graph, all other
+    entries hold the delta against the previous revision. Payloads are
+    compressed JSON (see modeler/versioning.py).
+    """
+    ZLIB = "zlib"
+    ZSTD = "zstd"
+    CODECS = [(ZLIB, "zlib"), (ZSTD, "Zstandard")]
+
+    model = models.ForeignKey(
+        DataModel, on_delete=models.CASCADE, related_name="versions"
+    )
+    revision = models.PositiveIntegerField()
+    is_snapshot = models.BooleanField(default=False)
+    codec = models.CharField(max_length=4, choices=CODECS, default=ZLIB)
+    payload = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["model", "revision"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["model", "revision"], name="unique_model_revision"
+            ),
+        ]
+
+
+class Job(models.Model):
+    """
+    Background job for a long-running model operation, run by the worker
+    pool of `manage.py run_jobs` (see modeler/jobs.py).
+    """
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+    STATUSES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (SUCCEEDED, "Succeeded"),
+        (FAILED, "Failed"),
+        (CANCELLED, "Cancelled"),
+    ]
+    FINISHED = [SUCCEEDED, FAILED, CANCELLED]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=40)
+    model = models.ForeignKey(
+        DataModel,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="jobs",
+    )
+    params = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=10, choices=STATUSES, default=QUEUED)
+    progress = models.FloatField(default=0.0)
+    message = models.CharField(max_length=255, blank=True)
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    error = models.TextField(blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    # Retried jobs are not claimed before this time
+    not_before = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["created_at"]
+        indexes = [
+            models.Index(fields=["status", "created_at"], name="job_status_created")
+        ]
+
+
+class ModelStats(models.Model):
+    """
+    Aggregates of one model's graph, maintained by the saves of the model
+    (see modeler/stats.py). Histograms map a count, as a string, to the
+    number of hubs or links having it.
+    """
+    model = models.OneToOneField(
+        DataModel, on_delete=models.CASCADE, primary_key=True, related_name="stats"
+    )
+    node_counts = models.JSONField(default=dict)
+    column_count = models.PositiveIntegerField(default=0)
+    edge_count = models.PositiveIntegerField(default=0)
+    satellites_per_hub = models.JSONField(default=dict)
+    link_arity = models.JSONField(default=dict)
+    orphan_hubs = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class Thumbnail(models.Model):
+    """
+    SVG thumbnail of a model and the revision it shows (see
+    modeler/thumbnails.py). Stored in the database so thumbnails rendered by
+    job workers reach every web worker.
+    """
+    model = models.OneToOneField(
+        DataModel,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="thumbnail",
+    )
+    revision = models.PositiveIntegerField()
+    svg = models.TextField()
+    rendered_at = models.DateTimeField(auto_now=True)
+
+
 class Settings(models.Model):
     """Global application settings that persist across all models"""
     # Single instance model - only one settings record should exist
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    
+
     # Display preferences
     theme = models.CharField(max_length=20, default='light', choices=[
         ('light', 'Light'),
         ('dark', 'Dark'),
         ('auto', 'Auto'),
     ])
-    
+
     # Canvas settings
     auto_save = models.BooleanField(default=True)
     auto_save_interval = models.IntegerField(default=30)  # seconds
     snap_to_grid = models.BooleanField(default=True)
     grid_size = models.IntegerField(default=16)
-    
+
     # Edge settings
     edge_type = models.CharField(max_length=20, default='smoothstep', choices=[
         ('bezier', 'Bezier'),
@@ -54,25 +215,25 @@ class Settings(models.Model):
     floating_edges = models.BooleanField(default=True)
     edge_animation = models.BooleanField(default=True)
     show_connection_points = models.BooleanField(default=True)
-    
+
     # Global column settings
     global_columns = models.JSONField(default=list, help_text="Global columns that appear in all node types")
-    
+
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    
+
     class Meta:
         verbose_name = "Settings"
         verbose_name_plural = "Settings"
-    
+
     def __str__(self):
         return "Application Settings"
-    
+
     def save(self, *args, **kwargs):
         # Ensure only one settings instance exists
         if not self.pk and Settings.objects.exists():
-            # If trying to create a new instance but one already exists, 
+            # If trying to create a new instance but one already exists,
             # update the existing one instead
             existing = Settings.objects.first()
             for field in self._meta.fields:
@@ -81,7 +242,7 @@ class Settings(models.Model):
             existing.save()
             return existing
         return super().save(*args, **kwargs)
-    
+
     @classmethod
     def get_default_global_columns(cls):
         """Get the default global columns configuration"""
@@ -123,10 +284,10 @@ class Settings(models.Model):
                 'global_columns': cls.get_default_global_columns(),
             }
         )
-        
+
         # Ensure global_columns is always populated, even for existing records
         if not obj.global_columns:
             obj.global_columns = cls.get_default_global_columns()
             obj.save()
-        
+
         return obj
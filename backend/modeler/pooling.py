@@ -0,0 +1,55 @@
+"""
+Database connection statistics.
+
+Counts new connections per alias and reports the CONN_MAX_AGE/health check
+configuration, plus utilization and wait times of psycopg 3 connection
+pools when DB_POOL_MODE=pool.
+"""
+from django.db import connections
+
+from . import metrics
+
+
+def on_connection_created(sender, connection, **kwargs):
+    metrics.incr(f"db.connections_created.{connection.alias}")
+
+
+def _uses_pool(connection):
+    return connection.vendor == "postgresql" and bool(
+        connection.settings_dict.get("OPTIONS", {}).get("pool")
+    )
+
+
+def _pool_stats(connection):
+    stats = connection.pool.get_stats()
+    max_size = stats.get("pool_max") or connection.pool.max_size
+    in_use = stats.get("pool_size", 0) - stats.get("pool_available", 0)
+    requests = stats.get("requests_num", 0)
+    return {
+        "size": stats.get("pool_size", 0),
+        "available": stats.get("pool_available", 0),
+        "max_size": max_size,
+        "utilization": in_use / max_size if max_size else 0.0,
+        "requests": requests,
+        "requests_waiting": stats.get("requests_waiting", 0),
+        "requests_queued": stats.get("requests_queued", 0),
+        "avg_wait_ms": stats.get("requests_wait_ms", 0) / requests if requests else 0.0,
+        "errors": stats.get("requests_errors", 0) + stats.get("connections_errors", 0),
+    }
+
+
+def database_stats():
+    """Connection settings and pool statistics for every configured database"""
+    stats = {}
+    for alias in connections:
+        connection = connections[alias]
+        entry = {
+            "vendor": connection.vendor,
+            "conn_max_age": connection.settings_dict.get("CONN_MAX_AGE"),
+            "health_checks": connection.settings_dict.get("CONN_HEALTH_CHECKS"),
+            "pool": None,
+        }
+        if _uses_pool(connection):
+            entry["pool"] = _pool_stats(connection)
+        stats[alias] = entry
+    return stats
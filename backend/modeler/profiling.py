@@ -0,0 +1,176 @@
+"""
+Opt-in profiling of single requests.
+
+With PROFILING_ENABLED, requests by staff users carrying an `X-Profile: 1`
+header run under a profiler: pyinstrument, a sampling profiler, when it is
+installed, cProfile otherwise. Each profiled request leaves two files in
+PROFILING_DIR, named after the request and returned in the X-Profile-Id
+response header:
+
+- <id>.prof (cProfile, for pstats or snakeviz) or <id>.pyisession
+  (pyinstrument, for `pyinstrument --load`)
+- <id>.collapsed, one `frame;frame;frame microseconds` line per stack, the
+  input of flamegraph.pl, speedscope and similar flame graph tools
+
+cProfile only records which function called which, not whole stacks, so
+its collapsed stacks divide each function's time among its callers in
+proportion to the calls they made.
+
+When PROFILING_ENABLED is off the middleware removes itself at startup.
+"""
+import cProfile
+import logging
+import os
+import pstats
+import re
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from . import metrics
+
+try:
+    import pyinstrument
+except ImportError:  # pragma: no cover - optional dependency
+    pyinstrument = None
+
+logger = logging.getLogger(__name__)
+
+HEADER = "HTTP_X_PROFILE"
+# Limits of the stacks rebuilt from cProfile's call graph
+MAX_DEPTH = 64
+MIN_SHARE = 0.0005
+
+
+def _frame_name(function, path, line):
+    return (
+        f"{function} ({os.path.basename(path)}:{line})"
+        if line
+        else f"{function} ({path})"
+    )
+
+
+def collapse_stats(stats):
+    """Collapsed stacks from pstats.Stats, with times in microseconds"""
+    entries = stats.stats
+    callees = defaultdict(list)
+    for function, (_, _, _, _, callers) in entries.items():
+        for caller, (_, _, _, caller_time) in callers.items():
+            callees[caller].append((function, caller_time))
+
+    roots = [function for function, entry in entries.items() if not entry[4]]
+    # Paths below this share of the total are dropped, which bounds the number of stacks
+    threshold = sum(entries[function][3] for function in roots) * MIN_SHARE
+    stacks = defaultdict(float)
+
+    def visit(function, share, path, seen):
+        _, _, own_time, total_time, _ = entries[function]
+        if total_time <= 0 or share < threshold:
+            return
+        path = path + [_frame_name(function[2], function[0], function[1])]
+        seen = seen | {function}
+        fraction = share / total_time
+        stacks[";".join(path)] += own_time * fraction
+        if len(path) >= MAX_DEPTH:
+            return
+        for callee, time_from_caller in callees[function]:
+            if callee not in seen:
+                visit(callee, time_from_caller * fraction, path, seen)
+
+    for function in roots:
+        visit(function, entries[function][3], [], frozenset())
+    return {
+        stack: round(seconds * 1e6)
+        for stack, seconds in stacks.items()
+        if seconds * 1e6 >= 1
+    }
+
+
+def collapse_frame(root):
+    """Collapsed stacks from a pyinstrument frame tree, with times in microseconds"""
+    stacks = defaultdict(float)
+
+    def visit(frame, path):
+        if not frame.is_synthetic:
+            path = path + [
+                _frame_name(frame.function, frame.file_path_short or "", frame.line_no)
+            ]
+        if not frame.children:
+            stacks[";".join(path)] += frame.time
+        for child in frame.children:
+            visit(child, path)
+
+    if root is not None:
+        visit(root, [])
+    return {
+        stack: round(seconds * 1e6)
+        for stack, seconds in stacks.items()
+        if stack and seconds * 1e6 >= 1
+    }
+
+
+def _profile_id(request, elapsed):
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", request.path).strip("-")[:80]
+    started = time.strftime("%Y%m%d-%H%M%S")
+    return f"{started}-{request.method}-{slug}-{elapsed:.0f}ms-{uuid.uuid4().hex[:6]}"
+
+
+def write_collapsed(path, stacks):
+    with open(path, "w") as collapsed:
+        for stack, microseconds in sorted(stacks.items()):
+            collapsed.write(f"{stack} {microseconds}\n")
+
+
+class ProfilingMiddleware:
+    """Profile requests of staff users that ask for it with the X-Profile header"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, "PROFILING_ENABLED", False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.META.get(HEADER) not in ("1", "true") or not getattr(
+            request.user, "is_staff", False
+        ):
+            return self.get_response(request)
+
+        directory = settings.PROFILING_DIR
+        os.makedirs(directory, exist_ok=True)
+        started = time.perf_counter()
+        if pyinstrument is not None:
+            profiler = pyinstrument.Profiler(
+                interval=getattr(settings, "PROFILING_INTERVAL", 0.001)
+            )
+            profiler.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                session = profiler.stop()
+            elapsed = (time.perf_counter() - started) * 1000
+            profile_id = _profile_id(request, elapsed)
+            session.save(os.path.join(directory, f"{profile_id}.pyisession"))
+            stacks = collapse_frame(session.root_frame())
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+            elapsed = (time.perf_counter() - started) * 1000
+            profile_id = _profile_id(request, elapsed)
+            profiler.dump_stats(os.path.join(directory, f"{profile_id}.prof"))
+            stacks = collapse_stats(pstats.Stats(profiler))
+
+        write_collapsed(os.path.join(directory, f"{profile_id}.collapsed"), stacks)
+        metrics.incr("profiling.requests")
+        logger.info(
+            f"Profiled {request.method} {request.path} in {elapsed:.0f}ms "
+            f"as {profile_id}"
+        )
+        response["X-Profile-Id"] = profile_id
+        return response
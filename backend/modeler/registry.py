@@ -0,0 +1,189 @@
+"""
+Cross-model registry of hub business keys.
+
+Every hub with business key (BK) columns has a HubKey row holding a hash of
+its normalized key column names, so the hubs modeling the same entity can
+be found with one index lookup instead of scanning node data. Rows are
+updated incrementally for the hubs touched by a save.
+
+Hubs sharing a key are duplicates; if their key columns differ in data
+type, the definitions conflict.
+"""
+import hashlib
+import re
+
+from django.db.models import Count
+
+from .columns import expand_node_data, has_unknown_refs, load_definitions, marker_name
+from .models import HubKey, Node
+
+BATCH_SIZE = 500
+BUSINESS_KEY_MARKER = "BK"
+
+DUPLICATE = "duplicate"
+CONFLICT = "conflict"
+
+
+def normalize_name(name):
+    """
+    Column names match regardless of case and separators, e.g. CustomerId ==
+    customer_id
+    """
+    name = re.sub(r"([a-z0-9])([A-Z])", r"\1_\2", str(name).strip())
+    return re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_")
+
+
+def _digest(parts):
+    return hashlib.blake2b("|".join(parts).encode(), digest_size=16).hexdigest()
+
+
+def key_hash(names):
+    """Registry key of a business key given by its column names"""
+    return _digest(sorted({normalize_name(name) for name in names}))
+
+
+def key_fields(node_id, data, definitions):
+    """
+    Build the HubKey fields for a hub, or None if it has no business key.
+
+    Global columns are not part of the key.
+    """
+    data = data if isinstance(data, dict) else {}
+    expanded = expand_node_data(data, definitions, {})
+    columns = {}
+    for column in expanded.get("columns", []):
+        if not isinstance(column, dict) or column.get("isGlobal"):
+            continue
+        if BUSINESS_KEY_MARKER in (
+            marker_name(marker) for marker in column.get("markers", [])
+        ):
+            name = normalize_name(column.get("name", ""))
+            if name:
+                columns[name] = re.sub(
+                    r"\s+", "", str(column.get("dataType", ""))
+                ).upper()
+    if not columns:
+        return None
+
+    key_columns = [
+        {"name": name, "dataType": columns[name]} for name in sorted(columns)
+    ]
+    return {
+        "node_id": node_id,
+        "label": str(data.get("label") or "")[:255],
+        "key_hash": _digest([column["name"] for column in key_columns]),
+        "definition_hash": _digest(
+            [f"{column['name']}:{column['dataType']}" for column in key_columns]
+        ),
+        "key_columns": key_columns,
+    }
+
+
+def _entries(data_model, nodes, definitions):
+    entries = []
+    for node in nodes:
+        if node.type != Node.HUB:
+            continue
+        fields = key_fields(node.id, node.data, definitions)
+        if fields is not None:
+            entries.append(HubKey(model=data_model, **fields))
+    return entries
+
+
+def register_hubs(instance, node_changes, definitions=None):
+    """
+    Refresh the registry rows of the nodes created, updated or deleted by a save.
+
+    `definitions` may hold the column definitions referenced by the saved
+    nodes; missing ones are loaded from the dictionary.
+    """
+    if node_changes is None:
+        return
+    upserted = node_changes.upserted
+    touched = [row.id for row in upserted] + list(node_changes.deleted_ids)
+    for start in range(0, len(touched), BATCH_SIZE):
+        HubKey.objects.filter(
+            model=instance, node_id__in=touched[start : start + BATCH_SIZE]
+        ).delete()
+
+    hubs = [row for row in upserted if row.type == Node.HUB]
+    definitions = dict(definitions or {})
+    definitions.update(
+        load_definitions(
+            row.data for row in hubs if has_unknown_refs(row.data, definitions)
+        )
+    )
+    HubKey.objects.bulk_create(
+        _entries(instance, hubs, definitions), batch_size=BATCH_SIZE
+    )
+
+
+def rebuild_registry(models):
+    """Rebuild the registry rows of the given models from their hubs"""
+    total = 0
+    for data_model in models:
+        HubKey.objects.filter(model=data_model).delete()
+        hubs = data_model.nodes.filter(type=Node.HUB).only("id", "type", "data")
+        batch = []
+        for node in hubs.iterator(chunk_size=BATCH_SIZE):
+            batch.append(node)
+            if len(batch) >= BATCH_SIZE:
+                total += _create_entries(data_model, batch)
+                batch = []
+        total += _create_entries(data_model, batch)
+    return total
+
+
+def _create_entries(data_model, nodes):
+    entries = _entries(data_model, nodes, load_definitions(node.data for node in nodes))
+    HubKey.objects.bulk_create(entries)
+    return len(entries)
+
+
+def lookup(names):
+    """Registered hubs whose business key consists of exactly the columns `names`"""
+    return (
+        HubKey.objects.filter(key_hash=key_hash(names))
+        .select_related("model")
+        .order_by("model__name", "label")
+    )
+
+
+def shared_keys():
+    """
+    Business keys used by more than one hub, with the number of hubs, models
+    and distinct definitions, the most widely used first.
+    """
+    return (
+        HubKey.objects.values("key_hash")
+        .annotate(
+            hubs=Count("id"),
+            models=Count("model", distinct=True),
+            definitions=Count("definition_hash", distinct=True),
+        )
+        .filter(hubs__gt=1)
+        .order_by("-models", "-hubs", "key_hash")
+    )
+
+
+def describe_groups(groups):
+    """Attach the registered hubs to a page of shared_keys() rows"""
+    groups = list(groups)
+    entries = {}
+    rows = HubKey.objects.filter(
+        key_hash__in=[group["key_hash"] for group in groups]
+    ).select_related("model")
+    for entry in rows.order_by("model__name", "label"):
+        entries.setdefault(entry.key_hash, []).append(entry)
+    return [
+        dict(
+            group,
+            key=[
+                column["name"] for column in entries[group["key_hash"]][0].key_columns
+            ],
+            status=CONFLICT if group["definitions"] > 1 else DUPLICATE,
+            entries=entries[group["key_hash"]],
+        )
+        for group in groups
+        if group["key_hash"] in entries
+    ]
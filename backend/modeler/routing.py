@@ -0,0 +1,119 @@
+"""
+Read-replica routing.
+
+When a `replica` database is configured and REPLICA_READS_ENABLED is
+set, reads that are marked with
+reading_from() are served by the replica, everything else uses the
+primary. Which reads are marked is decided per request by read_alias():
+
+- Reads of one model use the replica only if it has caught up with the
+  revision the primary reports for that model.
+- Every successful write sets a cookie (READ_YOUR_WRITES_COOKIE) naming the
+  model and the revision it produced. Clients can send the same value in
+  the X-Min-Revision header. Until the replica has that revision, the
+  client's reads go to the primary, so it always sees its own writes.
+
+Without a replica, or with replica reads disabled, all reads use the
+primary.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import DEFAULT_DB_ALIAS
+
+from . import metrics
+from .models import DataModel
+
+REPLICA = "replica"
+READ_YOUR_WRITES_COOKIE = "dvw_last_write"
+MIN_REVISION_HEADER = "HTTP_X_MIN_REVISION"
+
+_read_alias = ContextVar("read_alias", default=None)
+
+
+class ReplicaRouter:
+    """Route marked reads to the replica and all writes to the primary"""
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds a copy of the primary's rows
+        return True
+
+
+@contextmanager
+def reading_from(alias):
+    """Send reads inside the block to `alias`"""
+    token = _read_alias.set(alias)
+    try:
+        yield alias
+    finally:
+        _read_alias.reset(token)
+
+
+def replica_alias():
+    if not getattr(settings, "REPLICA_READS_ENABLED", False):
+        return None
+    return REPLICA if REPLICA in settings.DATABASES else None
+
+
+def parse_revision(value):
+    """(model id, revision) from a "<model id>:<revision>" value, or None"""
+    model_id, _, revision = (value or "").partition(":")
+    try:
+        return model_id, int(revision)
+    except ValueError:
+        return None
+
+
+def caught_up(alias, model_id, revision):
+    try:
+        return (
+            DataModel.objects.using(alias)
+            .filter(pk=model_id, revision__gte=revision)
+            .exists()
+        )
+    except ValidationError:
+        # Not a model id
+        return False
+
+
+def read_alias(request=None, data_model=None):
+    """
+    The database to serve the reads of `request` from: the replica if one is
+    configured and it has the client's last write and, if given, the
+    current revision of `data_model`. Otherwise the primary.
+    """
+    alias = replica_alias()
+    if alias is None:
+        return DEFAULT_DB_ALIAS
+
+    required = [(data_model.pk, data_model.revision)] if data_model is not None else []
+    if request is not None:
+        last_write = parse_revision(
+            request.META.get(MIN_REVISION_HEADER)
+            or request.COOKIES.get(READ_YOUR_WRITES_COOKIE)
+        )
+        if last_write is not None:
+            required.append(last_write)
+    if all(caught_up(alias, model_id, revision) for model_id, revision in required):
+        metrics.incr("replica.reads")
+        return alias
+    metrics.incr("replica.stale_reads")
+    return DEFAULT_DB_ALIAS
+
+
+def remember_write(response, model_id, revision):
+    """Make the client read from the primary until the replica has `revision`"""
+    response.set_cookie(
+        READ_YOUR_WRITES_COOKIE,
+        f"{model_id}:{revision}",
+        max_age=getattr(settings, "REPLICA_STICKY_SECONDS", 300),
+        samesite="Lax",
+    )
@@ -0,0 +1,319 @@
+"""
+Persistence of a model's node and edge graph.
+
+All writes of nodes and edges go through save_model_graph(), which applies
+the incoming graph with bulk operations and bumps the model revision in a
+single transaction.
+"""
+import json
+import logging
+import sqlite3
+import uuid
+from dataclasses import dataclass, field
+
+from django.db import connection, transaction
+from django.db.models import F
+
+from . import metrics
+from .columns import compact_nodes
+from .integrity import PRUNE, REFUSE, DanglingEdges, dangling_edges, write_mode
+from .models import DataModel, Edge, Node
+from .registry import register_hubs
+from .search import index_nodes
+from .stats import update_stats
+from .versioning import record_version
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+
+@dataclass
+class RowChanges:
+    """Rows written by one save of a node or edge collection"""
+
+    created: list = field(default_factory=list)
+    updated: list = field(default_factory=list)
+    deleted_ids: list = field(default_factory=list)
+    # Fields written to the updated rows when only some were saved, None for all
+    fields: tuple = None
+    # Field values of updated and deleted rows before the save, by id
+    previous: dict = field(default_factory=dict)
+
+    @property
+    def upserted(self):
+        return self.created + self.updated
+
+
+def _chunks(items, size=BATCH_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def _node_from_data(instance, node_data):
+    return Node(
+        id=uuid.UUID(str(node_data["id"])),
+        model=instance,
+        type=node_data["type"],
+        x=node_data["x"],
+        y=node_data["y"],
+        data=node_data.get("data", {}),
+    )
+
+
+def _edge_from_data(instance, edge_data):
+    return Edge(
+        id=uuid.UUID(str(edge_data["id"])),
+        model=instance,
+        source=uuid.UUID(str(edge_data["source"])),
+        target=uuid.UUID(str(edge_data["target"])),
+        data=edge_data.get("data", {}),
+    )
+
+
+def _sync_rows(manager, model_class, rows, fields):
+    """
+    Make the rows of a related manager match `rows` exactly.
+
+    Rows whose fields are unchanged are not written. Returns a RowChanges
+    with the created, updated and deleted rows.
+    """
+    incoming = {row.id: row for row in rows}
+    existing = {values["id"]: values for values in manager.values("id", *fields)}
+
+    deleted_ids = [row_id for row_id in existing if row_id not in incoming]
+    for chunk in _chunks(deleted_ids):
+        manager.filter(id__in=chunk).delete()
+
+    to_create = []
+    to_update = []
+    for row_id, row in incoming.items():
+        current = existing.get(row_id)
+        if current is None:
+            to_create.append(row)
+        elif any(getattr(row, name) != current[name] for name in fields):
+            to_update.append(row)
+    if to_update:
+        model_class.objects.bulk_update(to_update, fields, batch_size=BATCH_SIZE)
+    if to_create:
+        model_class.objects.bulk_create(to_create, batch_size=BATCH_SIZE)
+
+    previous = {row_id: existing[row_id] for row_id in deleted_ids}
+    previous.update((row.id, existing[row.id]) for row in to_update)
+    return RowChanges(
+        created=to_create, updated=to_update, deleted_ids=deleted_ids, previous=previous
+    )
+
+
+def _next_revision(instance, fields):
+    """
+    Lock the model row, save `fields` and bump the revision; call inside a
+    transaction
+    """
+    # Lock the model row so concurrent saves of the same model serialize
+    DataModel.objects.select_for_update().filter(pk=instance.pk).exists()
+
+    for attr, value in fields.items():
+        setattr(instance, attr, value)
+    instance.revision = F("revision") + 1
+    instance.save()
+    instance.refresh_from_db(fields=["revision"])
+
+
+def _delete_edges(edge_ids):
+    for chunk in _chunks(edge_ids):
+        Edge.objects.filter(id__in=chunk).delete()
+
+
+def _enforce_edge_integrity(instance, node_changes, edge_changes):
+    """
+    Refuse or prune the dangling edges of a save, per EDGE_INTEGRITY_MODE.
+    Returns the edge changes including pruned edges.
+    """
+    mode = write_mode()
+    if mode not in (REFUSE, PRUNE):
+        return edge_changes
+    # Only removed nodes and written edges can leave edges dangling
+    if not (node_changes is not None and node_changes.deleted_ids) and not (
+        edge_changes is not None and edge_changes.upserted
+    ):
+        return edge_changes
+
+    edge_ids = list(dangling_edges(instance).values_list("id", flat=True))
+    if not edge_ids:
+        return edge_changes
+    if mode == REFUSE:
+        metrics.incr("integrity.refused_saves")
+        raise DanglingEdges(edge_ids)
+
+    _delete_edges(edge_ids)
+    metrics.incr("integrity.pruned_edges", len(edge_ids))
+    edge_changes = edge_changes or RowChanges()
+    pruned = set(edge_ids)
+    created_ids = {edge.id for edge in edge_changes.created}
+    # Edges created by this save never existed for the history
+    edge_changes.created = [
+        edge for edge in edge_changes.created if edge.id not in pruned
+    ]
+    edge_changes.updated = [
+        edge for edge in edge_changes.updated if edge.id not in pruned
+    ]
+    edge_changes.deleted_ids = edge_changes.deleted_ids + [
+        edge_id for edge_id in edge_ids if edge_id not in created_ids
+    ]
+    return edge_changes
+
+
+def save_model_graph(instance, nodes_data=None, edges_data=None, **fields):
+    """
+    Save model fields and replace its nodes and/or edges.
+
+    `nodes_data` and `edges_data` are lists of plain dicts as sent by the
+    client; None leaves the respective collection untouched. Returns the
+    instance with its new revision loaded.
+    """
+    with transaction.atomic():
+        _next_revision(instance, fields)
+
+        node_changes = None
+        if nodes_data is not None:
+            nodes_data, definitions = compact_nodes(nodes_data)
+            nodes = [_node_from_data(instance, node_data) for node_data in nodes_data]
+            node_changes = _sync_rows(
+                instance.nodes, Node, nodes, ["type", "x", "y", "data"]
+            )
+            index_nodes(instance, node_changes, definitions)
+            register_hubs(instance, node_changes, definitions)
+
+        edge_changes = None
+        if edges_data is not None:
+            edges = [_edge_from_data(instance, edge_data) for edge_data in edges_data]
+            edge_changes = _sync_rows(
+                instance.edges, Edge, edges, ["source", "target", "data"]
+            )
+
+        edge_changes = _enforce_edge_integrity(instance, node_changes, edge_changes)
+        update_stats(instance, node_changes, edge_changes)
+        record_version(instance, fields, node_changes, edge_changes)
+
+    logger.info(
+        f"Saved model {instance.id} at revision {instance.revision} "
+        f"(nodes: {nodes_data is not None}, edges: {edges_data is not None})"
+    )
+    return instance
+
+
+def _update_positions(instance, positions):
+    """
+    Write x and y of the nodes in `positions` with a single UPDATE ... FROM
+    and return the ids of the updated nodes.
+    """
+    table = Node._meta.db_table
+    model_id = DataModel._meta.pk.get_db_prep_value(instance.pk, connection)
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                f"UPDATE {table} AS n SET x = v.x, y = v.y "
+                f"FROM unnest(%s::uuid[], %s::float8[], %s::float8[]) AS v(id, x, y) "
+                f"WHERE n.id = v.id AND n.model_id = %s RETURNING n.id",
+                [
+                    [str(node_id) for node_id in positions],
+                    [x for x, _ in positions.values()],
+                    [y for _, y in positions.values()],
+                    model_id,
+                ],
+            )
+        else:
+            # One JSON parameter instead of three per node, SQLite limits the
+            # parameter count
+            rows = json.dumps(
+                [[node_id.hex, x, y] for node_id, (x, y) in positions.items()]
+            )
+            # Materializing the values makes SQLite look up each node by primary key
+            # instead of scanning json_each() for every node of the model
+            cursor.execute(
+                f"WITH v AS MATERIALIZED ("
+                f"SELECT value ->> 0 AS id, value ->> 1 AS x, value ->> 2 AS y "
+                f"FROM json_each(%s)) "
+                f"UPDATE {table} SET x = v.x, y = v.y FROM v "
+                f"WHERE {table}.id = v.id AND {table}.model_id = %s "
+                f"RETURNING {table}.id",
+                [rows, model_id],
+            )
+        return [uuid.UUID(str(row[0])) for row in cursor.fetchall()]
+
+
+def _supports_update_from():
+    if connection.vendor == "postgresql":
+        return True
+    # UPDATE ... FROM needs 3.33, RETURNING 3.35 and the ->> operator 3.38
+    return connection.vendor == "sqlite" and sqlite3.sqlite_version_info >= (3, 38)
+
+
+def save_positions(instance, positions):
+    """
+    Move nodes of `instance` without touching their data.
+
+    `positions` maps node ids to (x, y); ids that are not nodes of the
+    model are ignored. Only the x and y columns are written, in a single
+    statement on PostgreSQL and SQLite, and the moves are recorded as a
+    position-only delta in the history. Returns the number of moved nodes.
+    """
+    positions = {
+        uuid.UUID(str(node_id)): (float(x), float(y))
+        for node_id, (x, y) in positions.items()
+    }
+    with transaction.atomic():
+        _next_revision(instance, {})
+        if _supports_update_from():
+            moved_ids = _update_positions(instance, positions) if positions else []
+        else:
+            existing = set()
+            for chunk in _chunks(positions):
+                existing.update(
+                    instance.nodes.filter(id__in=chunk).values_list("id", flat=True)
+                )
+            moved_ids = [node_id for node_id in positions if node_id in existing]
+            Node.objects.bulk_update(
+                [
+                    Node(id=node_id, x=positions[node_id][0], y=positions[node_id][1])
+                    for node_id in moved_ids
+                ],
+                ["x", "y"],
+                batch_size=BATCH_SIZE,
+            )
+        nodes = [
+            Node(id=node_id, x=positions[node_id][0], y=positions[node_id][1])
+            for node_id in moved_ids
+        ]
+        record_version(instance, {}, RowChanges(updated=nodes, fields=("x", "y")), None)
+
+    logger.info(
+        f"Moved {len(nodes)} nodes of model {instance.id} "
+        f"at revision {instance.revision}"
+    )
+    return len(nodes)
+
+
+def prune_dangling_edges(instance, limit=None):
+    """
+    Delete up to `limit` dangling edges of `instance` as a new revision and
+    return their ids. Nothing is written if the model has none.
+    """
+    if not dangling_edges(instance).exists():
+        return []
+    with transaction.atomic():
+        _next_revision(instance, {})
+        edge_ids = dangling_edges(instance).values_list("id", flat=True)
+        edge_ids = list(edge_ids[:limit] if limit else edge_ids)
+        _delete_edges(edge_ids)
+        edge_changes = RowChanges(deleted_ids=edge_ids)
+        update_stats(instance, None, edge_changes)
+        record_version(instance, {}, None, edge_changes)
+
+    logger.info(
+        f"Pruned {len(edge_ids)} dangling edges of model {instance.id} "
+        f"at revision {instance.revision}"
+    )
+    return edge_ids
@@ -0,0 +1,224 @@
+"""
+Cross-model search over node labels, column names, data types and markers.
+
+Each node has one SearchEntry whose `document` is indexed by the database:
+an FTS5 table kept in sync by triggers on SQLite, a trigram GIN index on
+PostgreSQL. Entries are updated incrementally for the nodes touched by a
+save.
+"""
+import re
+
+from django.db import connections, router
+from django.db.models.expressions import RawSQL
+
+from .columns import expand_node_data, has_unknown_refs, load_definitions, marker_name
+from .models import SearchEntry
+
+BATCH_SIZE = 500
+
+
+def entry_fields(node_id, node_type, data, definitions):
+    """
+    Build the SearchEntry fields for a node.
+
+    Global columns are left out since every node carries them.
+    """
+    data = data if isinstance(data, dict) else {}
+    expanded = expand_node_data(data, definitions, {})
+    columns = [
+        {
+            "name": column.get("name", ""),
+            "dataType": column.get("dataType", ""),
+            "markers": [marker_name(marker) for marker in column.get("markers", [])],
+        }
+        for column in expanded.get("columns", [])
+        if isinstance(column, dict) and not column.get("isGlobal")
+    ]
+    label = str(data.get("label") or "")
+    words = [label, node_type]
+    for column in columns:
+        words.extend([column["name"], column["dataType"], *column["markers"]])
+    return {
+        "node_id": node_id,
+        "node_type": node_type,
+        "label": label[:255],
+        "columns": columns,
+        "document": " ".join(word for word in words if word).lower(),
+    }
+
+
+def index_nodes(instance, node_changes, definitions=None):
+    """
+    Refresh the entries of the nodes created, updated or deleted by a save.
+
+    `definitions` may hold the column definitions referenced by the saved
+    nodes; missing ones are loaded from the dictionary.
+    """
+    if node_changes is None:
+        return
+    upserted = node_changes.upserted
+    touched = [row.id for row in upserted] + list(node_changes.deleted_ids)
+    for start in range(0, len(touched), BATCH_SIZE):
+        SearchEntry.objects.filter(
+            model=instance, node_id__in=touched[start : start + BATCH_SIZE]
+        ).delete()
+
+    definitions = dict(definitions or {})
+    definitions.update(
+        load_definitions(
+            row.data for row in upserted if has_unknown_refs(row.data, definitions)
+        )
+    )
+    SearchEntry.objects.bulk_create(
+        [
+            SearchEntry(
+                model=instance, **entry_fields(row.id, row.type, row.data, definitions)
+            )
+            for row in upserted
+        ],
+        batch_size=BATCH_SIZE,
+    )
+
+
+def _terms(query):
+    return re.findall(r"\w+", query.lower())
+
+
+def _match_expression(terms):
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def _connection():
+    # Searches may be routed to a read replica (see modeler/routing.py)
+    return connections[router.db_for_read(SearchEntry)]
+
+
+class RankedResults:
+    """
+    Lazily evaluated search hits, best match first.
+
+    Supports count() and slicing so it can be handed to a paginator; each
+    page costs one ranked query plus one fetch of the entries.
+    """
+
+    def __init__(self, query):
+        self.query = query
+        self.terms = _terms(query)
+
+    def _queryset(self):
+        queryset = SearchEntry.objects.select_related("model")
+        for term in self.terms:
+            queryset = queryset.filter(document__contains=term)
+        if _connection().vendor == "postgresql":
+            from django.contrib.postgres.search import TrigramWordSimilarity
+
+            return queryset.annotate(
+                rank=TrigramWordSimilarity(self.query.lower(), "document")
+            ).order_by("-rank", "label")
+        return queryset.order_by("label")
+
+    def count(self):
+        if not self.terms:
+            return 0
+        connection = _connection()
+        if connection.vendor == "sqlite":
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT COUNT(*) FROM modeler_searchentry_fts "
+                    "WHERE modeler_searchentry_fts MATCH %s",
+                    [_match_expression(self.terms)],
+                )
+                return cursor.fetchone()[0]
+        return self._queryset().count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            raise TypeError("RankedResults only supports slicing")
+        if not self.terms:
+            return []
+        connection = _connection()
+        if connection.vendor != "sqlite":
+            return list(self._queryset()[key])
+
+        offset = key.start or 0
+        limit = -1 if key.stop is None else key.stop - offset
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT rowid, rank FROM modeler_searchentry_fts "
+                "WHERE modeler_searchentry_fts MATCH %s "
+                "ORDER BY rank LIMIT %s OFFSET %s",
+                [_match_expression(self.terms), limit, offset],
+            )
+            hits = cursor.fetchall()
+        entries = SearchEntry.objects.select_related("model").in_bulk(
+            [row_id for row_id, _ in hits]
+        )
+        results = []
+        for row_id, rank in hits:
+            if row_id in entries:
+                # bm25() is lower for better matches
+                entries[row_id].rank = -rank
+                results.append(entries[row_id])
+        return results
+
+
+def search(query):
+    """Search all models for nodes matching every word of `query`"""
+    return RankedResults(query)
+
+
+def matching_entries(query):
+    """
+    Unranked queryset of the entries matching every word of `query`, for
+    filtering other querysets; the match is answered by the index.
+    """
+    terms = _terms(query)
+    if not terms:
+        return SearchEntry.objects.none()
+    if _connection().vendor == "sqlite":
+        return SearchEntry.objects.filter(
+            pk__in=RawSQL(
+                "SELECT rowid FROM modeler_searchentry_fts "
+                "WHERE modeler_searchentry_fts MATCH %s",
+                [_match_expression(terms)],
+            )
+        )
+    queryset = SearchEntry.objects.all()
+    for term in terms:
+        queryset = queryset.filter(document__contains=term)
+    return queryset
+
+
+def rebuild_index(models):
+    """Rebuild the entries of the given models from their nodes"""
+    total = 0
+    for data_model in models:
+        SearchEntry.objects.filter(model=data_model).delete()
+        batch = []
+        nodes = data_model.nodes.only("id", "type", "data").iterator(
+            chunk_size=BATCH_SIZE
+        )
+        for node in nodes:
+            batch.append(node)
+            if len(batch) >= BATCH_SIZE:
+                total += _create_entries(data_model, batch)
+                batch = []
+        total += _create_entries(data_model, batch)
+    return total
+
+
+def _create_entries(data_model, nodes):
+    definitions = load_definitions(node.data for node in nodes)
+    SearchEntry.objects.bulk_create(
+        [
+            SearchEntry(
+                model=data_model,
+                **entry_fields(node.id, node.type, node.data, definitions),
+            )
+            for node in nodes
+        ]
+    )
+    return len(nodes)
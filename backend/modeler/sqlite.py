@@ -0,0 +1,72 @@
+"""
+Maintenance of SQLite databases running the performance profile.
+
+With WAL journaling (SQLITE_PRAGMAS) commits are appended to a write-ahead
+log which readers consult alongside the database file. SQLite copies the
+log back into the database (a checkpoint) once it reaches 1000 pages, but
+only as far as no reader still needs it, so under steady read load the log
+keeps growing. checkpoint() forces one; optimize() refreshes the planner
+statistics SQLite uses to choose indexes. Both are run periodically by
+`manage.py sqlite_maintenance`.
+"""
+from django.db import DEFAULT_DB_ALIAS, connections
+
+CHECKPOINT_MODES = ["PASSIVE", "FULL", "RESTART", "TRUNCATE"]
+REPORTED_PRAGMAS = [
+    "journal_mode",
+    "synchronous",
+    "mmap_size",
+    "cache_size",
+    "busy_timeout",
+    "page_count",
+    "page_size",
+]
+
+# Rows sampled per index by ANALYZE, which keeps optimize() fast on large tables
+ANALYSIS_LIMIT = 400
+
+
+def is_sqlite(alias=DEFAULT_DB_ALIAS):
+    return connections[alias].vendor == "sqlite"
+
+
+def pragmas(alias=DEFAULT_DB_ALIAS):
+    """
+    Current values of the pragmas set by the performance profile, plus the
+    database size
+    """
+    values = {}
+    with connections[alias].cursor() as cursor:
+        for name in REPORTED_PRAGMAS:
+            cursor.execute(f"PRAGMA {name}")
+            # Some pragmas return no row, e.g. mmap_size on in-memory databases
+            row = cursor.fetchone()
+            values[name] = row[0] if row else None
+    return values
+
+
+def checkpoint(alias=DEFAULT_DB_ALIAS, mode="TRUNCATE"):
+    """
+    Copy the write-ahead log into the database file. TRUNCATE and RESTART
+    wait for writers and reset the log, PASSIVE copies what it can without
+    waiting. Returns whether the checkpoint was blocked and the log and
+    checkpointed sizes in pages (-1 when the database is not in WAL mode).
+    """
+    if mode not in CHECKPOINT_MODES:
+        raise ValueError(f"Unknown checkpoint mode '{mode}'")
+    with connections[alias].cursor() as cursor:
+        cursor.execute(f"PRAGMA wal_checkpoint({mode})")
+        busy, log_pages, checkpointed_pages = cursor.fetchone()
+    return {
+        "busy": bool(busy),
+        "log_pages": log_pages,
+        "checkpointed_pages": checkpointed_pages,
+    }
+
+
+def optimize(alias=DEFAULT_DB_ALIAS):
+    """Analyze the tables whose statistics are missing or outdated"""
+    with connections[alias].cursor() as cursor:
+        cursor.execute(f"PRAGMA analysis_limit={ANALYSIS_LIMIT}")
+        # 0x10000 also checks tables this connection has not queried (SQLite 3.46+)
+        cursor.execute("PRAGMA optimize=0x10002")
@@ -0,0 +1,155 @@
+"""
+Per-model statistics for dashboards.
+
+Every model has a ModelStats row with its node counts per type, number of
+columns (global columns excluded) and edges, satellites per hub, link
+arity and number of orphan hubs, so dashboards never load graphs. Saves
+keep the row up to date in their own transaction:
+
+- Node, column and edge counts are adjusted by the rows a save created,
+  updated and deleted, without reading the rest of the model.
+- Satellites per hub, link arity and orphan hubs depend on what the edges
+  connect. Saves that change edges or node types recount them from the
+  node types and edge endpoints of the model, two queries reading only
+  ids; saves that only edit node data or move nodes skip this.
+
+Writes that copy rows with SQL recompute the row of the models they
+change. `manage.py recompute_stats` rebuilds the rows of all models, in
+chunks, for example to backfill models saved before statistics existed.
+"""
+from collections import Counter
+
+from django.db.models import Count
+
+from .columns import COLUMNS_KEY, GLOBAL_PREFIX, REFS_KEY
+from .models import ModelStats, Node
+
+BATCH_SIZE = 2000
+
+
+def column_count(data):
+    """Number of columns of node data, compacted or not, without global columns"""
+    if not isinstance(data, dict):
+        return 0
+    if REFS_KEY in data:
+        return sum(1 for ref in data[REFS_KEY] if not ref.startswith(GLOBAL_PREFIX))
+    columns = data.get(COLUMNS_KEY)
+    if not isinstance(columns, list):
+        return 0
+    return sum(
+        1
+        for column in columns
+        if not (isinstance(column, dict) and column.get("isGlobal"))
+    )
+
+
+def _histogram(counts):
+    return {str(count): number for count, number in sorted(Counter(counts).items())}
+
+
+def _graph_stats(data_model):
+    """
+    satellites_per_hub, link_arity and orphan_hubs of `data_model`, from ids
+    and types only
+    """
+    types = dict(
+        data_model.nodes.values_list("id", "type").iterator(chunk_size=BATCH_SIZE)
+    )
+    satellites = {
+        node_id: set() for node_id, node_type in types.items() if node_type == Node.HUB
+    }
+    link_hubs = {
+        node_id: set() for node_id, node_type in types.items() if node_type == Node.LINK
+    }
+    connected = set()
+    for source, target in data_model.edges.values_list("source", "target").iterator(
+        chunk_size=BATCH_SIZE
+    ):
+        ends = {types.get(source): source, types.get(target): target}
+        if None in ends:
+            # Dangling edges connect nothing
+            continue
+        connected.update((source, target))
+        if Node.HUB in ends and Node.SAT in ends:
+            satellites[ends[Node.HUB]].add(ends[Node.SAT])
+        elif Node.HUB in ends and Node.LINK in ends:
+            link_hubs[ends[Node.LINK]].add(ends[Node.HUB])
+    return {
+        "satellites_per_hub": _histogram(len(ids) for ids in satellites.values()),
+        "link_arity": _histogram(len(ids) for ids in link_hubs.values()),
+        "orphan_hubs": sum(1 for hub_id in satellites if hub_id not in connected),
+    }
+
+
+def recompute_stats(data_model):
+    """Rebuild the statistics of `data_model` from its rows"""
+    node_counts = dict(
+        data_model.nodes.order_by().values_list("type").annotate(count=Count("id"))
+    )
+    columns = sum(
+        column_count(data)
+        for data in data_model.nodes.values_list("data", flat=True).iterator(
+            chunk_size=BATCH_SIZE
+        )
+    )
+    stats, _ = ModelStats.objects.update_or_create(
+        model=data_model,
+        defaults={
+            "node_counts": node_counts,
+            "column_count": columns,
+            "edge_count": data_model.edges.count(),
+            **_graph_stats(data_model),
+        },
+    )
+    return stats
+
+
+def _changes_graph(node_changes, edge_changes):
+    if edge_changes is not None and (
+        edge_changes.created or edge_changes.deleted_ids or edge_changes.updated
+    ):
+        return True
+    if node_changes is None:
+        return False
+    return bool(node_changes.created or node_changes.deleted_ids) or any(
+        node.type != node_changes.previous[node.id]["type"]
+        for node in node_changes.updated
+    )
+
+
+def update_stats(data_model, node_changes, edge_changes):
+    """
+    Apply the row changes of a save to the statistics of `data_model`; call
+    in the save's transaction. Models without statistics get them computed.
+    """
+    stats = ModelStats.objects.filter(model=data_model).first()
+    if stats is None:
+        return recompute_stats(data_model)
+
+    if node_changes is not None:
+        node_counts = Counter(stats.node_counts)
+        columns = stats.column_count
+        for node in node_changes.upserted:
+            node_counts[node.type] += 1
+            columns += column_count(node.data)
+        for previous in node_changes.previous.values():
+            node_counts[previous["type"]] -= 1
+            columns -= column_count(previous["data"])
+        stats.node_counts = {
+            node_type: count
+            for node_type, count in sorted(node_counts.items())
+            if count > 0
+        }
+        stats.column_count = max(0, columns)
+    if edge_changes is not None:
+        stats.edge_count = max(
+            0,
+            stats.edge_count
+            + len(edge_changes.created)
+            - len(edge_changes.deleted_ids),
+        )
+    if _changes_graph(node_changes, edge_changes):
+        for name, value in _graph_stats(data_model).items():
+            setattr(stats, name, value)
+    stats.save()
+    return stats
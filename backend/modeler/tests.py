@@ -1,27 +1,62 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+import uuid
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from rest_framework.test import APITestCase
+from django.utils import timezone
 from rest_framework import status
-from .models import DataModel, Node, Edge
-import json
+from rest_framework.test import APITestCase
+
+from . import integrity, jobs, layout, metrics, profiling, routing, sqlite
+from . import stats as stats_module
+from . import thumbnails, validation, versioning, wire
+from .admission import AdaptiveLimit, AdmissionController, Overloaded
+from .api import ModelStatsSerializer
+from .benchmarking import synthetic_graph
+from .coalescing import WriteBehindBuffer, _Batch, merge_payloads
+from .models import (
+    ColumnDefinition,
+    DataModel,
+    Edge,
+    Job,
+    ModelStats,
+    ModelVersion,
+    Node,
+    Settings,
+    Thumbnail,
+)
+from .saving import save_model_graph
 
 
 class DataModelTestCase(TestCase):
     def setUp(self):
         self.model = DataModel.objects.create(name="Test Model")
         self.hub_node = Node.objects.create(
-            model=self.model,
-            type="HUB",
-            x=100.0,
-            y=100.0,
-            data={"label": "Test Hub"}
+            model=self.model, type="HUB", x=100.0, y=100.0, data={"label": "Test Hub"}
         )
         self.satellite_node = Node.objects.create(
             model=self.model,
             type="SAT",
             x=200.0,
             y=200.0,
-            data={"label": "Test Satellite"}
+            data={"label": "Test Satellite"},
         )
 
     def test_model_creation(self):
@@ -42,7 +77,7 @@ class DataModelTestCase(TestCase):
             model=self.model,
             source=str(self.hub_node.id),
             target=str(self.satellite_node.id),
-            data={"label": "Test Edge"}
+            data={"label": "Test Edge"},
         )
         self.assertEqual(edge.source, str(self.hub_node.id))
         self.assertEqual(edge.target, str(self.satellite_node.id))
@@ -52,11 +87,7 @@ class DataModelAPITestCase(APITestCase):
     def setUp(self):
         self.model = DataModel.objects.create(name="Test Model")
         self.hub_node = Node.objects.create(
-            model=self.model,
-            type="HUB",
-            x=100.0,
-            y=100.0,
-            data={"label": "Test Hub"}
+            model=self.model, type="HUB", x=100.0, y=100.0, data={"label": "Test Hub"}
         )
 
     def test_get_models(self):
@@ -99,3 +130,2176 @@ class DataModelAPITestCase(APITestCase):
         response = self.client.delete(url)
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertEqual(DataModel.objects.count(), 0)
+
+
+class SaveModelGraphTestCase(APITestCase):
+    def setUp(self):
+        self.model = DataModel.objects.create(name="Save Model")
+        self.hub_id = str(uuid.uuid4())
+        self.sat_id = str(uuid.uuid4())
+        self.nodes = [
+            {
+                "id": self.hub_id,
+                "type": "HUB",
+                "x": 0,
+                "y": 0,
+                "data": {"label": "Hub"},
+            },
+            {
+                "id": self.sat_id,
+                "type": "SAT",
+                "x": 10,
+                "y": 10,
+                "data": {"label": "Sat"},
+            },
+        ]
+        self.edges = [
+            {
+                "id": str(uuid.uuid4()),
+                "source": self.hub_id,
+                "target": self.sat_id,
+                "data": {},
+            },
+        ]
+
+    def test_update_replaces_graph_and_bumps_revision(self):
+        """Test PUT /api/models/{id}/ syncs nodes and edges in bulk"""
+        url = reverse("datamodel-detail", kwargs={"pk": self.model.id})
+        data = {"name": "Save Model", "nodes": self.nodes, "edges": self.edges}
+        response = self.client.put(url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["revision"], 1)
+
+        data["nodes"] = self.nodes[:1]
+        data["nodes"][0]["x"] = 42
+        response = self.client.put(url, data, format="json")
+        self.assertEqual(response.data["revision"], 2)
+        self.assertEqual(self.model.nodes.count(), 1)
+        self.assertEqual(self.model.nodes.get().x, 42)
+
+    def test_merge_payloads_last_writer_wins(self):
+        """Test that coalesced saves merge per node, keeping the latest values"""
+        first = {"name": "A", "nodes": self.nodes}
+        moved = dict(self.nodes[1], x=99)
+        second = {"nodes": [moved]}
+        merged = merge_payloads([first, second])
+        self.assertEqual(merged["name"], "A")
+        self.assertEqual(merged["nodes"], [moved])
+        self.assertNotIn("edges", merged)
+
+    @override_settings(WRITE_BEHIND_ENABLED=True, WRITE_BEHIND_WINDOW_MS=0)
+    def test_write_behind_flush_is_instrumented(self):
+        """Test that a buffered save is flushed and recorded in metrics"""
+        metrics.reset()
+        url = reverse("datamodel-detail", kwargs={"pk": self.model.id})
+        data = {"name": "Buffered", "nodes": self.nodes, "edges": self.edges}
+        response = self.client.put(url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["revision"], 1)
+        snapshot = self.client.get(reverse("metrics-list")).data
+        self.assertEqual(snapshot["counters"]["write_buffer.flushes"], 1)
+        self.assertIn("write_buffer.flush_latency", snapshot["timings"])
+
+    def test_write_behind_followers_give_up_on_stalled_flush(self):
+        """
+        Test that saves merged into a batch whose flush never finishes are
+        refused instead of hanging
+        """
+        buffer = WriteBehindBuffer(window=0, flush_timeout=0.01)
+        # A leader that died before flushing its batch
+        buffer._pending[self.model.pk] = _Batch()
+        with self.assertRaises(Overloaded):
+            buffer.submit(self.model, {"nodes": self.nodes})
+        self.assertNotIn(self.model.pk, buffer._pending)
+        self.assertEqual(buffer.submit(self.model, {"nodes": self.nodes}).revision, 1)
+
+
+@override_settings(VERSION_SNAPSHOT_INTERVAL=3)
+class ModelVersionTestCase(APITestCase):
+    def setUp(self):
+        versioning.clear_cache()
+        self.model = DataModel.objects.create(name="Versioned")
+        self.url = reverse("datamodel-detail", kwargs={"pk": self.model.id})
+        self.node_id = str(uuid.uuid4())
+
+    def save(self, x, name="Versioned"):
+        node = {
+            "id": self.node_id,
+            "type": "HUB",
+            "x": x,
+            "y": 0,
+            "data": {"label": "Hub"},
+        }
+        return self.client.put(
+            self.url, {"name": name, "nodes": [node], "edges": []}, format="json"
+        )
+
+    def test_history_stores_snapshots_and_deltas(self):
+        """Test that only every Nth revision is a full snapshot"""
+        for x in range(5):
+            self.save(x)
+        versions = self.client.get(
+            reverse("datamodel-versions", kwargs={"pk": self.model.id})
+        ).data
+        self.assertEqual([v["revision"] for v in versions], [5, 4, 3, 2, 1])
+        self.assertEqual(
+            [v["is_snapshot"] for v in versions], [False, True, False, False, True]
+        )
+
+    def test_rebuild_and_rollback(self):
+        """Test rebuilding a revision from deltas and restoring it"""
+        for x in range(5):
+            self.save(x, name=f"Name {x}")
+        state = versioning.rebuild_version(self.model.id, 3)
+        self.assertEqual(state["name"], "Name 2")
+        self.assertEqual(state["nodes"][0]["x"], 2)
+
+        url = reverse("datamodel-rollback", kwargs={"pk": self.model.id})
+        response = self.client.post(url, {"revision": 2}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["revision"], 6)
+        self.assertEqual(response.data["nodes"][0]["x"], 1)
+
+    def test_compaction_keeps_recent_revisions_rebuildable(self):
+        """Test that compaction drops old versions but keeps newer ones intact"""
+        for x in range(5):
+            self.save(x)
+        deleted = versioning.compact_history(self.model, keep=2)
+        self.assertEqual(deleted, 3)
+        versioning.clear_cache()
+        self.assertEqual(
+            versioning.rebuild_version(self.model.id, 5)["nodes"][0]["x"], 4
+        )
+        with self.assertRaises(ModelVersion.DoesNotExist):
+            versioning.rebuild_version(self.model.id, 2)
+
+
+class ColumnDictionaryTestCase(APITestCase):
+    def setUp(self):
+        self.model = DataModel.objects.create(name="Columns")
+        self.url = reverse("datamodel-detail", kwargs={"pk": self.model.id})
+        self.business_key = {
+            "id": "bk",
+            "name": "customer_id",
+            "dataType": "VARCHAR(50)",
+            "markers": ["BK"],
+        }
+        self.record_source = dict(
+            Settings.get_default_global_columns()[0], isGlobal=True
+        )
+
+    def node(self, label):
+        columns = [self.record_source, self.business_key]
+        return {
+            "id": str(uuid.uuid4()),
+            "type": "HUB",
+            "x": 0,
+            "y": 0,
+            "data": {"label": label, "columns": columns},
+        }
+
+    def test_columns_are_stored_once_and_expanded(self):
+        """Test that identical columns share one dictionary entry"""
+        data = {
+            "name": "Columns",
+            "nodes": [self.node("A"), self.node("B")],
+            "edges": [],
+        }
+        response = self.client.put(self.url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(ColumnDefinition.objects.count(), 1)
+
+        stored = self.model.nodes.first().data
+        self.assertNotIn("columns", stored)
+        self.assertEqual(stored["columnRefs"][0], "global:record_source")
+
+        columns = response.data["nodes"][0]["data"]["columns"]
+        self.assertEqual(
+            [column["name"] for column in columns], ["record_source", "customer_id"]
+        )
+
+    def test_global_columns_follow_settings(self):
+        """Test that global columns are expanded from the current settings"""
+        self.client.put(
+            self.url, {"name": "Columns", "nodes": [self.node("A")]}, format="json"
+        )
+        settings = Settings.get_instance()
+        settings.global_columns[0]["dataType"] = "VARCHAR(255)"
+        settings.save()
+
+        response = self.client.get(self.url)
+        self.assertEqual(
+            response.data["nodes"][0]["data"]["columns"][0]["dataType"], "VARCHAR(255)"
+        )
+
+
+class SearchTestCase(APITestCase):
+    def setUp(self):
+        self.url = reverse("search-list")
+        self.customer = DataModel.objects.create(name="Customers")
+        self.orders = DataModel.objects.create(name="Orders")
+        self.hub_id = str(uuid.uuid4())
+        email = {
+            "id": "email",
+            "name": "email_hash",
+            "dataType": "BINARY(20)",
+            "markers": ["HK"],
+        }
+        self.client.put(
+            reverse("datamodel-detail", kwargs={"pk": self.customer.id}),
+            {
+                "name": "Customers",
+                "nodes": [
+                    {
+                        "id": self.hub_id,
+                        "type": "HUB",
+                        "x": 0,
+                        "y": 0,
+                        "data": {"label": "Customer Hub", "columns": [email]},
+                    },
+                ],
+            },
+            format="json",
+        )
+        self.client.put(
+            reverse("datamodel-detail", kwargs={"pk": self.orders.id}),
+            {
+                "name": "Orders",
+                "nodes": [
+                    {
+                        "id": str(uuid.uuid4()),
+                        "type": "HUB",
+                        "x": 0,
+                        "y": 0,
+                        "data": {"label": "Order Hub"},
+                    },
+                ],
+            },
+            format="json",
+        )
+
+    def test_search_finds_columns_across_models(self):
+        """Test GET /api/search/?q= matches column names and labels"""
+        response = self.client.get(self.url, {"q": "customer email_hash"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 1)
+        result = response.data["results"][0]
+        self.assertEqual(result["model_name"], "Customers")
+        self.assertEqual(result["columns"][0]["name"], "email_hash")
+
+        response = self.client.get(self.url, {"q": "hub", "page_size": 1})
+        self.assertEqual(response.data["count"], 2)
+        self.assertEqual(len(response.data["results"]), 1)
+
+    def test_index_follows_saves(self):
+        """Test that renamed and deleted nodes are reindexed"""
+        url = reverse("datamodel-detail", kwargs={"pk": self.customer.id})
+        node = {
+            "id": self.hub_id,
+            "type": "HUB",
+            "x": 0,
+            "y": 0,
+            "data": {"label": "Client Hub"},
+        }
+        self.client.put(url, {"name": "Customers", "nodes": [node]}, format="json")
+        self.assertEqual(self.client.get(self.url, {"q": "customer"}).data["count"], 0)
+        self.assertEqual(self.client.get(self.url, {"q": "client"}).data["count"], 1)
+
+        self.client.put(url, {"name": "Customers", "nodes": []}, format="json")
+        self.assertEqual(self.client.get(self.url, {"q": "client"}).data["count"], 0)
+
+
+class CompressionTestCase(APITestCase):
+    def setUp(self):
+        caches["responses"].clear()
+        metrics.reset()
+        self.model = DataModel.objects.create(name="Compressed")
+        self.url = reverse("datamodel-detail", kwargs={"pk": self.model.id})
+        nodes = [
+            {
+                "id": str(uuid.uuid4()),
+                "type": "HUB",
+                "x": i,
+                "y": i,
+                "data": {"label": f"Hub {i}"},
+            }
+            for i in range(50)
+        ]
+        self.client.put(self.url, {"name": "Compressed", "nodes": nodes}, format="json")
+
+    def test_retrieve_is_compressed_once_per_revision(self):
+        """
+        Test that a model body is compressed on the first request and then
+        served from the cache
+        """
+        for _ in range(2):
+            response = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip")
+            self.assertEqual(response["Content-Encoding"], "gzip")
+            body = json.loads(gzip.decompress(response.content))
+            self.assertEqual(len(body["nodes"]), 50)
+        counters = metrics.snapshot()["counters"]
+        self.assertEqual(counters["response_cache.misses"], 1)
+        self.assertEqual(counters["response_cache.hits"], 1)
+
+        self.client.put(self.url, {"name": "Renamed"}, format="json")
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(
+            json.loads(gzip.decompress(response.content))["name"], "Renamed"
+        )
+
+    def test_middleware_compresses_large_responses(self):
+        """Test that other API responses are compressed when accepted"""
+        response = self.client.get(
+            reverse("datamodel-list"), HTTP_ACCEPT_ENCODING="gzip;q=1.0, identity"
+        )
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        response = self.client.get(reverse("datamodel-list"))
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_middleware_leaves_html_pages_alone(self):
+        """Test that HTML pages, which carry CSRF tokens, are not compressed"""
+        self.client.force_login(
+            User.objects.create_superuser("admin", "admin@example.com", "secret")
+        )
+        response = self.client.get(
+            reverse("admin:modeler_datamodel_changelist"), HTTP_ACCEPT_ENCODING="gzip"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(len(response.content), 1024)
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+
+class DatabaseStatsTestCase(APITestCase):
+    def test_metrics_include_database_stats(self):
+        """Test that GET /api/metrics/ reports connection settings per database"""
+        response = self.client.get(reverse("metrics-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        default = response.data["databases"]["default"]
+        self.assertIn("conn_max_age", default)
+        self.assertIsNone(default["pool"])
+
+
+class DuplicateModelTestCase(APITestCase):
+    def setUp(self):
+        self.model = DataModel.objects.create(name="Original")
+        self.hub_id = str(uuid.uuid4())
+        self.sat_id = str(uuid.uuid4())
+        nodes = [
+            {
+                "id": self.hub_id,
+                "type": "HUB",
+                "x": 1,
+                "y": 2,
+                "data": {"label": "Customer"},
+            },
+            {
+                "id": self.sat_id,
+                "type": "SAT",
+                "x": 3,
+                "y": 4,
+                "data": {"label": "Details"},
+            },
+        ]
+        edges = [
+            {
+                "id": str(uuid.uuid4()),
+                "source": self.hub_id,
+                "target": self.sat_id,
+                "data": {},
+            }
+        ]
+        self.client.put(
+            reverse("datamodel-detail", kwargs={"pk": self.model.id}),
+            {"name": "Original", "nodes": nodes, "edges": edges},
+            format="json",
+        )
+
+    def test_duplicate_remaps_ids_in_constant_queries(self):
+        """Test POST /api/models/{id}/duplicate/ copies nodes and edges with new ids"""
+        url = reverse("datamodel-duplicate", kwargs={"pk": self.model.id})
+        with self.assertNumQueries(9):
+            response = self.client.post(url, {}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["name"], "Original (Copy)")
+
+        copy = DataModel.objects.get(pk=response.data["id"])
+        node_ids = {str(node_id) for node_id in copy.nodes.values_list("id", flat=True)}
+        self.assertEqual(len(node_ids), 2)
+        self.assertFalse(node_ids & {self.hub_id, self.sat_id})
+        edge = copy.edges.get()
+        self.assertEqual({str(edge.source), str(edge.target)}, node_ids)
+        self.assertEqual(self.model.nodes.count(), 2)
+        self.assertEqual(copy.stats.node_counts, {"HUB": 1, "SAT": 1})
+
+        results = self.client.get(reverse("search-list"), {"q": "customer"}).data[
+            "results"
+        ]
+        self.assertEqual(
+            {result["model_name"] for result in results},
+            {"Original", "Original (Copy)"},
+        )
+
+
+class SubgraphTransferTestCase(APITestCase):
+    def setUp(self):
+        self.source = DataModel.objects.create(name="Source")
+        self.target = DataModel.objects.create(name="Target")
+        self.hub_id, self.sat_id, self.other_id = (str(uuid.uuid4()) for _ in range(3))
+        nodes = [
+            {
+                "id": self.hub_id,
+                "type": "HUB",
+                "x": 0,
+                "y": 0,
+                "data": {"label": "Customer"},
+            },
+            {
+                "id": self.sat_id,
+                "type": "SAT",
+                "x": 0,
+                "y": 100,
+                "data": {"label": "Details"},
+            },
+            {
+                "id": self.other_id,
+                "type": "HUB",
+                "x": 300,
+                "y": 0,
+                "data": {"label": "Order"},
+            },
+        ]
+        edges = [
+            {
+                "id": str(uuid.uuid4()),
+                "source": self.hub_id,
+                "target": self.sat_id,
+                "data": {},
+            },
+            {
+                "id": str(uuid.uuid4()),
+                "source": self.hub_id,
+                "target": self.other_id,
+                "data": {},
+            },
+        ]
+        self.client.put(
+            reverse("datamodel-detail", kwargs={"pk": self.source.id}),
+            {"name": "Source", "nodes": nodes, "edges": edges},
+            format="json",
+        )
+        existing = {
+            "id": str(uuid.uuid4()),
+            "type": "HUB",
+            "x": 480,
+            "y": 32,
+            "data": {"label": "Existing"},
+        }
+        self.client.put(
+            reverse("datamodel-detail", kwargs={"pk": self.target.id}),
+            {"name": "Target", "nodes": [existing]},
+            format="json",
+        )
+        self.url = reverse("datamodel-subgraph", kwargs={"pk": self.source.id})
+
+    def test_copy_with_satellites(self):
+        """Test copying a hub with its satellites next to the target's nodes"""
+        data = {
+            "target": str(self.target.id),
+            "node_ids": [self.hub_id],
+            "include_satellites": True,
+        }
+        response = self.client.post(self.url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data["nodes"], response.data["edges"]), (2, 1))
+        self.assertEqual(response.data["offset"], {"x": 688, "y": 32})
+
+        new_hub = self.target.nodes.get(id=response.data["node_ids"][self.hub_id])
+        self.assertEqual((new_hub.x, new_hub.y), (688, 32))
+        edge = self.target.edges.get()
+        self.assertEqual(str(edge.source), response.data["node_ids"][self.hub_id])
+        self.assertEqual(self.source.nodes.count(), 3)
+
+        # The copy is part of the target's history
+        self.target.refresh_from_db()
+        state = versioning.rebuild_version(self.target.id, self.target.revision)
+        self.assertEqual(len(state["nodes"]), 3)
+
+    def test_move_drops_crossing_edges(self):
+        """Test moving nodes removes edges to nodes left behind"""
+        data = {
+            "target": str(self.target.id),
+            "node_ids": [self.hub_id, self.sat_id],
+            "mode": "move",
+            "offset": {"x": 0, "y": 500},
+        }
+        response = self.client.post(self.url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data["nodes"], response.data["edges"]), (2, 1))
+        self.assertEqual(
+            list(self.source.nodes.values_list("id", flat=True)),
+            [uuid.UUID(self.other_id)],
+        )
+        self.assertEqual(self.source.edges.count(), 0)
+        self.assertEqual(self.target.nodes.get(id=self.sat_id).y, 600)
+
+        results = self.client.get(reverse("search-list"), {"q": "customer"}).data[
+            "results"
+        ]
+        self.assertEqual(results[0]["model_name"], "Target")
+
+    def test_transfers_record_deltas_and_statistics(self):
+        """
+        Test transfers add deltas to the history and adjust statistics like
+        saves do
+        """
+        data = {
+            "target": str(self.target.id),
+            "node_ids": [self.hub_id, self.sat_id],
+            "mode": "move",
+        }
+        self.client.post(self.url, data, format="json")
+        data = {"target": str(self.source.id), "node_ids": [self.hub_id, self.sat_id]}
+        self.client.post(
+            reverse("datamodel-subgraph", kwargs={"pk": self.target.id}),
+            data,
+            format="json",
+        )
+
+        for data_model, node_count in ((self.source, 3), (self.target, 3)):
+            data_model.refresh_from_db()
+            latest = ModelVersion.objects.get(
+                model=data_model, revision=data_model.revision
+            )
+            self.assertFalse(latest.is_snapshot)
+            state = versioning.rebuild_version(data_model.id, data_model.revision)
+            self.assertEqual(len(state["nodes"]), node_count)
+            self.assertEqual(len(state["edges"]), data_model.edges.count())
+
+            incremental = ModelStatsSerializer(
+                ModelStats.objects.get(model=data_model)
+            ).data
+            recount = ModelStatsSerializer(
+                stats_module.recompute_stats(data_model)
+            ).data
+            self.assertEqual(
+                {**incremental, "updated_at": None}, {**recount, "updated_at": None}
+            )
+
+
+class LayoutTestCase(APITestCase):
+    def setUp(self):
+        self.model = DataModel.objects.create(name="Layout")
+        self.hub_ids = [str(uuid.uuid4()) for _ in range(2)]
+        self.link_id, self.sat_id = str(uuid.uuid4()), str(uuid.uuid4())
+        nodes = [
+            {
+                "id": self.hub_ids[0],
+                "type": "HUB",
+                "x": 0,
+                "y": 900,
+                "data": {"label": "Customer"},
+            },
+            {
+                "id": self.hub_ids[1],
+                "type": "HUB",
+                "x": 500,
+                "y": 0,
+                "data": {"label": "Order"},
+            },
+            {
+                "id": self.link_id,
+                "type": "LNK",
+                "x": 5,
+                "y": 5,
+                "data": {"label": "Customer Order"},
+            },
+            {
+                "id": self.sat_id,
+                "type": "SAT",
+                "x": 7,
+                "y": 7,
+                "data": {"label": "Details"},
+            },
+        ]
+        edges = [
+            {
+                "id": str(uuid.uuid4()),
+                "source": self.hub_ids[0],
+                "target": self.link_id,
+                "data": {},
+            },
+            {
+                "id": str(uuid.uuid4()),
+                "source": self.hub_ids[1],
+                "target": self.link_id,
+                "data": {},
+            },
+            {
+                "id": str(uuid.uuid4()),
+                "source": self.hub_ids[0],
+                "target": self.sat_id,
+                "data": {},
+            },
+        ]
+        self.client.put(
+            reverse("datamodel-detail", kwargs={"pk": self.model.id}),
+            {"name": "Layout", "nodes": nodes, "edges": edges},
+            format="json",
+        )
+        self.url = reverse("datamodel-layout", kwargs={"pk": self.model.id})
+
+    def test_layered_layout_saves_positions(self):
+        """Test the layered layout puts types on tiers and only moves nodes"""
+        data_before = dict(self.model.nodes.values_list("id", "data"))
+        response = self.client.post(self.url, {"algorithm": "layered"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        nodes = {str(node.id): node for node in self.model.nodes.all()}
+        hubs_y = {nodes[hub_id].y for hub_id in self.hub_ids}
+        self.assertEqual(len(hubs_y), 1)
+        self.assertLess(hubs_y.pop(), nodes[self.link_id].y)
+        self.assertLess(nodes[self.link_id].y, nodes[self.sat_id].y)
+        self.assertTrue(
+            all(node.x % 16 == 0 and node.y % 16 == 0 for node in nodes.values())
+        )
+        self.assertEqual(dict(self.model.nodes.values_list("id", "data")), data_before)
+
+        # The position-only delta replays onto the full rows
+        self.model.refresh_from_db()
+        self.assertEqual(response.data["revision"], self.model.revision)
+        state = versioning.rebuild_version(self.model.id, self.model.revision)
+        sat = next(node for node in state["nodes"] if node["id"] == self.sat_id)
+        self.assertEqual(
+            (sat["y"], sat["data"]["label"]), (nodes[self.sat_id].y, "Details")
+        )
+
+    @unittest.skipIf(layout.np is None, "NumPy is not installed")
+    def test_force_layout_separates_nodes(self):
+        """
+        Test the force layout pushes overlapping nodes apart without saving
+        on request
+        """
+        response = self.client.post(
+            self.url,
+            {"algorithm": "force", "iterations": 50, "save": False},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        positions = response.data["positions"]
+        link, sat = positions[self.link_id], positions[self.sat_id]
+        self.assertGreater(abs(link["x"] - sat["x"]) + abs(link["y"] - sat["y"]), 100)
+        self.assertEqual(self.model.nodes.get(id=self.sat_id).x, 7)
+
+
+class SchemaImportTestCase(APITestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix=".sqlite3")
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+        with sqlite3.connect(self.path) as connection:
+            connection.executescript(
+                """
+                CREATE TABLE customers (
+                    id INTEGER PRIMARY KEY, name TEXT, email VARCHAR(200)
+                );
+                CREATE TABLE orders (
+                    id INTEGER PRIMARY KEY,
+                    customer_id INTEGER REFERENCES customers(id),
+                    total NUMERIC
+                );
+                CREATE TABLE products (sku TEXT NOT NULL UNIQUE, title TEXT);
+                CREATE TABLE order_items (
+                    order_id INTEGER REFERENCES orders(id),
+                    sku TEXT REFERENCES products(sku),
+                    quantity INTEGER,
+                    PRIMARY KEY (order_id, sku)
+                );
+                CREATE TABLE audit_log (message TEXT);
+            """
+            )
+        connection.close()
+
+    def test_import_proposes_hubs_links_and_satellites(self):
+        """Test importing an uploaded SQLite schema"""
+        with open(self.path, "rb") as upload:
+            response = self.client.post(
+                reverse("datamodel-import-schema"), {"file": upload, "name": "Shop"}
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        summary = response.data["summary"]
+        self.assertEqual(summary["tables"], 5)
+        self.assertEqual(summary["nodes"], {"HUB": 3, "LNK": 2, "SAT": 4})
+        self.assertEqual(summary["skipped"], ["audit_log"])
+
+        data_model = DataModel.objects.get(id=response.data["id"])
+        nodes = self.client.get(
+            reverse("datamodel-detail", kwargs={"pk": data_model.id})
+        ).data["nodes"]
+        labels = {node["data"]["label"]: node for node in nodes}
+        business_key = [
+            column["name"]
+            for column in labels["HUB_PRODUCTS"]["data"]["columns"]
+            if "BK" in column["markers"]
+        ]
+        self.assertEqual(business_key, ["sku"])
+
+        # The association table becomes one link between the hubs of its foreign keys
+        link = labels["LNK_ORDER_ITEMS"]
+        sources = {
+            str(source)
+            for source in data_model.edges.filter(target=link["id"]).values_list(
+                "source", flat=True
+            )
+        }
+        self.assertEqual(
+            sources, {labels["HUB_ORDERS"]["id"], labels["HUB_PRODUCTS"]["id"]}
+        )
+        self.assertEqual(data_model.edges.filter(source=link["id"]).count(), 1)
+        self.assertEqual(data_model.edges.count(), 8)
+        self.assertEqual(len(versioning.rebuild_version(data_model.id, 1)["nodes"]), 9)
+
+    def test_rejects_files_that_are_not_databases(self):
+        """Test uploading something else than a SQLite database"""
+        upload = SimpleUploadedFile("notes.txt", b"not a database" * 100)
+        response = self.client.post(
+            reverse("datamodel-import-schema"), {"file": upload}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(DataModel.objects.filter(name="notes").exists())
+
+
+class HubRegistryTestCase(APITestCase):
+    def setUp(self):
+        self.crm = DataModel.objects.create(name="CRM")
+        self.billing = DataModel.objects.create(name="Billing")
+        self.crm_hub = str(uuid.uuid4())
+        self.save_hub(self.crm, self.crm_hub, "customer_id", "INTEGER")
+        self.save_hub(self.billing, str(uuid.uuid4()), "CustomerId", "integer")
+
+    def save_hub(self, data_model, hub_id, key_name, data_type):
+        key = {
+            "id": "key",
+            "name": key_name,
+            "dataType": data_type,
+            "markers": [{"type": "BK", "label": "BK"}],
+        }
+        self.client.put(
+            reverse("datamodel-detail", kwargs={"pk": data_model.id}),
+            {
+                "name": data_model.name,
+                "nodes": [
+                    {
+                        "id": hub_id,
+                        "type": "HUB",
+                        "x": 0,
+                        "y": 0,
+                        "data": {"label": "Customer", "columns": [key]},
+                    },
+                    {
+                        "id": str(uuid.uuid4()),
+                        "type": "SAT",
+                        "x": 0,
+                        "y": 0,
+                        "data": {"label": "Details", "columns": [key]},
+                    },
+                ],
+            },
+            format="json",
+        )
+
+    def test_lookup_and_duplicates(self):
+        """Test hubs with the same normalized business key are found across models"""
+        response = self.client.get(reverse("hubs-list"), {"key": "CUSTOMER_ID"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [hub["model_name"] for hub in response.data["results"]], ["Billing", "CRM"]
+        )
+
+        groups = self.client.get(reverse("hubs-duplicates")).data["results"]
+        self.assertEqual(len(groups), 1)
+        self.assertEqual(
+            (groups[0]["key"], groups[0]["status"], groups[0]["models"]),
+            (["customer_id"], "duplicate", 2),
+        )
+        self.assertEqual(
+            self.client.get(reverse("hubs-duplicates"), {"status": "conflict"}).data[
+                "count"
+            ],
+            0,
+        )
+
+    def test_registry_follows_saves(self):
+        """Test changed data types are conflicts and removed hubs leave the registry"""
+        self.save_hub(self.crm, self.crm_hub, "customer_id", "VARCHAR(20)")
+        groups = self.client.get(
+            reverse("hubs-duplicates"), {"status": "conflict"}
+        ).data["results"]
+        self.assertEqual(groups[0]["definitions"], 2)
+
+        copy = self.client.post(
+            reverse("datamodel-duplicate", kwargs={"pk": self.crm.id})
+        ).data
+        self.assertEqual(
+            self.client.get(reverse("hubs-list"), {"key": "customer_id"}).data["count"],
+            3,
+        )
+
+        self.client.put(
+            reverse("datamodel-detail", kwargs={"pk": self.crm.id}),
+            {"name": "CRM", "nodes": []},
+            format="json",
+        )
+        DataModel.objects.filter(id=copy["id"]).delete()
+        self.assertEqual(self.client.get(reverse("hubs-duplicates")).data["count"], 0)
+
+
+class DiffTestCase(APITestCase):
+    def setUp(self):
+        self.model = DataModel.objects.create(name="Diff")
+        self.hub_id, self.sat_id = str(uuid.uuid4()), str(uuid.uuid4())
+        self.columns = [
+            {
+                "id": "key",
+                "name": "customer_id",
+                "dataType": "INTEGER",
+                "markers": ["BK"],
+            },
+            {"id": "name", "name": "name", "dataType": "VARCHAR(50)", "markers": []},
+        ]
+        self.nodes = [
+            {
+                "id": self.hub_id,
+                "type": "HUB",
+                "x": 0,
+                "y": 0,
+                "data": {"label": "Customer", "columns": self.columns},
+            },
+            {
+                "id": self.sat_id,
+                "type": "SAT",
+                "x": 0,
+                "y": 200,
+                "data": {"label": "Details"},
+            },
+        ]
+        self.edges = [
+            {
+                "id": str(uuid.uuid4()),
+                "source": self.hub_id,
+                "target": self.sat_id,
+                "data": {},
+            }
+        ]
+        self.save(self.nodes, self.edges)
+
+    def save(self, nodes, edges):
+        self.client.put(
+            reverse("datamodel-detail", kwargs={"pk": self.model.id}),
+            {"name": "Diff", "nodes": nodes, "edges": edges},
+            format="json",
+        )
+
+    def test_diff_between_revisions(self):
+        """Test moved, changed, added and removed nodes and columns between revisions"""
+        columns = [
+            self.columns[0],
+            dict(self.columns[1], dataType="VARCHAR(200)"),
+            {"id": "email", "name": "email", "dataType": "VARCHAR(100)", "markers": []},
+        ]
+        link_id = str(uuid.uuid4())
+        nodes = [
+            dict(self.nodes[0], x=64, data={"label": "Customer", "columns": columns}),
+            {
+                "id": link_id,
+                "type": "LNK",
+                "x": 300,
+                "y": 0,
+                "data": {"label": "Customer Order"},
+            },
+        ]
+        self.save(nodes, [])
+
+        response = self.client.get(
+            reverse(
+                "datamodel-version-diff",
+                kwargs={"pk": self.model.id, "revision": 1, "other": 2},
+            )
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data["summary"]["nodes"],
+            {"added": 1, "removed": 1, "moved": 1, "changed": 1},
+        )
+        self.assertEqual(
+            response.data["summary"]["edges"], {"added": 0, "removed": 1, "changed": 0}
+        )
+        self.assertEqual(response.data["nodes"]["moved"][0]["to"], {"x": 64, "y": 0})
+        changed = response.data["nodes"]["changed"][0]
+        self.assertEqual(changed["fields"], [])
+        self.assertEqual(
+            changed["columns"], {"added": ["email"], "removed": [], "changed": ["name"]}
+        )
+        self.assertEqual(response.data["nodes"]["added"][0]["id"], link_id)
+
+    def test_diff_between_models_matches_copies_by_content(self):
+        """Test a duplicated model only differs by what was changed after copying"""
+        copy = DataModel.objects.get(
+            id=self.client.post(
+                reverse("datamodel-duplicate", kwargs={"pk": self.model.id})
+            ).data["id"]
+        )
+        url = reverse("datamodel-diff", kwargs={"pk": self.model.id, "other": copy.id})
+        summary = self.client.get(url).data["summary"]
+        self.assertEqual(
+            sum(summary["nodes"].values()) + sum(summary["edges"].values()), 0
+        )
+
+        copy.nodes.filter(type="SAT").update(x=500)
+        response = self.client.get(url, {"stream": "true"})
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        records = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).splitlines()
+        ]
+        self.assertEqual(
+            [(record["change"], record["old_id"]) for record in records],
+            [("moved", self.sat_id)],
+        )
+
+
+class BatchFetchTestCase(APITestCase):
+    def setUp(self):
+        self.url = reverse("datamodel-batch")
+        self.models = [
+            DataModel.objects.create(name=f"Model {index}") for index in range(3)
+        ]
+        column = {
+            "id": "key",
+            "name": "customer_id",
+            "dataType": "INTEGER",
+            "markers": ["BK"],
+        }
+        for data_model in self.models:
+            hub_id, sat_id = str(uuid.uuid4()), str(uuid.uuid4())
+            self.client.put(
+                reverse("datamodel-detail", kwargs={"pk": data_model.id}),
+                {
+                    "name": data_model.name,
+                    "nodes": [
+                        {
+                            "id": hub_id,
+                            "type": "HUB",
+                            "x": 0,
+                            "y": 0,
+                            "data": {"label": "Hub", "columns": [column]},
+                        },
+                        {
+                            "id": sat_id,
+                            "type": "SAT",
+                            "x": 0,
+                            "y": 0,
+                            "data": {"label": "Sat"},
+                        },
+                    ],
+                    "edges": [
+                        {
+                            "id": str(uuid.uuid4()),
+                            "source": hub_id,
+                            "target": sat_id,
+                            "data": {},
+                        }
+                    ],
+                },
+                format="json",
+            )
+
+    def fetch(self, data):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data, len(queries)
+
+    def test_query_count_does_not_grow_with_models(self):
+        """Test fetching three models costs as many queries as fetching one"""
+        missing = str(uuid.uuid4())
+        one, one_queries = self.fetch({"ids": [str(self.models[0].id)]})
+        three, three_queries = self.fetch(
+            {"ids": [str(data_model.id) for data_model in self.models] + [missing]}
+        )
+        self.assertEqual(one_queries, three_queries)
+        self.assertEqual(
+            [result["name"] for result in three["results"]],
+            ["Model 0", "Model 1", "Model 2"],
+        )
+        self.assertEqual(three["missing"], [uuid.UUID(missing)])
+        hub = next(
+            node for node in three["results"][1]["nodes"] if node["type"] == "HUB"
+        )
+        self.assertEqual(hub["data"]["columns"][0]["name"], "customer_id")
+        self.assertEqual(len(three["results"][2]["edges"]), 1)
+
+    def test_field_projection(self):
+        """Test only the requested model, node and edge fields are returned"""
+        data, _ = self.fetch(
+            {
+                "ids": [str(self.models[0].id)],
+                "fields": ["name", "nodes"],
+                "node_fields": ["id", "x", "y"],
+            }
+        )
+        result = data["results"][0]
+        self.assertEqual(set(result), {"name", "nodes"})
+        self.assertEqual(set(result["nodes"][0]), {"id", "x", "y"})
+
+
+class WireFormatTestCase(APITestCase):
+    def setUp(self):
+        self.model = DataModel.objects.create(name="Wire")
+        self.hub_id, self.sat_id = str(uuid.uuid4()), str(uuid.uuid4())
+        self.nodes = [
+            {
+                "id": self.hub_id,
+                "type": "HUB",
+                "x": 16.5,
+                "y": -32.0,
+                "data": {"label": "Customer"},
+            },
+            {
+                "id": self.sat_id,
+                "type": "SAT",
+                "x": 0.0,
+                "y": 96.0,
+                "data": {"label": "Details"},
+            },
+        ]
+        self.edges = [
+            {
+                "id": str(uuid.uuid4()),
+                "source": self.hub_id,
+                "target": self.sat_id,
+                "data": {},
+            }
+        ]
+
+    def test_columnar_roundtrip(self):
+        """Test node and edge lists survive the conversion to columns"""
+        document = {"name": "Wire", "nodes": self.nodes, "edges": self.edges}
+        columnar = wire.to_columnar(document)
+        self.assertEqual(len(columnar["nodes"]["ids"]), 32)
+        self.assertEqual(columnar["nodes"]["typeNames"], ["HUB", "SAT"])
+        self.assertEqual(wire.from_columnar(columnar), document)
+
+    @unittest.skipIf(wire.msgpack is None, "msgpack is not installed")
+    def test_msgpack_update_and_retrieve(self):
+        """Test saving and loading a model as MessagePack"""
+        url = reverse("datamodel-detail", kwargs={"pk": self.model.id})
+        body = wire.msgpack.packb(
+            wire.to_columnar({"name": "Wire", "nodes": self.nodes, "edges": self.edges})
+        )
+        response = self.client.put(url, body, content_type=wire.MEDIA_TYPE)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(
+            url, HTTP_ACCEPT=wire.MEDIA_TYPE, HTTP_ACCEPT_ENCODING="gzip"
+        )
+        self.assertEqual(response["Content-Type"], wire.MEDIA_TYPE)
+        content = response.content
+        if response.has_header("Content-Encoding"):
+            content = gzip.decompress(content)
+        document = wire.from_columnar(wire.msgpack.unpackb(content))
+        self.assertEqual(document["name"], "Wire")
+        hub = next(node for node in document["nodes"] if node["id"] == self.hub_id)
+        self.assertEqual(
+            (hub["x"], hub["y"], hub["data"]["label"]), (16.5, -32.0, "Customer")
+        )
+        self.assertEqual(document["edges"][0]["source"], self.hub_id)
+
+    @unittest.skipIf(wire.msgpack is None, "msgpack is not installed")
+    def test_msgpack_malformed_columns_are_rejected(self):
+        """
+        Test out of range type codes and column indexes are a 400, not a
+        server error
+        """
+        document = wire.to_columnar(
+            {"name": "Wire", "nodes": self.nodes, "edges": self.edges}
+        )
+        bad_type = dict(document, nodes=dict(document["nodes"], typeNames=[]))
+        bad_column = dict(
+            document,
+            nodes=dict(document["nodes"], data=[{"columns": [99]}] * len(self.nodes)),
+        )
+        for malformed in (bad_type, bad_column):
+            response = self.client.post(
+                reverse("datamodel-list"),
+                wire.msgpack.packb(malformed),
+                content_type=wire.MEDIA_TYPE,
+            )
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PositionsTestCase(APITestCase):
+    def setUp(self):
+        self.model = DataModel.objects.create(name="Positions")
+        self.other = DataModel.objects.create(name="Other")
+        self.ids = [str(uuid.uuid4()) for _ in range(3)]
+        self.other_id = str(uuid.uuid4())
+        self.client.put(
+            reverse("datamodel-detail", kwargs={"pk": self.model.id}),
+            {
+                "name": "Positions",
+                "nodes": [
+                    {
+                        "id": node_id,
+                        "type": "HUB",
+                        "x": 0,
+                        "y": 0,
+                        "data": {"label": f"Hub {index}"},
+                    }
+                    for index, node_id in enumerate(self.ids)
+                ],
+            },
+            format="json",
+        )
+        self.client.put(
+            reverse("datamodel-detail", kwargs={"pk": self.other.id}),
+            {
+                "name": "Other",
+                "nodes": [
+                    {"id": self.other_id, "type": "HUB", "x": 0, "y": 0, "data": {}}
+                ],
+            },
+            format="json",
+        )
+        self.url = reverse("datamodel-positions", kwargs={"pk": self.model.id})
+
+    def test_moves_only_nodes_of_the_model(self):
+        """Test positions are written for the model's nodes and nothing else"""
+        data = {
+            "ids": [self.ids[0], self.ids[2], self.other_id],
+            "x": [10.5, 20, 30],
+            "y": [-1, -2, -3],
+        }
+        response = self.client.post(self.url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["moved"], 2)
+
+        positions = {
+            str(node_id): (x, y)
+            for node_id, x, y in self.model.nodes.values_list("id", "x", "y")
+        }
+        self.assertEqual(
+            positions,
+            {self.ids[0]: (10.5, -1), self.ids[1]: (0, 0), self.ids[2]: (20, -2)},
+        )
+        self.assertEqual(self.other.nodes.get().x, 0)
+        self.assertEqual(self.model.nodes.get(id=self.ids[0]).data["label"], "Hub 0")
+
+        state = versioning.rebuild_version(self.model.id, response.data["revision"])
+        node = next(node for node in state["nodes"] if node["id"] == self.ids[2])
+        self.assertEqual(
+            (node["x"], node["y"], node["data"]["label"]), (20, -2, "Hub 2")
+        )
+
+    def test_rejects_arrays_of_different_length(self):
+        """Test the parallel arrays must line up"""
+        response = self.client.post(
+            self.url, {"ids": self.ids, "x": [1, 2, 3], "y": [1]}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class JobQueueTestCase(APITestCase):
+    def setUp(self):
+        self.model = DataModel.objects.create(name="Jobs")
+        hub_id, sat_id = str(uuid.uuid4()), str(uuid.uuid4())
+        self.client.put(
+            reverse("datamodel-detail", kwargs={"pk": self.model.id}),
+            {
+                "name": "Jobs",
+                "nodes": [
+                    {
+                        "id": hub_id,
+                        "type": "HUB",
+                        "x": 3,
+                        "y": 3,
+                        "data": {"label": "Customer"},
+                    },
+                    {
+                        "id": sat_id,
+                        "type": "SAT",
+                        "x": 3,
+                        "y": 3,
+                        "data": {"label": "Details"},
+                    },
+                ],
+                "edges": [
+                    {
+                        "id": str(uuid.uuid4()),
+                        "source": hub_id,
+                        "target": sat_id,
+                        "data": {},
+                    }
+                ],
+            },
+            format="json",
+        )
+        self.url = reverse("datamodel-model-jobs", kwargs={"pk": self.model.id})
+
+    def test_layout_job_runs_in_the_background(self):
+        """Test a submitted job is queued, claimed once and its result fetched"""
+        response = self.client.post(
+            self.url,
+            {"kind": "layout", "params": {"algorithm": "layered"}},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data["status"], Job.QUEUED)
+        self.assertEqual(
+            response.data["params"],
+            {"algorithm": "layered", "iterations": 100, "save": True},
+        )
+        detail_url = reverse("job-detail", kwargs={"pk": response.data["id"]})
+        result_url = reverse("job-result", kwargs={"pk": response.data["id"]})
+        self.assertEqual(
+            self.client.get(result_url).status_code, status.HTTP_409_CONFLICT
+        )
+
+        job = jobs.run_next("test-worker")
+        self.assertEqual(
+            (job.status, job.progress, job.worker), (Job.SUCCEEDED, 1.0, "test-worker")
+        )
+        self.assertIsNone(jobs.run_next("test-worker"))
+
+        response = self.client.get(detail_url, {"wait": 5})
+        self.assertEqual(response.data["status"], Job.SUCCEEDED)
+        result = self.client.get(result_url).data
+        self.model.refresh_from_db()
+        self.assertEqual(result["revision"], self.model.revision)
+        self.assertEqual(len(result["positions"]), 2)
+        self.assertEqual(
+            [job["id"] for job in self.client.get(self.url).data], [str(job.id)]
+        )
+
+    def test_invalid_failed_and_cancelled_jobs(self):
+        """Test parameters are validated and failures and cancellations are recorded"""
+        response = self.client.post(
+            self.url,
+            {"kind": "layout", "params": {"algorithm": "circle"}},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            self.client.post(self.url, {"kind": "shell"}, format="json").status_code,
+            status.HTTP_400_BAD_REQUEST,
+        )
+
+        export = jobs.submit(jobs.EXPORT, self.model)
+        cancelled = jobs.submit(jobs.EXPORT, self.model)
+        response = self.client.post(reverse("job-cancel", kwargs={"pk": cancelled.id}))
+        self.assertEqual(response.data["status"], Job.CANCELLED)
+
+        self.model.delete()
+        with self.assertLogs("modeler.jobs", "ERROR"):
+            job = jobs.run_next("test-worker")
+        self.assertEqual((job.id, job.status), (export.id, Job.FAILED))
+        self.assertIn("deleted", job.error)
+        self.assertIsNone(jobs.run_next("test-worker"))
+        response = self.client.get(reverse("job-result", kwargs={"pk": job.id}))
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_validate_job_reports_stored_problems(self):
+        """
+        Test a validation job checks the stored graph and lists schema
+        errors and dangling edges
+        """
+        response = self.client.post(self.url, {"kind": "validate"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertTrue(jobs.run_next("test-worker").result["valid"])
+
+        # Written around the API, as older versions or direct database edits could
+        Node.objects.create(model=self.model, type="HUB", x=0, y=0, data={"label": 5})
+        dangling = Edge.objects.create(
+            model=self.model, source=uuid.uuid4(), target=uuid.uuid4()
+        )
+        jobs.submit(jobs.VALIDATE, self.model)
+        result = jobs.run_next("test-worker").result
+        self.assertFalse(result["valid"])
+        self.assertEqual((result["node_errors"], result["edge_errors"]), (1, 0))
+        self.assertTrue(result["errors"][0].endswith(".data.label must be string"))
+        self.assertEqual(result["dangling_edge_ids"], [str(dangling.id)])
+
+    @override_settings(JOB_STALE_AFTER=60, JOB_REQUEUE_INTERVAL=0)
+    def test_workers_requeue_stalled_jobs(self):
+        """
+        Test running workers requeue jobs whose heartbeat stopped, not only
+        at startup
+        """
+        job = jobs.submit(jobs.EXPORT, self.model)
+        stalled = timezone.now() - timedelta(minutes=5)
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.RUNNING, worker="gone", heartbeat_at=stalled, attempts=1
+        )
+        with self.assertLogs("modeler.jobs", "WARNING"):
+            jobs.work("test-worker", threading.Event(), until_idle=True)
+        job.refresh_from_db()
+        self.assertEqual(
+            (job.status, job.worker, job.attempts), (Job.SUCCEEDED, "test-worker", 2)
+        )
+
+    def submit_schema_import(self):
+        handle, path = tempfile.mkstemp(suffix=".sqlite3")
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        with sqlite3.connect(path) as connection:
+            connection.execute(
+                "CREATE TABLE customers (id INTEGER PRIMARY KEY, name TEXT)"
+            )
+        connection.close()
+        with open(path, "rb") as upload:
+            response = self.client.post(
+                reverse("datamodel-import-schema") + "?async=true",
+                {"file": upload, "name": "CRM"},
+            )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+    def test_schema_import_job(self):
+        """Test importing an uploaded schema as a job attaches the created model"""
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            JOB_FILES_DIR=directory
+        ):
+            self.submit_schema_import()
+            job = jobs.run_next("test-worker")
+            self.assertEqual(os.listdir(directory), [])
+
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        self.assertEqual(job.model.name, "CRM")
+        self.assertEqual(job.result["summary"]["nodes"], {"HUB": 1, "LNK": 0, "SAT": 1})
+
+    def test_retried_schema_import_keeps_the_upload(self):
+        """
+        Test an import failing with a transient error keeps its upload for
+        the retry
+        """
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            JOB_FILES_DIR=directory
+        ):
+            self.submit_schema_import()
+            with mock.patch(
+                "modeler.jobs.import_schema",
+                side_effect=OperationalError("database is locked"),
+            ):
+                with self.assertLogs("modeler.jobs", "WARNING"):
+                    job = jobs.run_next("test-worker")
+            self.assertEqual(job.status, Job.QUEUED)
+            self.assertEqual(len(os.listdir(directory)), 1)
+
+            Job.objects.filter(pk=job.pk).update(not_before=None)
+            job = jobs.run_next("test-worker")
+            self.assertEqual((job.status, job.attempts), (Job.SUCCEEDED, 2))
+            self.assertEqual(os.listdir(directory), [])
+
+
+class AdmissionControlTestCase(APITestCase):
+    def controller(self, limit=1, model_limit=1, queue_size=1, timeout=0.05):
+        return AdmissionController(
+            AdaptiveLimit(limit, limit, limit),
+            model_limit,
+            queue_size=queue_size,
+            model_queue_size=1,
+            timeout=timeout,
+        )
+
+    def test_saves_over_the_limits_are_rejected(self):
+        """Test full slots and queues reject saves, and freed slots admit them again"""
+        controller = self.controller(limit=2, queue_size=0)
+        with controller.admit("a"):
+            with self.assertRaises(Overloaded):
+                with controller.admit("a"):
+                    pass
+            with controller.admit("b"):
+                with self.assertRaises(Overloaded) as rejected:
+                    with controller.admit(None):
+                        pass
+        self.assertGreaterEqual(rejected.exception.retry_after, 1)
+        with controller.admit("a"):
+            pass
+
+        # Queued saves wait for a slot until the timeout
+        controller = self.controller(timeout=0.01)
+        with controller.admit("a"):
+            with self.assertRaises(Overloaded):
+                with controller.admit("b"):
+                    pass
+
+    def test_limit_follows_query_latency(self):
+        """Test the limit grows while latency is steady and shrinks when it rises"""
+        limit = AdaptiveLimit(10, 2, 50)
+        for _ in range(20):
+            limit.update(0.001)
+        grown = limit.current
+        self.assertGreater(grown, 10)
+        for _ in range(20):
+            limit.update(0.02)
+        self.assertLess(limit.current, grown)
+        self.assertGreaterEqual(limit.current, 2)
+
+    def test_rejected_save_returns_429(self):
+        """Test the API answers saves over the limits with 429 and Retry-After"""
+        data_model = DataModel.objects.create(name="Busy")
+        controller = self.controller()
+        with mock.patch(
+            "modeler.admission.get_admission_controller", return_value=controller
+        ):
+            with controller.admit(data_model.pk):
+                response = self.client.put(
+                    reverse("datamodel-detail", kwargs={"pk": data_model.id}),
+                    {"name": "Renamed"},
+                    format="json",
+                )
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            self.assertGreaterEqual(int(response["Retry-After"]), 1)
+
+            response = self.client.put(
+                reverse("datamodel-detail", kwargs={"pk": data_model.id}),
+                {"name": "Renamed"},
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(metrics.snapshot()["gauges"]["admission.in_flight"], 0)
+
+
+class ReadYourWritesTestCase(APITestCase):
+    def test_writes_name_the_revision_to_read(self):
+        """
+        Test saves set the read-your-writes cookie and reads use the primary
+        without a replica
+        """
+        response = self.client.post(
+            reverse("datamodel-list"),
+            {"name": "Fresh", "nodes": [], "edges": []},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        cookie = response.cookies[routing.READ_YOUR_WRITES_COOKIE].value
+        self.assertEqual(
+            routing.parse_revision(cookie),
+            (response.data["id"], response.data["revision"]),
+        )
+        self.assertIsNone(routing.parse_revision("not a revision"))
+        self.assertEqual(routing.read_alias(), "default")
+
+
+@unittest.skipIf(
+    "replica" not in connections.settings, "No replica database (set DB_REPLICA_NAME)"
+)
+@override_settings(REPLICA_READS_ENABLED=True)
+class ReplicaRoutingTestCase(APITestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        self.node_id = str(uuid.uuid4())
+        response = self.client.post(
+            reverse("datamodel-list"),
+            {
+                "name": "Orders",
+                "nodes": [
+                    {
+                        "id": self.node_id,
+                        "type": "HUB",
+                        "x": 0,
+                        "y": 0,
+                        "data": {"label": "Order"},
+                    }
+                ],
+            },
+            format="json",
+        )
+        self.model = DataModel.objects.get(id=response.data["id"])
+        self.node_id = response.data["nodes"][0]["id"]
+        self.url = reverse("datamodel-detail", kwargs={"pk": self.model.id})
+
+    def replicate(self, label):
+        """Copy the model to the replica, with a label telling where reads came from"""
+        self.model.refresh_from_db()
+        DataModel.objects.using("replica").update_or_create(
+            pk=self.model.pk,
+            defaults={"name": self.model.name, "revision": self.model.revision},
+        )
+        Node.objects.using("replica").update_or_create(
+            pk=self.node_id,
+            defaults={
+                "model_id": self.model.pk,
+                "type": "HUB",
+                "x": 0,
+                "y": 0,
+                "data": {"label": label},
+            },
+        )
+
+    def label(self):
+        return self.client.get(self.url).data["nodes"][0]["data"]["label"]
+
+    def test_reads_wait_for_the_replica_to_catch_up(self):
+        """Test model reads use the replica only once it has the latest revision"""
+        self.assertEqual(self.label(), "Order")
+        self.replicate("Order (replica)")
+        self.assertEqual(self.label(), "Order (replica)")
+
+        response = self.client.put(self.url, {"name": "Orders v2"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.label(), "Order")
+
+    def test_lists_follow_the_clients_last_write(self):
+        """
+        Test list and search reads use the primary until the replica has the
+        client's write
+        """
+        search_url = reverse("search-list")
+        self.assertEqual(
+            [row["name"] for row in self.client.get(reverse("datamodel-list")).data],
+            ["Orders"],
+        )
+        self.assertEqual(self.client.get(search_url, {"q": "order"}).data["count"], 1)
+
+        self.replicate("Order")
+        self.assertEqual(self.client.get(search_url, {"q": "order"}).data["count"], 0)
+        self.client.cookies.clear()
+        response = self.client.get(
+            reverse("datamodel-list"),
+            HTTP_X_MIN_REVISION=f"{self.model.pk}:{self.model.revision + 1}",
+        )
+        self.assertEqual([row["name"] for row in response.data], ["Orders"])
+
+
+@unittest.skipUnless(connection.vendor == "sqlite", "SQLite only")
+class SQLiteProfileTestCase(SimpleTestCase):
+    # The maintenance commands run outside transactions, which TestCase would wrap
+    # them in
+    databases = {"default"}
+    alias = "sqlite_profile"
+
+    def setUp(self):
+        # The test database lives in memory, where WAL does not apply; use a
+        # file with the same options
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_dict = dict(
+            connection.settings_dict,
+            NAME=os.path.join(directory.name, "profile.sqlite3"),
+        )
+        settings_dict["OPTIONS"] = dict(settings.SQLITE_OPTIONS)
+        connections[self.alias] = type(connections["default"])(
+            settings_dict, alias=self.alias
+        )
+        self.addCleanup(delattr, connections._connections, self.alias)
+        self.addCleanup(connections[self.alias].close)
+
+    def test_connections_use_the_profile(self):
+        """
+        Test connections get WAL journaling, synchronous=NORMAL and the busy
+        timeout
+        """
+        if settings.SQLITE_PERFORMANCE_MODE:
+            self.assertEqual(
+                settings.DATABASES["default"]["OPTIONS"], settings.SQLITE_OPTIONS
+            )
+        values = sqlite.pragmas(self.alias)
+        self.assertEqual(values["journal_mode"], "wal")
+        # 1 is NORMAL
+        self.assertEqual(values["synchronous"], 1)
+        self.assertEqual(
+            values["busy_timeout"], int(settings.SQLITE_OPTIONS["timeout"] * 1000)
+        )
+
+    def test_maintenance_command(self):
+        """
+        Test sqlite_maintenance checkpoints a WAL database and runs against
+        the test database
+        """
+        with connections[self.alias].cursor() as cursor:
+            cursor.execute("CREATE TABLE rows (value TEXT)")
+            cursor.executemany("INSERT INTO rows VALUES (%s)", [("x" * 100,)] * 500)
+        output = StringIO()
+        call_command("sqlite_maintenance", "--database", self.alias, stdout=output)
+        self.assertIn("journal_mode=wal", output.getvalue())
+        self.assertIn("Checkpointed", output.getvalue())
+        self.assertEqual(sqlite.checkpoint(self.alias)["log_pages"], 0)
+
+        output = StringIO()
+        call_command("sqlite_maintenance", "--mode", "PASSIVE", stdout=output)
+        self.assertIn("Not in WAL mode", output.getvalue())
+
+
+class ProfilingTestCase(APITestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.url = reverse(
+            "datamodel-detail", kwargs={"pk": DataModel.objects.create(name="Slow").id}
+        )
+        self.staff = User.objects.create_user("staff", password="secret", is_staff=True)
+
+    def profile(self, **headers):
+        with override_settings(PROFILING_ENABLED=True, PROFILING_DIR=self.directory):
+            return self.client.get(self.url, **headers)
+
+    def test_only_staff_requests_asking_for_it_are_profiled(self):
+        """
+        Test the profile and its collapsed stacks are saved for staff
+        requests with X-Profile
+        """
+        self.assertNotIn("X-Profile-Id", self.profile(HTTP_X_PROFILE="1"))
+        self.client.force_login(self.staff)
+        self.assertNotIn("X-Profile-Id", self.profile())
+        with mock.patch("modeler.profiling.pyinstrument", None):
+            response = self.profile(HTTP_X_PROFILE="1")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        profile_id = response["X-Profile-Id"]
+        self.assertEqual(
+            sorted(os.listdir(self.directory)),
+            [f"{profile_id}.collapsed", f"{profile_id}.prof"],
+        )
+        with open(os.path.join(self.directory, f"{profile_id}.collapsed")) as collapsed:
+            lines = collapsed.read().splitlines()
+        self.assertTrue(any("retrieve (api.py:" in line for line in lines))
+        self.assertTrue(all(line.rsplit(" ", 1)[1].isdigit() for line in lines))
+
+    @unittest.skipIf(profiling.pyinstrument is None, "pyinstrument is not installed")
+    def test_sampling_profiler_is_used_when_installed(self):
+        """Test pyinstrument sessions are saved when pyinstrument is installed"""
+        self.client.force_login(self.staff)
+        profile_id = self.profile(HTTP_X_PROFILE="1")["X-Profile-Id"]
+        self.assertTrue(
+            os.path.exists(os.path.join(self.directory, f"{profile_id}.pyisession"))
+        )
+
+    def test_disabled_middleware_is_removed(self):
+        """
+        Test the middleware takes itself out of the chain when profiling is
+        disabled
+        """
+        with self.assertRaises(MiddlewareNotUsed):
+            profiling.ProfilingMiddleware(lambda request: None)
+
+
+class PayloadValidationTestCase(APITestCase):
+    def setUp(self):
+        self.hub_id = str(uuid.uuid4())
+        self.key = {
+            "id": "bk",
+            "name": "customer_id",
+            "dataType": "VARCHAR(50)",
+            "markers": ["BK"],
+        }
+
+    def node(self, **data):
+        return {
+            "id": self.hub_id,
+            "type": "HUB",
+            "x": 0,
+            "y": 0,
+            "data": {"label": "Customer", **data},
+        }
+
+    def post(self, nodes, edges=()):
+        return self.client.post(
+            reverse("datamodel-list"),
+            {"name": "Vault", "nodes": nodes, "edges": list(edges)},
+            format="json",
+        )
+
+    def test_malformed_payloads_are_rejected_with_their_path(self):
+        """
+        Test nodes and edges not matching the schema are rejected and
+        nothing is stored
+        """
+        unknown_marker = dict(self.key, markers=["BK", {"type": "XX", "label": "XX"}])
+        response = self.post([self.node(columns=[unknown_marker])])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("nodes[0].data.columns[0].markers[1]", response.data["nodes"][0])
+
+        response = self.post(
+            [self.node()], [{"id": str(uuid.uuid4()), "source": self.hub_id}]
+        )
+        self.assertTrue(response.data["edges"][0].startswith("edges[0] must contain"))
+        response = self.post([dict(self.node(), x="12")])
+        self.assertEqual(response.data["nodes"], ["nodes[0].x must be number"])
+        self.assertFalse(DataModel.objects.exists())
+
+    def test_valid_payloads_are_saved(self):
+        """
+        Test markers may be names or marker objects and free-form node data
+        is kept
+        """
+        palette_marker = {
+            "type": "HK",
+            "label": "HK",
+            "color": "#ea580c",
+            "description": "Hash Key",
+        }
+        columns = [
+            self.key,
+            dict(self.key, id="hash", name="customer_hk", markers=[palette_marker]),
+        ]
+        response = self.post([self.node(columns=columns, properties={"color": "red"})])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            response.data["nodes"][0]["data"]["properties"], {"color": "red"}
+        )
+
+    def test_editor_node_types_and_extra_keys_are_accepted(self):
+        """
+        Test every node type the editor creates and keys the backend does
+        not read pass validation
+        """
+        column = dict(self.key, nullable=True)
+        nodes = [
+            dict(
+                self.node(columns=[column]),
+                id=str(uuid.uuid4()),
+                type=node_type,
+                selected=False,
+            )
+            for node_type in ("HUB", "LNK", "SAT", "REF", "PIT", "BRIDGE")
+        ]
+        edge = {
+            "id": str(uuid.uuid4()),
+            "source": nodes[0]["id"],
+            "target": nodes[1]["id"],
+            "animated": True,
+        }
+        validation.check_nodes(nodes)
+        validation.check_edges([edge])
+
+    def test_compiled_schema_matches_json_schema_semantics(self):
+        """Test the built-in compiler on the keywords the schemas use"""
+        check = validation.compile_schema(
+            {"type": "array", "items": {"type": "number"}}
+        )
+        check([1, 2.5])
+        with self.assertRaises(validation.SchemaError) as raised:
+            check([1, True])
+        self.assertEqual(
+            raised.exception.describe("values"), "values[1] must be number"
+        )
+        closed = validation.compile_schema(
+            {"type": "object", "additionalProperties": False, "properties": {"a": {}}}
+        )
+        closed({"a": 1})
+        with self.assertRaises(validation.SchemaError):
+            closed({"a": 1, "b": 2})
+
+
+class EdgeIntegrityTestCase(APITestCase):
+    def setUp(self):
+        self.model = DataModel.objects.create(name="Vault")
+        self.hub_id, self.sat_id = str(uuid.uuid4()), str(uuid.uuid4())
+        self.nodes = [
+            {
+                "id": self.hub_id,
+                "type": "HUB",
+                "x": 0,
+                "y": 0,
+                "data": {"label": "Customer"},
+            },
+            {
+                "id": self.sat_id,
+                "type": "SAT",
+                "x": 0,
+                "y": 100,
+                "data": {"label": "Details"},
+            },
+        ]
+        self.edge = {
+            "id": str(uuid.uuid4()),
+            "source": self.hub_id,
+            "target": self.sat_id,
+            "data": {},
+        }
+        save_model_graph(self.model, self.nodes, [self.edge])
+        self.url = reverse("datamodel-detail", kwargs={"pk": self.model.id})
+
+    def remove_satellite(self):
+        return self.client.put(
+            self.url, {"name": "Vault", "nodes": self.nodes[:1]}, format="json"
+        )
+
+    def test_sweep_deletes_dangling_edges_as_a_revision(self):
+        """Test check_edges reports dangling edges and deletes them in a new revision"""
+        self.remove_satellite()
+        self.model.refresh_from_db()
+        self.assertEqual(integrity.dangling_counts(), {self.model.pk: 1})
+
+        out = StringIO()
+        call_command("check_edges", "--dry-run", stdout=out)
+        self.assertIn("Found 1 dangling edge(s)", out.getvalue())
+        self.assertEqual(Edge.objects.count(), 1)
+
+        call_command("check_edges", "--chunk-size", "1", stdout=StringIO())
+        self.assertFalse(Edge.objects.exists())
+        self.assertEqual(
+            DataModel.objects.get(pk=self.model.pk).revision, self.model.revision + 1
+        )
+        self.assertEqual(
+            versioning.rebuild_version(self.model.pk, self.model.revision)["edges"][0][
+                "id"
+            ],
+            self.edge["id"],
+        )
+        self.assertEqual(
+            versioning.rebuild_version(self.model.pk, self.model.revision + 1)["edges"],
+            [],
+        )
+
+    @override_settings(EDGE_INTEGRITY_MODE="refuse")
+    def test_refuse_mode_rejects_saves_leaving_dangling_edges(self):
+        """Test a save deleting the node of an edge fails without writing anything"""
+        response = self.remove_satellite()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["dangling_edges"], [self.edge["id"]])
+        self.assertEqual(Node.objects.filter(model=self.model).count(), 2)
+
+    @override_settings(EDGE_INTEGRITY_MODE="prune")
+    def test_prune_mode_deletes_dangling_edges_with_the_save(self):
+        """
+        Test dangling edges are deleted by the save and recorded in its
+        history entry
+        """
+        stray = {
+            "id": str(uuid.uuid4()),
+            "source": self.hub_id,
+            "target": str(uuid.uuid4()),
+            "data": {},
+        }
+        response = self.client.put(
+            self.url,
+            {"name": "Vault", "nodes": self.nodes[:1], "edges": [self.edge, stray]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["edges"], [])
+        self.assertEqual(
+            versioning.rebuild_version(self.model.pk, response.data["revision"])[
+                "edges"
+            ],
+            [],
+        )
+
+
+class ThumbnailTestCase(APITestCase):
+    def setUp(self):
+        self.model = DataModel.objects.create(name="Orders & Customers")
+        self.nodes, self.edges = synthetic_graph(40)
+        save_model_graph(self.model, self.nodes, self.edges)
+        self.url = reverse("datamodel-thumbnail", kwargs={"pk": self.model.id})
+
+    def test_thumbnail_is_cached_per_revision(self):
+        """
+        Test the SVG is served with an ETag per revision and rendered again
+        after saves
+        """
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "image/svg+xml")
+        svg = response.content.decode()
+        self.assertIn("<title>Orders &amp; Customers</title>", svg)
+        self.assertEqual(svg.count("<circle"), 40)
+        for node_type, color in thumbnails.COLORS.items():
+            self.assertIn(f'<g fill="{color}" data-type="{node_type}">', svg)
+
+        with CaptureQueriesContext(connection) as queries:
+            cached = self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertNotIn(
+            "modeler_node", " ".join(query["sql"] for query in queries.captured_queries)
+        )
+
+        save_model_graph(self.model, self.nodes[:1], [])
+        fresh = self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(fresh.status_code, status.HTTP_200_OK)
+        self.assertEqual(fresh.content.decode().count("<circle"), 1)
+        self.assertNotIn("<path", fresh.content.decode())
+
+    @override_settings(THUMBNAIL_MAX_NODES=8, THUMBNAIL_MAX_EDGES=5)
+    def test_large_models_are_downsampled(self):
+        """Test nodes are merged into grid cells and only the busiest edges are drawn"""
+        svg = thumbnails.render(self.model)
+        self.assertLess(svg.count("<circle"), 40)
+        self.assertLessEqual(svg.count("M"), 5)
+
+    @override_settings(THUMBNAIL_SYNC_MAX_NODES=10)
+    def test_large_models_are_rendered_by_a_job(self):
+        """
+        Test a missing thumbnail of a large model is queued once and served
+        after the job ran
+        """
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(self.client.get(self.url).data["id"], response.data["id"])
+
+        job = jobs.run_next("test")
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        self.assertEqual(job.result["revision"], self.model.revision)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+
+    @override_settings(THUMBNAIL_SYNC_MAX_NODES=10)
+    def test_job_thumbnails_reach_other_processes(self):
+        """
+        Test a thumbnail rendered by a job worker is served without any
+        memory shared with it
+        """
+        self.client.get(self.url)
+        jobs.run_next("test")
+        # The worker runs in another process; nothing it kept in memory is
+        # visible to the web workers
+        for cache in caches.all():
+            cache.clear()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["X-Thumbnail-Revision"], str(self.model.revision))
+        self.assertFalse(Job.objects.filter(status=Job.QUEUED).exists())
+
+        # A thumbnail of an earlier revision never replaces a later one
+        Thumbnail.objects.filter(model=self.model).update(
+            revision=self.model.revision + 1
+        )
+        thumbnails.refresh(self.model)
+        self.assertEqual(thumbnails.cached(self.model)[0], self.model.revision + 1)
+
+
+class ModelStatsTestCase(APITestCase):
+    def setUp(self):
+        self.model = DataModel.objects.create(name="Vault")
+        self.hub_ids = [str(uuid.uuid4()) for _ in range(3)]
+        self.link_id, self.sat_id = str(uuid.uuid4()), str(uuid.uuid4())
+        key = {
+            "id": "bk",
+            "name": "customer_id",
+            "dataType": "VARCHAR(50)",
+            "markers": ["BK"],
+        }
+        source = {
+            "id": "source_system",
+            "name": "source_system",
+            "dataType": "VARCHAR(100)",
+            "markers": ["RSRC"],
+        }
+        self.nodes = [
+            {
+                "id": hub_id,
+                "type": "HUB",
+                "x": 0,
+                "y": 0,
+                "data": {"label": f"Hub {index}", "columns": [key, source]},
+            }
+            for index, hub_id in enumerate(self.hub_ids)
+        ] + [
+            {
+                "id": self.link_id,
+                "type": "LNK",
+                "x": 0,
+                "y": 0,
+                "data": {"label": "Link"},
+            },
+            {
+                "id": self.sat_id,
+                "type": "SAT",
+                "x": 0,
+                "y": 0,
+                "data": {"label": "Details", "columns": [key]},
+            },
+        ]
+        self.edges = [
+            {
+                "id": str(uuid.uuid4()),
+                "source": self.hub_ids[0],
+                "target": self.link_id,
+                "data": {},
+            },
+            {
+                "id": str(uuid.uuid4()),
+                "source": self.hub_ids[1],
+                "target": self.link_id,
+                "data": {},
+            },
+            {
+                "id": str(uuid.uuid4()),
+                "source": self.hub_ids[0],
+                "target": self.sat_id,
+                "data": {},
+            },
+        ]
+        save_model_graph(self.model, self.nodes, self.edges)
+
+    def stats(self):
+        return self.client.get(
+            reverse("datamodel-stats", kwargs={"pk": self.model.id})
+        ).data
+
+    def test_saves_maintain_statistics(self):
+        """Test the statistics follow saves and match a full recount"""
+        expected = {
+            "node_counts": {"HUB": 3, "LNK": 1, "SAT": 1},
+            "column_count": 7,
+            "edge_count": 3,
+            "satellites_per_hub": {"0": 2, "1": 1},
+            "link_arity": {"2": 1},
+            "orphan_hubs": 1,
+        }
+        self.assertEqual({key: self.stats()[key] for key in expected}, expected)
+
+        # Dropping the satellite and a column, and turning the orphan hub into a
+        # satellite of the second hub
+        self.nodes[0]["data"]["columns"] = self.nodes[0]["data"]["columns"][:1]
+        self.nodes[2]["type"] = "SAT"
+        edges = self.edges[:2] + [
+            {
+                "id": str(uuid.uuid4()),
+                "source": self.hub_ids[1],
+                "target": self.hub_ids[2],
+                "data": {},
+            }
+        ]
+        save_model_graph(self.model, self.nodes[:4], edges)
+        stats = self.stats()
+        self.assertEqual(stats["node_counts"], {"HUB": 2, "LNK": 1, "SAT": 1})
+        self.assertEqual(stats["column_count"], 5)
+        self.assertEqual(stats["satellites_per_hub"], {"0": 1, "1": 1})
+        self.assertEqual(stats["orphan_hubs"], 0)
+
+        incremental = ModelStatsSerializer(
+            ModelStats.objects.get(model=self.model)
+        ).data
+        recount = ModelStatsSerializer(stats_module.recompute_stats(self.model)).data
+        self.assertEqual(
+            {**incremental, "updated_at": None}, {**recount, "updated_at": None}
+        )
+
+    def test_list_and_summary_include_statistics(self):
+        """
+        Test GET /api/models/ and /api/models/stats/ include the statistics
+        in a fixed number of queries
+        """
+        DataModel.objects.create(name="Empty")
+        with self.assertNumQueries(1):
+            summary = self.client.get(reverse("datamodel-all-stats")).data
+        self.assertEqual([row["name"] for row in summary], ["Empty", "Vault"])
+        self.assertIsNone(summary[0]["stats"])
+        self.assertEqual(summary[1]["stats"]["edge_count"], 3)
+
+        listed = {
+            row["name"]: row for row in self.client.get(reverse("datamodel-list")).data
+        }
+        self.assertEqual(listed["Vault"]["stats"]["node_counts"]["HUB"], 3)
+
+    def test_recompute_command_backfills_missing_statistics(self):
+        """
+        Test recompute_stats fills in statistics of models saved before they
+        existed
+        """
+        ModelStats.objects.all().delete()
+        call_command(
+            "recompute_stats", "--missing", "--chunk-size", "1", stdout=StringIO()
+        )
+        self.assertEqual(ModelStats.objects.get(model=self.model).edge_count, 3)
+
+
+class AdminTestCase(TestCase):
+    def setUp(self):
+        self.client.force_login(
+            User.objects.create_superuser("admin", "admin@example.com", "secret")
+        )
+        self.model = DataModel.objects.create(name="Vault")
+        nodes, edges = synthetic_graph(60)
+        nodes[0]["data"]["label"] = "Customer Orders"
+        save_model_graph(self.model, nodes, edges)
+        self.node_id = nodes[0]["id"]
+
+    def test_model_list_annotates_counts(self):
+        """
+        Test the model list counts nodes and edges in its own query rather
+        than one per model
+        """
+        DataModel.objects.create(name="Empty")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("admin:modeler_datamodel_changelist"))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(
+            [
+                query
+                for query in queries
+                if query["sql"].startswith(
+                    'SELECT COUNT(*) AS "__count" FROM "modeler_node"'
+                )
+            ]
+        )
+        totals = {
+            row.name: (row.node_total, row.edge_total)
+            for row in response.context["cl"].result_list
+        }
+        self.assertEqual(
+            totals, {"Vault": (60, self.model.edges.count()), "Empty": (0, 0)}
+        )
+
+    def test_model_page_shows_one_page_of_nodes(self):
+        """Test the model page edits the nodes one page at a time"""
+        url = reverse("admin:modeler_datamodel_change", args=[self.model.id])
+        response = self.client.get(url, {"nodes_page": 2})
+        self.assertEqual(response.status_code, 200)
+        formset = next(
+            formset
+            for formset in response.context["inline_admin_formsets"]
+            if formset.opts.model is Node
+        ).formset
+        self.assertEqual((formset.page, len(formset.forms), formset.total), (2, 10, 60))
+        self.assertContains(response, "51&ndash;60 of 60 nodes")
+        self.assertContains(response, f"?model__id__exact={self.model.id}")
+
+    def test_graph_rows_are_read_only(self):
+        """Test the admin cannot write node data, which would bypass save_model_graph"""
+        revision = DataModel.objects.get(pk=self.model.pk).revision
+        url = reverse("admin:modeler_node_change", args=[self.node_id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'name="data"')
+        self.client.post(
+            url, {"data": '{"label": "Edited"}', "type": "HUB", "x": 0, "y": 0}
+        )
+        self.assertEqual(
+            Node.objects.get(pk=self.node_id).data["label"], "Customer Orders"
+        )
+        self.assertEqual(DataModel.objects.get(pk=self.model.pk).revision, revision)
+        self.assertEqual(
+            self.client.get(reverse("admin:modeler_node_add")).status_code, 403
+        )
+
+        model_page = self.client.get(
+            reverse("admin:modeler_datamodel_change", args=[self.model.id])
+        )
+        self.assertNotContains(model_page, "nodes-0-data")
+
+    def test_node_search_uses_index(self):
+        """
+        Test node searches match ids exactly and words through the search
+        index, and the settings page renders
+        """
+        changelist = reverse("admin:modeler_node_changelist")
+        found = (
+            self.client.get(changelist, {"q": "customer orders"})
+            .context["cl"]
+            .result_list
+        )
+        self.assertEqual([str(node.id) for node in found], [self.node_id])
+        found = (
+            self.client.get(changelist, {"q": self.node_id}).context["cl"].result_list
+        )
+        self.assertEqual([str(node.id) for node in found], [self.node_id])
+
+        settings_row = Settings.objects.create()
+        response = self.client.get(
+            reverse("admin:modeler_settings_change", args=[settings_row.id])
+        )
+        self.assertContains(response, "global_columns")
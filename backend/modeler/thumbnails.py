@@ -0,0 +1,181 @@
+"""
+SVG thumbnails of models for the model list.
+
+A thumbnail draws the node positions, colored by node type, and the edges
+of a model scaled into a small fixed canvas. Only ids, types and
+positions are read, never node data. Models with more than
+THUMBNAIL_MAX_NODES nodes are downsampled onto a grid: every cell shows
+one mark per node type it contains, sized by the number of nodes, and
+edges between the same two cells are drawn once. At most
+THUMBNAIL_MAX_EDGES edges are drawn, the busiest first.
+
+Thumbnails are stored in the Thumbnail table with the revision they show,
+where the web workers find the thumbnails rendered by job workers, which
+run in other processes. An outdated thumbnail is rendered again on request
+for models up to THUMBNAIL_SYNC_MAX_NODES nodes. Larger models are
+rendered by a background job, and the outdated thumbnail is served until
+it has finished.
+"""
+import math
+from collections import Counter
+from xml.sax.saxutils import escape, quoteattr
+
+from django.conf import settings
+
+from .models import DataModel, Thumbnail
+
+WIDTH = 320
+HEIGHT = 200
+PADDING = 8
+NODE_RADIUS = 2.5
+# The node colors of the editor
+COLORS = {"HUB": "#2d2382", "LNK": "#00aabe", "SAT": "#f59e0b"}
+DEFAULT_COLOR = "#9ca3af"
+EDGE_COLOR = "#94a3b8"
+
+
+def _projection(points):
+    """Function mapping model coordinates into the canvas, keeping the aspect ratio"""
+    xs = [x for x, _ in points]
+    ys = [y for _, y in points]
+    min_x, min_y = min(xs), min(ys)
+    width, height = max(xs) - min_x, max(ys) - min_y
+    scale = min(
+        (WIDTH - 2 * PADDING) / width if width else math.inf,
+        (HEIGHT - 2 * PADDING) / height if height else math.inf,
+    )
+    scale = 1.0 if scale == math.inf else scale
+    offset_x = (WIDTH - width * scale) / 2
+    offset_y = (HEIGHT - height * scale) / 2
+    return lambda x, y: (
+        round(offset_x + (x - min_x) * scale, 1),
+        round(offset_y + (y - min_y) * scale, 1),
+    )
+
+
+def _grid(nodes, max_nodes):
+    """
+    Group `nodes` ((id, type, x, y) rows) into grid cells.
+
+    Returns {node id: cell} and {(cell, type): count}; cells are the (x, y)
+    of their center in model coordinates. Without downsampling every node
+    is its own cell.
+    """
+    if len(nodes) <= max_nodes:
+        cells = {node_id: (x, y) for node_id, _, x, y in nodes}
+        return cells, Counter(
+            {(cells[node_id], node_type): 1 for node_id, node_type, _, _ in nodes}
+        )
+
+    xs = [x for _, _, x, _ in nodes]
+    ys = [y for _, _, _, y in nodes]
+    min_x, min_y = min(xs), min(ys)
+    width, height = max(xs) - min_x or 1.0, max(ys) - min_y or 1.0
+    # Square cells, as many as leave each type a mark in about max_nodes cells
+    size = math.sqrt(width * height / max(1, max_nodes // len(COLORS)))
+    cells = {}
+    marks = Counter()
+    for node_id, node_type, x, y in nodes:
+        cell = (
+            min_x + (math.floor((x - min_x) / size) + 0.5) * size,
+            min_y + (math.floor((y - min_y) / size) + 0.5) * size,
+        )
+        cells[node_id] = cell
+        marks[(cell, node_type)] += 1
+    return cells, marks
+
+
+def render(data_model):
+    """The SVG thumbnail of `data_model` as a string"""
+    max_nodes = getattr(settings, "THUMBNAIL_MAX_NODES", 1000)
+    max_edges = getattr(settings, "THUMBNAIL_MAX_EDGES", 1500)
+    nodes = list(data_model.nodes.values_list("id", "type", "x", "y"))
+    parts = [
+        (
+            f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {WIDTH} {HEIGHT}" '
+            f'width="{WIDTH}" height="{HEIGHT}">'
+        ),
+        f"<title>{escape(data_model.name)}</title>",
+    ]
+    if nodes:
+        cells, marks = _grid(nodes, max_nodes)
+        project = _projection(list(cells.values()))
+
+        links = Counter()
+        for source, target in data_model.edges.values_list(
+            "source", "target"
+        ).iterator():
+            start, end = cells.get(source), cells.get(target)
+            # Edges inside a cell and dangling edges are not drawn
+            if start is not None and end is not None and start != end:
+                links[(start, end) if start <= end else (end, start)] += 1
+        if links:
+            segments = []
+            for (start, end), _ in links.most_common(max_edges):
+                (x1, y1), (x2, y2) = project(*start), project(*end)
+                segments.append(f"M{x1} {y1}L{x2} {y2}")
+            parts.append(
+                f'<path d="{"".join(segments)}" stroke="{EDGE_COLOR}" '
+                f'stroke-width="0.5" stroke-opacity="0.7" fill="none"/>'
+            )
+
+        by_type = {}
+        for (cell, node_type), count in marks.items():
+            x, y = project(*cell)
+            radius = round(NODE_RADIUS * min(3.0, math.sqrt(count)), 1)
+            by_type.setdefault(node_type, []).append(
+                f'<circle cx="{x}" cy="{y}" r="{radius}"/>'
+            )
+        for node_type in sorted(by_type):
+            color = COLORS.get(node_type, DEFAULT_COLOR)
+            parts.append(
+                f'<g fill="{color}" data-type={quoteattr(node_type)}>'
+                f'{"".join(by_type[node_type])}</g>'
+            )
+    parts.append("</svg>")
+    return "".join(parts)
+
+
+def cached(data_model):
+    """
+    (revision, svg) of the stored thumbnail of `data_model`, which may be
+    outdated, or None
+    """
+    return (
+        Thumbnail.objects.filter(model_id=data_model.pk)
+        .values_list("revision", "svg")
+        .first()
+    )
+
+
+def refresh(data_model):
+    """
+    Render the thumbnail of the current revision and store it; returns
+    (revision, svg)
+    """
+    revision = (
+        DataModel.objects.filter(pk=data_model.pk)
+        .values_list("revision", flat=True)
+        .get()
+    )
+    # Read first, so a save landing while rendering makes the thumbnail
+    # outdated rather than mislabelled
+    svg = render(data_model)
+    # Never replace a thumbnail of a later revision, e.g. rendered in a
+    # request while a job ran
+    stored = Thumbnail.objects.filter(
+        model_id=data_model.pk, revision__lte=revision
+    ).update(revision=revision, svg=svg)
+    if not stored:
+        Thumbnail.objects.bulk_create(
+            [Thumbnail(model_id=data_model.pk, revision=revision, svg=svg)],
+            ignore_conflicts=True,
+        )
+    return revision, svg
+
+
+def renders_inline(data_model):
+    """Whether a missing thumbnail of `data_model` is rendered in the request"""
+    return data_model.nodes.count() <= getattr(
+        settings, "THUMBNAIL_SYNC_MAX_NODES", 5000
+    )
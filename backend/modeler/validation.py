@@ -0,0 +1,276 @@
+"""
+JSON Schemas of the nodes and edges clients send.
+
+Node and edge lists are checked against these schemas before a model is
+saved, so malformed data is rejected with the path of the first bad value
+instead of being stored. Only the fields the backend reads are checked
+(ids, positions, label, columns and their markers); any other keys the
+editor stores pass through, and node types are free strings since the
+editor creates more types (REF, PIT, BRIDGE) than the backend models.
+
+The validators are compiled once, when this module is imported: with
+fastjsonschema, which generates Python code from a schema, when it is
+installed, otherwise with compile_schema(), which turns the schema into a
+tree of closures. Either way a list is checked in one pass, without
+re-reading the schema for every item.
+"""
+try:
+    import fastjsonschema
+except ImportError:  # pragma: no cover - optional dependency
+    fastjsonschema = None
+
+MARKERS = [
+    "PK",
+    "BK",
+    "FK",
+    "NK",
+    "HK",
+    "HD",
+    "LDTS",
+    "RSRC",
+    "RTS",
+    "RTE",
+    "CDC",
+    "DEL",
+]
+
+MARKER_SCHEMA = {
+    # Markers are stored as plain names or as the objects of the editor's marker palette
+    "anyOf": [
+        {"type": "string", "enum": MARKERS},
+        {
+            "type": "object",
+            "required": ["type"],
+            "properties": {
+                "type": {"type": "string", "enum": MARKERS},
+                "label": {"type": "string"},
+                "color": {"type": "string"},
+                "description": {"type": "string"},
+            },
+        },
+    ],
+}
+
+COLUMN_SCHEMA = {
+    "type": "object",
+    "required": ["id", "name", "dataType", "markers"],
+    "properties": {
+        "id": {"type": "string", "minLength": 1},
+        "name": {"type": "string", "minLength": 1},
+        "dataType": {"type": "string"},
+        "markers": {"type": "array", "items": MARKER_SCHEMA},
+        "description": {"type": "string"},
+        "isRequired": {"type": "boolean"},
+        "isGlobal": {"type": "boolean"},
+        "isEnabled": {"type": "boolean"},
+    },
+}
+
+NODE_SCHEMA = {
+    "type": "object",
+    "required": ["id", "type", "x", "y"],
+    "properties": {
+        "id": {"type": "string", "minLength": 1},
+        "model": {"type": "string"},
+        "type": {"type": "string", "minLength": 1},
+        "x": {"type": "number"},
+        "y": {"type": "number"},
+        "data": {
+            "type": "object",
+            "properties": {
+                "label": {"type": "string"},
+                "type": {"type": "string"},
+                "description": {"type": "string"},
+                "properties": {"type": "object"},
+                "columns": {"type": "array", "items": COLUMN_SCHEMA},
+            },
+        },
+    },
+}
+
+EDGE_SCHEMA = {
+    "type": "object",
+    "required": ["id", "source", "target"],
+    "properties": {
+        "id": {"type": "string", "minLength": 1},
+        "model": {"type": "string"},
+        "source": {"type": "string", "minLength": 1},
+        "target": {"type": "string", "minLength": 1},
+        "data": {"type": "object"},
+    },
+}
+
+
+class SchemaError(ValueError):
+    """
+    A value does not match its schema. `path` holds the ".key" and "[index]"
+    steps leading to the bad value, innermost first.
+    """
+
+    def __init__(self, message, path=None):
+        super().__init__(message)
+        self.message = message
+        self.path = path or []
+
+    def describe(self, root):
+        """
+        The error as "<root><path> <message>", e.g. "nodes[3].type must be
+        one of ..."
+        """
+        return f"{root}{''.join(reversed(self.path))} {self.message}"
+
+
+# JSON types as the classes to test with isinstance() and whether to exclude bool, which
+# is an int
+_TYPES = {
+    "object": ((dict,), False),
+    "array": ((list,), False),
+    "string": ((str,), False),
+    "number": ((int, float), True),
+    "integer": ((int,), True),
+    "boolean": ((bool,), False),
+    "null": ((type(None),), False),
+}
+
+
+def _step(error, step):
+    error.path.append(step)
+    return error
+
+
+def _type_test(schema):
+    """(classes, exclude_bool, expected) for the `type` of `schema`, or None"""
+    if "type" not in schema:
+        return None
+    names = schema["type"] if isinstance(schema["type"], list) else [schema["type"]]
+    classes = tuple(cls for name in names for cls in _TYPES[name][0])
+    exclude_bool = all(_TYPES[name][1] for name in names)
+    return classes, exclude_bool, " or ".join(names)
+
+
+def _only_type(schema):
+    return set(schema) <= {"type", "description"}
+
+
+def compile_schema(schema):
+    """
+    Compile `schema` into a function that raises SchemaError for values that
+    do not match it. Supports the keywords the schemas above use: type,
+    enum, minLength, required, properties, additionalProperties, items and
+    anyOf.
+
+    Each (sub)schema becomes a single function; properties whose schema is
+    only a type are tested inline. The path of an error is only assembled
+    when one is raised, so valid values pay nothing for it.
+    """
+    type_test = _type_test(schema)
+    allowed = frozenset(schema["enum"]) if "enum" in schema else None
+    listed = ", ".join(str(option) for option in schema.get("enum", ()))
+    min_length = schema.get("minLength", 0)
+    required = list(schema.get("required", ()))
+
+    # key -> (classes, exclude_bool, expected, check); check is None when the
+    # type test suffices
+    properties = {}
+    for key, subschema in schema.get("properties", {}).items():
+        subtype = _type_test(subschema)
+        if subtype is not None and _only_type(subschema):
+            properties[key] = (*subtype, None)
+        else:
+            properties[key] = (None, False, "", compile_schema(subschema))
+    additional = schema.get("additionalProperties", True)
+    if isinstance(additional, dict):
+        additional = (None, False, "", compile_schema(additional))
+    check_properties = bool(properties) or additional is not True
+    check_item = compile_schema(schema["items"]) if "items" in schema else None
+    options = [compile_schema(subschema) for subschema in schema.get("anyOf", ())]
+
+    def check(value):
+        if type_test is not None:
+            classes, exclude_bool, expected = type_test
+            if not isinstance(value, classes) or (
+                exclude_bool and value.__class__ is bool
+            ):
+                raise SchemaError(f"must be {expected}")
+        if allowed is not None:
+            try:
+                known = value in allowed
+            except TypeError:
+                # Unhashable values such as lists are in no enum of these schemas
+                known = False
+            if not known:
+                raise SchemaError(f"must be one of {listed}")
+        if min_length and isinstance(value, str) and len(value) < min_length:
+            raise SchemaError(f"must be at least {min_length} characters long")
+
+        if isinstance(value, dict):
+            for key in required:
+                if key not in value:
+                    raise SchemaError(f"must contain '{key}'")
+            if check_properties:
+                for key, item in value.items():
+                    rule = properties.get(key)
+                    if rule is None:
+                        if additional is True:
+                            continue
+                        if additional is False:
+                            raise SchemaError(f"must not contain '{key}'")
+                        rule = additional
+                    classes, exclude_bool, expected, check_value = rule
+                    if check_value is None:
+                        if not isinstance(item, classes) or (
+                            exclude_bool and item.__class__ is bool
+                        ):
+                            raise SchemaError(f"must be {expected}", [f".{key}"])
+                        continue
+                    try:
+                        check_value(item)
+                    except SchemaError as e:
+                        raise _step(e, f".{key}")
+        elif check_item is not None and isinstance(value, list):
+            for index, item in enumerate(value):
+                try:
+                    check_item(item)
+                except SchemaError as e:
+                    raise _step(e, f"[{index}]")
+
+        if options:
+            for option in options:
+                try:
+                    option(value)
+                    return
+                except SchemaError:
+                    continue
+            raise SchemaError("must match one of the allowed forms")
+
+    return check
+
+
+def compile_validator(schema):
+    """
+    Compile `schema` with the fastest available engine into a function
+    raising SchemaError
+    """
+    if fastjsonschema is None:
+        return compile_schema(schema)
+
+    validate = fastjsonschema.compile(schema, use_default=False)
+
+    def check(value):
+        try:
+            validate(value)
+        except fastjsonschema.JsonSchemaValueException as e:
+            # Messages read "data[3].type must be ...", the path follows the
+            # root name "data"
+            name = e.name or "data"
+            raise SchemaError(
+                e.message[len(name) :].strip(), [name[len("data") :]]
+            ) from None
+
+    return check
+
+
+ENGINE = "fastjsonschema" if fastjsonschema is not None else "compiled"
+
+check_nodes = compile_validator({"type": "array", "items": NODE_SCHEMA})
+check_edges = compile_validator({"type": "array", "items": EDGE_SCHEMA})
@@ -0,0 +1,252 @@
+"""
+Delta-compressed model version history.
+
+Every save records a ModelVersion. Every VERSION_SNAPSHOT_INTERVAL revisions
+(and for the first recorded revision) the full graph is stored; all other
+revisions only store the nodes and edges that changed. A version is rebuilt
+by replaying deltas on top of the nearest earlier snapshot.
+"""
+import json
+import threading
+import zlib
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .models import ModelVersion
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+NODE_FIELDS = ("id", "type", "x", "y", "data")
+EDGE_FIELDS = ("id", "source", "target", "data")
+
+
+def _default_codec():
+    return ModelVersion.ZSTD if zstandard is not None else ModelVersion.ZLIB
+
+
+def compress(document, codec):
+    raw = json.dumps(document, separators=(",", ":"), default=str).encode()
+    if codec == ModelVersion.ZSTD:
+        return zstandard.ZstdCompressor().compress(raw)
+    return zlib.compress(raw, 6)
+
+
+def decompress(payload, codec):
+    payload = bytes(payload)
+    if codec == ModelVersion.ZSTD:
+        if zstandard is None:
+            raise RuntimeError(
+                "The zstandard package is required to read this model version"
+            )
+        raw = zstandard.ZstdDecompressor().decompress(payload)
+    else:
+        raw = zlib.decompress(payload)
+    return json.loads(raw)
+
+
+def _plain(name, value):
+    return str(value) if name in ("id", "source", "target") else value
+
+
+def _row_dict(row, fields):
+    return {name: _plain(name, getattr(row, name)) for name in fields}
+
+
+def _values_dict(values, fields):
+    return {name: _plain(name, values[name]) for name in fields}
+
+
+def _changes_dict(changes, fields):
+    if changes.fields is not None:
+        # Partial rows are merged into the previous state when replayed
+        fields = ("id", *changes.fields)
+    return {
+        "upsert": [_row_dict(row, fields) for row in changes.upserted],
+        "delete": [str(row_id) for row_id in changes.deleted_ids],
+    }
+
+
+def _snapshot_document(instance):
+    return {
+        "fields": {"name": instance.name},
+        "nodes": [
+            _values_dict(values, NODE_FIELDS)
+            for values in instance.nodes.values(*NODE_FIELDS)
+        ],
+        "edges": [
+            _values_dict(values, EDGE_FIELDS)
+            for values in instance.edges.values(*EDGE_FIELDS)
+        ],
+    }
+
+
+def record_version(instance, fields, node_changes, edge_changes, force_snapshot=False):
+    """
+    Store the history entry for the revision `instance` was just saved at.
+
+    `force_snapshot` is needed when the graph was changed without tracking
+    row changes, for example by set-based copies.
+    """
+    interval = getattr(settings, "VERSION_SNAPSHOT_INTERVAL", 50)
+    last_snapshot = (
+        ModelVersion.objects.filter(model=instance, is_snapshot=True)
+        .order_by("-revision")
+        .values_list("revision", flat=True)
+        .first()
+    )
+    is_snapshot = (
+        force_snapshot
+        or last_snapshot is None
+        or instance.revision - last_snapshot >= interval
+    )
+
+    if is_snapshot:
+        document = _snapshot_document(instance)
+    else:
+        document = {"fields": dict(fields)}
+        if node_changes is not None:
+            document["nodes"] = _changes_dict(node_changes, NODE_FIELDS)
+        if edge_changes is not None:
+            document["edges"] = _changes_dict(edge_changes, EDGE_FIELDS)
+
+    codec = _default_codec()
+    return ModelVersion.objects.create(
+        model=instance,
+        revision=instance.revision,
+        is_snapshot=is_snapshot,
+        codec=codec,
+        payload=compress(document, codec),
+    )
+
+
+def _apply(state, version):
+    document = decompress(version.payload, version.codec)
+    if version.is_snapshot:
+        return {
+            "fields": dict(document["fields"]),
+            "nodes": {node["id"]: node for node in document["nodes"]},
+            "edges": {edge["id"]: edge for edge in document["edges"]},
+        }
+    state["fields"].update(document.get("fields", {}))
+    for key in ("nodes", "edges"):
+        delta = document.get(key)
+        if delta is None:
+            continue
+        for row_id in delta["delete"]:
+            state[key].pop(row_id, None)
+        for row in delta["upsert"]:
+            state[key][row["id"]] = {**state[key].get(row["id"], {}), **row}
+    return state
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _cache_get(key):
+    with _cache_lock:
+        state = _cache.get(key)
+        if state is not None:
+            _cache.move_to_end(key)
+        return state
+
+
+def _cache_put(key, state):
+    with _cache_lock:
+        _cache[key] = state
+        _cache.move_to_end(key)
+        while len(_cache) > getattr(settings, "VERSION_CACHE_SIZE", 32):
+            _cache.popitem(last=False)
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+def rebuild_version(model_id, revision):
+    """
+    Rebuild a model as it was at `revision`.
+
+    Returns a dict with the model `name`, `revision`, and `nodes`/`edges`
+    lists. Results are cached; callers must not mutate them. Raises
+    ModelVersion.DoesNotExist when the revision is not in the history.
+    """
+    key = (str(model_id), revision)
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
+
+    snapshot = (
+        ModelVersion.objects.filter(
+            model_id=model_id, is_snapshot=True, revision__lte=revision
+        )
+        .order_by("-revision")
+        .first()
+    )
+    if (
+        snapshot is None
+        or not ModelVersion.objects.filter(
+            model_id=model_id, revision=revision
+        ).exists()
+    ):
+        raise ModelVersion.DoesNotExist(
+            f"Revision {revision} of model {model_id} is not in the history"
+        )
+
+    state = _apply(None, snapshot)
+    deltas = (
+        ModelVersion.objects.filter(
+            model_id=model_id, revision__gt=snapshot.revision, revision__lte=revision
+        )
+        .order_by("revision")
+        .iterator()
+    )
+    for version in deltas:
+        state = _apply(state, version)
+
+    result = {
+        "name": state["fields"].get("name"),
+        "revision": revision,
+        "nodes": list(state["nodes"].values()),
+        "edges": list(state["edges"].values()),
+    }
+    _cache_put(key, result)
+    return result
+
+
+def compact_history(model, keep):
+    """
+    Drop history older than the newest `keep` revisions of `model`.
+
+    The oldest kept revision is rewritten as a full snapshot so that every
+    remaining revision can still be rebuilt. Returns the number of deleted
+    versions.
+    """
+    revisions = list(
+        ModelVersion.objects.filter(model=model)
+        .order_by("-revision")
+        .values_list("revision", flat=True)[:keep]
+    )
+    if len(revisions) < keep:
+        return 0
+    cutoff = revisions[-1]
+    if not ModelVersion.objects.filter(model=model, revision__lt=cutoff).exists():
+        return 0
+
+    state = rebuild_version(model.pk, cutoff)
+    codec = _default_codec()
+    document = {
+        "fields": {"name": state["name"]},
+        "nodes": state["nodes"],
+        "edges": state["edges"],
+    }
+    ModelVersion.objects.filter(model=model, revision=cutoff).update(
+        is_snapshot=True, codec=codec, payload=compress(document, codec)
+    )
+    deleted, _ = ModelVersion.objects.filter(model=model, revision__lt=cutoff).delete()
+    return deleted
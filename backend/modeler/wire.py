@@ -0,0 +1,242 @@
+"""
+Compact binary wire format for model graphs.
+
+Models are sent as MessagePack with the nodes and edges in columnar form
+instead of one map per row:
+
+    nodes: {
+        "ids": 16 bytes per node (UUID bytes, concatenated),
+        "types": 1 byte per node, an index into "typeNames",
+        "typeNames": ["HUB", ...],
+        "x", "y": little-endian float64 per node,
+        "data": [data map per node],
+        "columns": [distinct column definitions],
+    }
+    edges: {"ids", "sources", "targets": 16 bytes per edge, "data": [...]}
+
+Column definitions repeat a lot across nodes, so node data holds indexes
+into nodes.columns instead of the definitions. All other fields are packed
+as they are. The format is offered through content negotiation
+(application/x-msgpack) when the msgpack package is installed.
+"""
+import array
+import sys
+import uuid
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+
+from .columns import COLUMNS_KEY
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+MEDIA_TYPE = "application/x-msgpack"
+COLUMNAR_KEY = "columnar"
+
+
+def _default(value):
+    # UUIDs, datetimes and decimals are sent as strings, like in JSON
+    return str(value)
+
+
+def _pack_ids(values):
+    return b"".join(uuid.UUID(str(value)).bytes for value in values)
+
+
+def _unpack_ids(blob):
+    # Formatting the hex digits directly is much faster than creating UUID objects
+    digits = bytes(blob).hex()
+    return [
+        f"{digits[i:i + 8]}-{digits[i + 8:i + 12]}-{digits[i + 12:i + 16]}-"
+        f"{digits[i + 16:i + 20]}-{digits[i + 20:i + 32]}"
+        for i in range(0, len(digits), 32)
+    ]
+
+
+def _pack_floats(values):
+    floats = array.array("d", values)
+    if sys.byteorder == "big":
+        floats.byteswap()
+    return floats.tobytes()
+
+
+def _unpack_floats(blob):
+    floats = array.array("d")
+    floats.frombytes(blob)
+    if sys.byteorder == "big":
+        floats.byteswap()
+    return floats.tolist()
+
+
+def _intern_columns(datas):
+    """Replace column definitions in node data by indexes into a shared list"""
+    columns = []
+    indexes = {}
+    interned = []
+    for data in datas:
+        if not isinstance(data, dict) or not isinstance(data.get(COLUMNS_KEY), list):
+            interned.append(data)
+            continue
+        refs = []
+        for column in data[COLUMNS_KEY]:
+            key = msgpack.packb(column, default=_default)
+            index = indexes.get(key)
+            if index is None:
+                index = indexes[key] = len(columns)
+                columns.append(column)
+            refs.append(index)
+        interned.append(dict(data, **{COLUMNS_KEY: refs}))
+    return interned, columns
+
+
+def _column(columns, index):
+    if not isinstance(index, int) or not 0 <= index < len(columns):
+        raise ValueError(f"Column index {index!r} is out of range")
+    return columns[index]
+
+
+def _expand_columns(datas, columns):
+    return [
+        dict(
+            data,
+            **{COLUMNS_KEY: [_column(columns, index) for index in data[COLUMNS_KEY]]},
+        )
+        if isinstance(data, dict) and isinstance(data.get(COLUMNS_KEY), list)
+        else data
+        for data in datas
+    ]
+
+
+def columnar_nodes(nodes):
+    type_names = []
+    codes = {}
+    types = bytearray()
+    for node in nodes:
+        code = codes.get(node["type"])
+        if code is None:
+            code = codes[node["type"]] = len(type_names)
+            type_names.append(node["type"])
+        types.append(code)
+    datas, columns = _intern_columns(node.get("data", {}) for node in nodes)
+    return {
+        "ids": _pack_ids(node["id"] for node in nodes),
+        "types": bytes(types),
+        "typeNames": type_names,
+        "x": _pack_floats(node["x"] for node in nodes),
+        "y": _pack_floats(node["y"] for node in nodes),
+        "data": datas,
+        "columns": columns,
+    }
+
+
+def row_nodes(columns):
+    type_names = columns["typeNames"]
+    ids = _unpack_ids(columns["ids"])
+    xs = _unpack_floats(columns["x"])
+    ys = _unpack_floats(columns["y"])
+    datas = _expand_columns(columns["data"], columns.get("columns", []))
+    if not len(ids) == len(columns["types"]) == len(xs) == len(ys) == len(datas):
+        raise ValueError("Node columns differ in length")
+    if any(code >= len(type_names) for code in columns["types"]):
+        raise ValueError("Node type code is out of range")
+    return [
+        {"id": node_id, "type": type_names[code], "x": x, "y": y, "data": data}
+        for node_id, code, x, y, data in zip(ids, columns["types"], xs, ys, datas)
+    ]
+
+
+def columnar_edges(edges):
+    return {
+        "ids": _pack_ids(edge["id"] for edge in edges),
+        "sources": _pack_ids(edge["source"] for edge in edges),
+        "targets": _pack_ids(edge["target"] for edge in edges),
+        "data": [edge.get("data", {}) for edge in edges],
+    }
+
+
+def row_edges(columns):
+    ids = _unpack_ids(columns["ids"])
+    sources = _unpack_ids(columns["sources"])
+    targets = _unpack_ids(columns["targets"])
+    if not len(ids) == len(sources) == len(targets) == len(columns["data"]):
+        raise ValueError("Edge columns differ in length")
+    return [
+        {"id": edge_id, "source": source, "target": target, "data": data}
+        for edge_id, source, target, data in zip(ids, sources, targets, columns["data"])
+    ]
+
+
+def to_columnar(document):
+    """Convert the node and edge lists of a model document to columns"""
+    if not isinstance(document, dict) or not any(
+        key in document for key in ("nodes", "edges")
+    ):
+        return document
+    converted = dict(document, **{COLUMNAR_KEY: True})
+    if isinstance(document.get("nodes"), list):
+        converted["nodes"] = columnar_nodes(document["nodes"])
+    if isinstance(document.get("edges"), list):
+        converted["edges"] = columnar_edges(document["edges"])
+    return converted
+
+
+def from_columnar(document):
+    """Inverse of to_columnar()"""
+    if not isinstance(document, dict) or not document.get(COLUMNAR_KEY):
+        return document
+    converted = {key: value for key, value in document.items() if key != COLUMNAR_KEY}
+    if isinstance(document.get("nodes"), dict):
+        converted["nodes"] = row_nodes(document["nodes"])
+    if isinstance(document.get("edges"), dict):
+        converted["edges"] = row_edges(document["edges"])
+    return converted
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = MEDIA_TYPE
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if isinstance(data, list):
+            data = [to_columnar(item) for item in data]
+        elif isinstance(data, dict) and isinstance(data.get("results"), list):
+            # Paginated and batch responses hold several models
+            data = dict(data, results=[to_columnar(item) for item in data["results"]])
+        else:
+            data = to_columnar(data)
+        return msgpack.packb(data, default=_default, use_bin_type=True)
+
+
+class MessagePackParser(BaseParser):
+    media_type = MEDIA_TYPE
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return from_columnar(msgpack.unpackb(stream.read(), raw=False))
+        except (
+            ValueError,
+            KeyError,
+            IndexError,
+            TypeError,
+            msgpack.ExtraData,
+            msgpack.FormatError,
+            msgpack.StackError,
+        ) as e:
+            raise ParseError(f"MessagePack parse error - {e}")
+
+
+def renderer_classes(defaults):
+    """`defaults` plus the MessagePack renderer if msgpack is installed"""
+    return list(defaults) + ([MessagePackRenderer] if msgpack is not None else [])
+
+
+def parser_classes(defaults):
+    return list(defaults) + ([MessagePackParser] if msgpack is not None else [])